@@ -0,0 +1,80 @@
+#!/bin/bash
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Measures the latency of 'source env/setenv.sh' in a scratch cFp, with the bash-only fast path and with
+#  *       the python path that was used for every call before (forced with cFpForceGenEnv=1).
+#  *
+#  *     Synopsis:
+#  *       bench/setenv_latency.sh [iterations]
+#  *
+
+iterations=${1:-50}
+me_dir="$( cd -P "$( dirname "${BASH_SOURCE[0]}" )" >/dev/null 2>&1 && pwd )"
+templates="$me_dir/../templates"
+cfp=$(mktemp -d)
+trap 'rm -rf "$cfp"' EXIT
+
+mkdir -p "$cfp/env/cfenv-small/bin"
+touch "$cfp/env/cfenv-small/bin/activate"
+cp "$templates/setenv.sh" "$templates/gen_env.py" "$templates/cf_template.py" "$templates/cfp_config.py" \
+   "$templates/machine_env.template" "$cfp/env/"
+chmod +x "$cfp/env/gen_env.py"
+cat > "$cfp/cFp.json" <<JSON
+{"cFpMOD": "FMKU60", "cFpSRAtype": "Themisto", "usedRoleDir": "", "usedRoleDir2": "to-be-defined",
+ "roleName1": "default", "roleName2": "to-be-defined"}
+JSON
+# first call generates the env file; setenv.sh does not forward the return code of gen_env.py, so check it here
+if ! "$cfp/env/gen_env.py" > /dev/null; then
+  echo "ERROR: gen_env.py failed, can not measure setenv.sh."
+  exit 1
+fi
+source "$cfp/env/setenv.sh" > /dev/null
+
+now_us() {
+  if [ -n "$EPOCHREALTIME" ]; then
+    echo "${EPOCHREALTIME/[.,]/}"
+  else
+    echo $(( $(date +%s%N) / 1000 ))
+  fi
+}
+
+measure() {
+  local start end
+  start=$(now_us)
+  for ((i = 0; i < iterations; i++)); do
+    source "$cfp/env/setenv.sh" > /dev/null
+  done
+  end=$(now_us)
+  echo $(( (end - start) / iterations ))
+}
+
+unset cFpForceGenEnv
+fast_us=$(measure)
+export cFpForceGenEnv=1
+slow_us=$(measure)
+unset cFpForceGenEnv
+
+echo "setenv.sh latency over $iterations calls (environment up to date):"
+echo "    python path (before): $(( slow_us / 1000 )).$(( slow_us % 1000 / 100 )) ms per call"
+echo "    bash fast path:       $(( fast_us / 1000 )).$(( fast_us % 1000 / 100 )) ms per call"
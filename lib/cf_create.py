@@ -26,9 +26,13 @@
 
 from __future__ import print_function, unicode_literals
 
+import copy
 import json
 import os
+import shlex
+import shutil
 import sys
+import threading
 from docopt import docopt
 import re
 from pprint import pprint
@@ -43,6 +47,8 @@ Usage:
     cFCreate update  <path-to-project-folder>
     cFCreate upgrade (--cfdk-version=<cfdkv> | --cfdk-zip=<path-to-zip>)  [--git-url=<git-url>] <path-to-project-folder>
     cFCreate adorn (--cfa-repo=<cfagit> | --cfa-zip=<path-to-zip>) <folder-name-for-addon> <path-to-project-folder>
+    cFCreate adorn (--manifest=<manifest-file> | (--cfa=<name=source>)...) <path-to-project-folder>
+    cFCreate status [--json] [--no-cfrm] [--jobs=<n>] <workspace-folder>
     
     cFCreate -h|--help
     cFCreate -v|--version
@@ -51,7 +57,9 @@ Commands:
     new             Creates a new cFp based on the given cFDK
     update          Update the environment setting of an existing cFp
     upgrade         Upgrades the cFDK and the environment setting an existing cFp
-    adorn           Installs a cloudFPGA addon (cFa) to an existing cFp
+    adorn           Installs cloudFPGA addons (cFa) to an existing cFp
+    status          Shows the cFDK version, the state of the environment and static DCP, the Roles and cFas of all
+                    cFps below <workspace-folder>
 
 Options:
     -h --help       Show this screen.
@@ -64,6 +72,12 @@ Options:
     --git-init                  Creates the new cFp as git-repo; Adds the cFDK as git submodule, if not using a cfdk-zip
     --cfa-repo=<cfagit>         Link to the cFa git repository
     --cfa-zip=<path-to-zip>     Path to a cFa zip folder
+    --cfa=<name=source>         A cFa to install as <folder-name-for-addon>=<cfagit or path-to-zip> (can be repeated,
+                                the setup scripts run in the given order)
+    --manifest=<manifest-file>  JSON file with the cFas to install and their dependencies (see README)
+    --json                      Prints the status as JSON instead of a table
+    --no-cfrm                   Does not ask CFRM for the latest static DCP of each Shell type
+    --jobs=<n>                  Number of cFps that are scanned in parallel [default: 16]
 
 Copyright IBM Research, licensed under the Apache License 2.0.
 Contact: {ngl,fab,wei, did, hle}@zurich.ibm.com
@@ -72,10 +86,27 @@ Contact: {ngl,fab,wei, did, hle}@zurich.ibm.com
 config_default_cfdk_url = "git@github.ibm.com:cloudFPGA/cFDK.git"
 __me_abs_dir__ = os.path.dirname(os.path.realpath(__file__))
 config_template_folder = os.path.abspath(__me_abs_dir__ + '/../templates')
+sys.path.insert(0, config_template_folder)
+import cf_exec  # noqa: E402
+import cf_status  # noqa: E402
+import cf_template  # noqa: E402
+import cfp_config  # noqa: E402
+import gen_env  # noqa: E402
 
 DEFAULT_MOD = "FMKU60"
 DEFAULT_SRA = "Themisto"
 __env_file_name__ = "this_machine_env.sh"
+__cfenv_small_name__ = "cfenv-small"
+# files copied to <cFp>/env/ (the executable ones are marked with True)
+__env_kit_files__ = [('machine_env.template', False), ('cf_template.py', False), ('cfp_config.py', False),
+                     ('cf_exec.py', False), ('gen_env.py', True), ('setenv.sh', True), ('create_sig.py', False),
+                     ('create_sig.sh', False), ('admin_sig.py', False), ('admin_sig.sh', False),
+                     ('get_latest_dcp.py', False), ('cf_sratool.py', False), ('sra_profiler.py', False),
+                     ('sra_history.py', False), ('sra_matrix.py', False),
+                     ('ip_cache.py', False), ('sra_trash.py', False),
+                     ('sra_retention.py', False), ('sra_archive.py', False),
+                     ('sra_incr.py', False), ('sra_watch.py', False),
+                     ('sra_queue.py', False), ('sra_ledger.py', False)]
 __version_string__ = "This cFp was created by cFCreate " + str(__version__)
 __to_be_defined_key__ = 'to-be-defined'
 __sra_tool_key__ = 'srat-conf'
@@ -143,40 +174,6 @@ vivado_question = {
 # TODO: deactivated for the moment, hard to do machine independent
 # __xilinx_cmd_key__ = "xilinx_cmd"
 
-# TODO: deactivated for the moment
-# __match_regex__ = []
-# __replace_regex__ = []
-#
-# __match_regex__.append("##SOURCE_VIVADO##")
-# __replace_regex__.append(__xilinx_cmd_key__)
-#
-# __match_regex__.append("##ROOTDIR##")
-# __replace_regex__.append("abs_path")
-#
-# __match_regex__.append("##MOD##")
-# __replace_regex__.append("cf_mod")
-#
-# __match_regex__.append("##SRA##")
-# __replace_regex__.append("cf_sra")
-#
-# __match_regex__.append("##DIR1##")
-# __replace_regex__.append("usedRoleDir")
-#
-# __match_regex__.append("##DIR2##")
-# __replace_regex__.append("usedRoleDir2")
-#
-# __match_regex__.append("##ROLE1##")
-# __replace_regex__.append("roleName1")
-#
-# __match_regex__.append("##ROLE2##")
-# __replace_regex__.append("roleName2")
-#
-# __match_regex__.append("##virtual_path##")
-# __replace_regex__.append("cfenvPath")
-#
-# __match_regex__.append("##python3_bin##")
-# __replace_regex__.append("sysPython3Bin")
-
 __SRA_config_keys__ = []
 __SRA_config_keys__.append("additional_lines")  # must be at position 0!
 __SRA_config_keys__.append(__sra_tool_key__)
@@ -186,61 +183,99 @@ __json_backup_keys__.append("additional_lines")
 __json_backup_keys__.append(__sra_tool_key__)
 
 
+def make_executable(file_path):
+    os.chmod(file_path, os.stat(file_path).st_mode | 0o111)
+
+
 def create_cfp_dir_structure(folder_path):
-    os.system("mkdir -p {}/TOP/tcl".format(folder_path))
-    os.system("mkdir -p {}/TOP/hdl".format(folder_path))
-    os.system("mkdir -p {}/TOP/xdc".format(folder_path))
-    os.system("echo 'keep' > {}/TOP/xdc/.gitkeep".format(folder_path))
-    os.system("mkdir -p {}/ROLE/".format(folder_path))
-    os.system("mkdir -p {}/env/".format(folder_path))
+    for sub_dir in ['TOP/tcl', 'TOP/hdl', 'TOP/xdc', 'ROLE', 'env']:
+        os.makedirs("{}/{}".format(folder_path, sub_dir), exist_ok=True)
+    with open("{}/TOP/xdc/.gitkeep".format(folder_path), 'w') as keep_file:
+        keep_file.write('keep\n')
 
 
 def checkout_cfdk(cfdk_tag, cfdk_zip, folder_path, git_url=None, git_init=False):
     if cfdk_zip is not None:
-        rc = os.system("unzip {} -d {}".format(cfdk_zip, folder_path))
+        rc = cf_exec.run('unzip cFDK', ['unzip', cfdk_zip, '-d', folder_path]).rc
         if rc != 0:
             return "ERROR: Failed to unzip cFDK", -1
     else:  # use git
         if git_url is None:
             git_url = config_default_cfdk_url
 
-        tag_str = ""
+        tag_args = []
         git_checkout_version = False
         if cfdk_tag != "latest":
-            tag_str = "-b '{}'".format(cfdk_tag)
+            tag_args = ['-b', cfdk_tag]
             git_checkout_version = True
         if git_init:
-            rc = os.system("cd {}; git submodule add -f {} ./cFDK/".format(folder_path, git_url))
+            rc = cf_exec.run('git submodule add cFDK', ['git', 'submodule', 'add', '-f', git_url, './cFDK/'],
+                             cwd=folder_path, interactive=True).rc
             if rc != 0:
                 return "ERROR: Failed to init submodule cFDK", -1
             if git_checkout_version:
-                os.system("cd {}/cFDK/; git checkout {}".format(folder_path, tag_str))
+                cf_exec.run('git checkout cFDK', ['git', 'checkout'] + tag_args, cwd=folder_path + '/cFDK/')
                 # no error handling for now
         else:
-            rc = os.system("git clone {} --single-branch --depth 1 {} {}/cFDK/".format(tag_str, git_url, folder_path))
+            rc = cf_exec.run('git clone cFDK', ['git', 'clone'] + tag_args +
+                             ['--single-branch', '--depth', '1', git_url, folder_path + '/cFDK/'],
+                             interactive=True).rc
             if rc != 0:
                 return "ERROR: Failed to checkout cFDK", -1
     return "", 0
 
 
+def provision_cfenv(folder_path):
+    # the same as the first `source env/setenv.sh` would do
+    _, sys_py_bin = get_python_envs()
+    cfenv_dir = os.path.abspath("{}/env/{}".format(folder_path, __cfenv_small_name__))
+    return gen_env.provision_cfenv(cfenv_dir, sys_py_bin, os.environ.get(gen_env.__wheelhouse_env_key__))
+
+
 def create_new_cfp(cfdk_tag, cfdk_zip, folder_path, git_url=None, git_init=False):
     if cfdk_tag is None and cfdk_zip is None:
         return "ERROR: Missing mandatory arguments", -2
 
-    os.system("mkdir -p {}".format(folder_path))
+    os.makedirs(folder_path, exist_ok=True)
 
     if git_init:
-        os.system("git init {}".format(folder_path))
-
-    msg, rc = checkout_cfdk(cfdk_tag, cfdk_zip, folder_path, git_url, git_init)
-    if rc != 0:
-        return msg, rc
-
-    create_cfp_dir_structure(folder_path)
-
-    # copy templates that should be copied only during create
-    os.system("cp {0}/gitignore.template {1}/.gitignore".format(config_template_folder, folder_path))
-    os.system("cp {0}/cfdk_Makefile {1}/Makefile".format(config_template_folder, folder_path))
+        cf_exec.run('git init', ['git', 'init', folder_path])
+
+    # the independent steps run concurrently, the steps that need the cFDK follow after the return
+    checkout_msg = []
+
+    def fetch_cfdk():
+        msg, rc = checkout_cfdk(cfdk_tag, cfdk_zip, folder_path, git_url, git_init)
+        checkout_msg.append(msg)
+        return rc
+
+    def copy_create_templates():
+        # copy templates that should be copied only during create
+        shutil.copy("{}/gitignore.template".format(config_template_folder), "{}/.gitignore".format(folder_path))
+        shutil.copy("{}/cfdk_Makefile".format(config_template_folder), "{}/Makefile".format(folder_path))
+        return 0
+
+    def scaffold():
+        create_cfp_dir_structure(folder_path)
+        return 0
+
+    def provision():
+        if provision_cfenv(folder_path) != 0:
+            # not fatal, setenv.sh tries again
+            print("WARNING: Failed to provision the python virtualenv {}.".format(__cfenv_small_name__))
+        return 0
+
+    tasks = [cf_exec.Task('fetch cFDK', fetch_cfdk),
+             cf_exec.Task('scaffold directories', scaffold),
+             cf_exec.Task('copy .gitignore/Makefile', copy_create_templates),
+             cf_exec.Task('provision cfenv-small', provision, deps=['scaffold directories'])]
+    cf_exec.run_dag(tasks)
+    cf_exec.print_critical_path(tasks, title="[cFCreate] Critical path of creating {}".format(folder_path))
+    for t in tasks:
+        if t.rc != 0:
+            if len(checkout_msg) > 0 and checkout_msg[0] != "":
+                return checkout_msg[0], t.rc
+            return "ERROR: Failed to {}".format(t.name), -1
 
     return "", 0
 
@@ -256,21 +291,24 @@ def upgrade_existing_cfdk(cfdk_tag, cfdk_zip, folder_path, git_url=None):
 
     # cleanup old cFDK
     if use_git_flow:
-        rc = os.system("cd {}; git config -f .git/config --remove-section submodule.cFDK".format(folder_abspath))
-        if rc != 0:
-            return "ERROR: Failed to remove old cFDK submodule", -1
-        rc = os.system("cd {}; git config -f .gitmodules --remove-section submodule.cFDK".format(folder_abspath))
-        if rc != 0:
-            return "ERROR: Failed to remove old cFDK submodule", -1
-        rc = os.system("cd {}; git rm --cached cFDK".format(folder_abspath))
-        if rc != 0:
-            return "ERROR: Failed to remove old cFDK submodule", -1
-        rc = os.system("cd {}; rm -rf .git/modules/cFDK".format(folder_abspath))
-        if rc != 0:
+        for git_args in [['config', '-f', '.git/config', '--remove-section', 'submodule.cFDK'],
+                         ['config', '-f', '.gitmodules', '--remove-section', 'submodule.cFDK'],
+                         ['rm', '--cached', 'cFDK']]:
+            rc = cf_exec.run('git ' + git_args[0], ['git'] + git_args, cwd=folder_abspath).rc
+            if rc != 0:
+                return "ERROR: Failed to remove old cFDK submodule", -1
+        try:
+            shutil.rmtree("{}/.git/modules/cFDK".format(folder_abspath), ignore_errors=False)
+        except FileNotFoundError:
+            pass
+        except OSError:
             return "ERROR: Failed to remove old cFDK submodule", -1
     # in all cases
-    rc = os.system("cd {}; rm -rf cFDK".format(folder_abspath))
-    if rc != 0:
+    try:
+        shutil.rmtree("{}/cFDK".format(folder_abspath))
+    except FileNotFoundError:
+        pass
+    except OSError:
         return "ERROR: Failed to remove old cFDK folder", -1
 
     msg, rc = checkout_cfdk(cfdk_tag, cfdk_zip, folder_path, git_url, git_init=use_git_flow)
@@ -278,7 +316,8 @@ def upgrade_existing_cfdk(cfdk_tag, cfdk_zip, folder_path, git_url=None):
         return msg, rc
 
     if use_git_flow:
-        os.system("cd {}; git commit -m'[cFCreate] clean-up and upgrade of cFDK'".format(folder_abspath))
+        cf_exec.run('git commit', ['git', 'commit', '-m', '[cFCreate] clean-up and upgrade of cFDK'],
+                    cwd=folder_abspath)
     return "", 0
 
 
@@ -348,30 +387,26 @@ def get_python_envs():
     else:
         # as fallback, better than nothing
         # returns the virtualenv python
-        sys_py_bin = os.popen('which python3').read()
+        sys_py_bin = shutil.which('python3')
     return cfenv_path, sys_py_bin
 
 
 def create_json(folder_path, envs):
-    json_data = {}
-    json_data['version'] = __version_string__
-    json_data['cFpMOD'] = envs['cf_mod']
-    json_data['cFpSRAtype'] = envs['cf_sra']
-    json_data['usedRoleDir'] = envs['usedRoleDir']
-    json_data['usedRoleDir2'] = envs['usedRoleDir2']
-    json_data['roleName1'] = envs['roleName1']
-    json_data['roleName2'] = envs['roleName2']
+    # returns a new configuration, which replaces cFp.json once flushed
+    cfp_data = cfp_config.CfpConfig("{}/cFp.json".format(folder_path))
+    cfp_data['version'] = __version_string__
+    cfp_data.cFpMOD = envs['cf_mod']
+    cfp_data.cFpSRAtype = envs['cf_sra']
+    cfp_data['usedRoleDir'] = envs['usedRoleDir']
+    cfp_data['usedRoleDir2'] = envs['usedRoleDir2']
+    cfp_data['roleName1'] = envs['roleName1']
+    cfp_data['roleName2'] = envs['roleName2']
     if 'additional_lines' in envs:
-        json_data['additional_lines'] = envs['additional_lines']
-
-    with open("{}/cFp.json".format(folder_path), "w+") as json_file:
-        json.dump(json_data, json_file, indent=4)
-
+        cfp_data.additional_lines = envs['additional_lines']
+    return cfp_data
 
-def update_json(folder_path, new_entries=None, update_list=None):
-    with open("{}/cFp.json".format(folder_path), "r") as json_file:
-        data = json.load(json_file)
 
+def apply_json_update(data, new_entries=None, update_list=None):
     if new_entries is not None:
         for e in new_entries:
             data[e] = new_entries[e]
@@ -384,6 +419,7 @@ def update_json(folder_path, new_entries=None, update_list=None):
                     data[e] = list(set(new_list))
                 elif type(data[e]) is dict:
                     data[e].update(update_list[e])
+                    data.mark_dirty(e)
                 else:
                     print("Warning: forced to overwrite config parameter {} (previous value {})".format(e, data[e]))
                     data[e] = update_list[e]
@@ -394,23 +430,22 @@ def update_json(folder_path, new_entries=None, update_list=None):
     # in all cases, update the version
     data['version'] = __version_string__
 
-    with open("{}/cFp.json".format(folder_path), "w") as json_file:
-        json.dump(data, json_file, indent=4)
+
+def update_json(folder_path, new_entries=None, update_list=None):
+    with cfp_config.transaction("{}/cFp.json".format(folder_path)) as data:
+        apply_json_update(data, new_entries=new_entries, update_list=update_list)
 
 
-def copy_templates_and_set_env(folder_path, envs, backup_json=False):
+def copy_templates_and_set_env(folder_path, envs, backup_config=None):
     additional_envs = {}
-    if backup_json:
-        json_path = "{}/cFp.json".format(folder_path)
-        if os.path.exists(json_path):
-            with open(json_path, 'r') as json_file:
-                data = json.load(json_file)
-            for k in __json_backup_keys__:
-                if k in data.keys():
-                    additional_envs[k] = data[k]
+    if backup_config is not None:
+        for k in __json_backup_keys__:
+            if k in backup_config:
+                # (each key keeps its type, e.g. srat-conf is a dict)
+                additional_envs[k] = copy.deepcopy(backup_config[k])
 
-    os.system("cp {0}/cFDK/SRA/LIB/TOP/{1}/top.vhdl {0}/TOP/hdl/top.vhdl".format(
-        folder_path, envs['cf_sra']))
+    shutil.copy("{0}/cFDK/SRA/LIB/TOP/{1}/top.vhdl".format(folder_path, envs['cf_sra']),
+                "{0}/TOP/hdl/top.vhdl".format(folder_path))
 
     json_extend = False
     config_file = "{0}/cFDK/SRA/LIB/TOP/{1}/config.json".format(
@@ -421,7 +456,9 @@ def copy_templates_and_set_env(folder_path, envs, backup_json=False):
         for k in __SRA_config_keys__:
             if k in data.keys():
                 json_extend = True
-                if k in additional_envs.keys():
+                if k in additional_envs.keys() and type(additional_envs[k]) is dict:
+                    additional_envs[k].update(data[k])
+                elif k in additional_envs.keys():
                     additional_envs[k].extend(data[k])
                 else:
                     additional_envs[k] = data[k]
@@ -434,96 +471,231 @@ def copy_templates_and_set_env(folder_path, envs, backup_json=False):
     #     json_extend = True
 
     # update tcl (Makefile only during create, just to not overwrite cFa's)
-    os.system("cp -Rf {0}/cFDK/SRA/LIB/TOP/tcl/ {0}/TOP/".format(folder_path))
+    shutil.copytree("{0}/cFDK/SRA/LIB/TOP/tcl/".format(folder_path), "{0}/TOP/tcl/".format(folder_path),
+                    dirs_exist_ok=True)
 
     # env_file = "{}/env/setenv.sh".format(folder_path)
     env_file = "{}/env/{}".format(folder_path, __env_file_name__)
     # just to be sure...
-    os.system("mkdir -p {}/env/".format(folder_path))
+    os.makedirs("{}/env/".format(folder_path), exist_ok=True)
 
     # copy cFp kit
-    os.system("cp {}/machine_env.template {}/env/".format(config_template_folder, folder_path))
-    os.system("cp {}/gen_env.py {}/env/".format(config_template_folder, folder_path))
-    os.system("cp {}/setenv.sh {}/env/".format(config_template_folder, folder_path))
-    os.system("chmod +x {}/env/setenv.sh".format(folder_path))
-    os.system("chmod +x {}/env/gen_env.py".format(folder_path))
-    os.system("cp {}/create_sig.py {}/env/".format(config_template_folder, folder_path))
-    os.system("cp {}/create_sig.sh {}/env/".format(config_template_folder, folder_path))
-    os.system("cp {}/admin_sig.py {}/env/".format(config_template_folder, folder_path))
-    os.system("cp {}/admin_sig.sh {}/env/".format(config_template_folder, folder_path))
-    os.system("cp {}/get_latest_dcp.py {}/env/".format(config_template_folder, folder_path))
-    os.system("cp {}/cf_sratool.py {}/env/".format(config_template_folder, folder_path))
-    os.system("cp {}/sra {}/".format(config_template_folder, folder_path))
-    os.system("chmod +x {}/sra".format(folder_path))
+    for kit_file, is_executable in __env_kit_files__:
+        shutil.copy("{}/{}".format(config_template_folder, kit_file), "{}/env/".format(folder_path))
+        if is_executable:
+            make_executable("{}/env/{}".format(folder_path, kit_file))
+    shutil.copy("{}/sra".format(config_template_folder), "{}/".format(folder_path))
+    make_executable("{}/sra".format(folder_path))
 
     if os.path.isdir(folder_path + '.git/'):
         # git config, add new files
-        os.system("cd {}; git add sra env/".format(folder_path))
-
-    create_json(folder_path, envs)
-    if json_extend or backup_json:
-        update_json(folder_path, update_list=additional_envs)
-    # now, load new data
-    with open("{}/cFp.json".format(folder_path), "r") as json_file:
-        cfp_data = json.load(json_file)
-    envs.update(cfp_data)
-
-    # adding python env
-    cfenv_path, sys_py_bin = get_python_envs()
-    envs['cfenvPath'] = cfenv_path
+        cf_exec.run('git add', ['git', 'add', 'sra', 'env/'], cwd=folder_path)
+
+    cfp_data = create_json(folder_path, envs)
+    if json_extend or backup_config is not None:
+        apply_json_update(cfp_data, update_list=additional_envs)
+    cfp_data.flush()
+    # the written configuration must be usable by sra
+    try:
+        cfp_config.CfpConfig.load(cfp_data.path)
+    except cfp_config.CfpConfigError as e:
+        print("ERROR: The updated {} is invalid: {}".format(cfp_data.path, e))
+        return 1
+    envs.update(cfp_data.to_dict())
+
+    # adding python env (the virtualenv itself is provisioned by gen_env.py, during the first setenv.sh)
+    _, sys_py_bin = get_python_envs()
+    envs['abs_path'] = os.path.realpath(folder_path)
+    envs['cfenvPath'] = "{}/env/{}".format(envs['abs_path'], __cfenv_small_name__)
     envs['sysPython3Bin'] = sys_py_bin
-
-    # TODO: deactivated for the moment, is done by sra tool anyhow (and better)
-    # with open("{}/machine_env.template".format(config_template_folder), "r") as input, open(env_file, "w") as outfile:
-    #     out = input.read()
-    #     for i in range(0, len(__match_regex__)):
-    #         out = re.sub(re.escape(__match_regex__[i]), envs[__replace_regex__[i]], out)
-    #     outfile.write(out)
-    # os.system("chmod +x {}".format(env_file))
+    envs['sysPython3Hint0'] = os.environ.get('cFsysPy3_cmd_hint_0', 'failed')
+    envs['sysPython3Hint1'] = os.environ.get('cFsysPy3_cmd_hint_1', 'failed')
+
+    with open("{}/machine_env.template".format(config_template_folder), "r") as input:
+        template = input.read()
+    try:
+        out = cf_template.render_machine_env(template, envs)
+    except cf_template.TemplateError as e:
+        print("ERROR: Failed to create {}: {}".format(env_file, e))
+        return 1
+    with open(env_file, "w") as outfile:
+        outfile.write(out)
+    make_executable(env_file)
 
     return 0
 
 
-def install_cfa(folder_path, addon_name, git_url=None, zip_path=None):
-    if git_url is None and zip_path is None:
-        return "ERROR: Missing mandatory arguments", 1
-
+def load_cfa_manifest(manifest_file):
+    """Returns the cFas of a manifest, a JSON file like
+    {"cFa": [{"name": "<folder>", "repo": "<git-url>" | "zip": "<path>", "requires": ["<folder>", ...]}, ...]}
+    (relative zip paths are relative to the manifest).
+    """
+    with open(manifest_file, 'r') as json_file:
+        data = json.load(json_file)
+    cfas = []
+    for entry in data.get('cFa', []):
+        if 'name' not in entry or ('repo' in entry) == ('zip' in entry):
+            raise ValueError("every cFa needs a name and either a repo or a zip")
+        zip_path = None
+        if 'zip' in entry:
+            zip_path = os.path.join(os.path.dirname(os.path.abspath(manifest_file)), entry['zip'])
+        cfas.append({'name': entry['name'], 'repo': entry.get('repo'), 'zip': zip_path,
+                     'requires': list(entry.get('requires', []))})
+    return cfas
+
+
+def parse_cfa_specs(specs):
+    # <name>=<git-url or zip>; without a manifest, the setup scripts run in the given order
+    cfas = []
+    for spec in specs:
+        name, sep, source = spec.partition('=')
+        if sep == '' or name == '' or source == '':
+            raise ValueError("invalid cFa {} (expected <folder-name-for-addon>=<cfagit or path-to-zip>)".format(spec))
+        cfa = {'name': name, 'repo': source, 'zip': None, 'requires': []}
+        if source.endswith('.zip'):
+            cfa['repo'] = None
+            cfa['zip'] = source
+        if len(cfas) > 0:
+            cfa['requires'].append(cfas[-1]['name'])
+        cfas.append(cfa)
+    return cfas
+
+
+def check_cfa_dependencies(cfas, installed):
+    names = [c['name'] for c in cfas]
+    if len(set(names)) != len(names):
+        return "ERROR: A cFa is listed more than once"
+    requires = {c['name']: [r for r in c['requires'] if r not in installed] for c in cfas}
+    for name, deps in requires.items():
+        for r in deps:
+            if r not in requires:
+                return "ERROR: cFa {} requires {}, which is neither installed nor listed".format(name, r)
+    # cycles (depth-first search)
+    state = {}
+
+    def visit(name):
+        if state.get(name) == 'done':
+            return False
+        if state.get(name) == 'visiting':
+            return True
+        state[name] = 'visiting'
+        if any([visit(r) for r in requires[name]]):
+            return True
+        state[name] = 'done'
+        return False
+
+    for name in requires:
+        if visit(name):
+            return "ERROR: The dependencies of the cFas contain a cycle (at {})".format(name)
+    return ""
+
+
+def install_cfas(folder_path, cfas):
+    """Fetches (clones or unzips) all cFas concurrently, runs their setup scripts in dependency order and records
+    them with one update of cFp.json (and one commit).
+    """
+    if len(cfas) == 0:
+        return "ERROR: No cFa to install", 1
     folder_abspath = os.path.abspath(folder_path)
+    is_git = os.path.isdir("{}/.git/".format(folder_abspath))
+    try:
+        installed = cfp_config.load("{}/cFp.json".format(folder_abspath)).get('cFa', [])
+    except (OSError, ValueError):
+        installed = []
+    msg = check_cfa_dependencies(cfas, installed)
+    if msg != "":
+        return msg, 1
+    for cfa in cfas:
+        if os.path.exists("{}/{}".format(folder_abspath, cfa['name'])):
+            return "ERROR: {}/{} exists already".format(folder_abspath, cfa['name']), 1
+
+    executor = cf_exec.Executor()
+    # registering submodules changes .gitmodules and the index of the cFp, so it can not be done concurrently
+    git_lock = threading.Lock()
+
+    def fetch(cfa):
+        target = "{}/{}/".format(folder_abspath, cfa['name'])
+        if cfa['zip'] is not None:
+            return executor.run_step(cf_exec.Step('unzip cFa', ['unzip', cfa['zip'], '-d', target]),
+                                     prefix=cfa['name']).rc
+        # interactive: git may ask for the credentials of a private repository
+        rc = executor.run_step(cf_exec.Step('git clone cFa', ['git', 'clone', cfa['repo'], target], interactive=True),
+                               prefix=cfa['name']).rc
+        if rc != 0 or not is_git:
+            return rc
+        with git_lock:
+            # (uses the existing clone)
+            rc = executor.run_step(cf_exec.Step('git submodule add cFa', ['git', 'submodule', 'add', '-f', cfa['repo'],
+                                                                          './{}/'.format(cfa['name'])],
+                                                cwd=folder_abspath, interactive=True), prefix=cfa['name']).rc
+            if rc == 0:
+                rc = executor.run_step(cf_exec.Step('git submodule absorbgitdirs',
+                                                    ['git', 'submodule', 'absorbgitdirs', './{}/'.format(cfa['name'])],
+                                                    cwd=folder_abspath), prefix=cfa['name']).rc
+        return rc
+
+    def setup(cfa):
+        cmd_str = "source {}/env/setenv.sh && {}/{}/install/setup.sh {}".format(
+            shlex.quote(folder_abspath), shlex.quote(folder_abspath), shlex.quote(cfa['name']),
+            shlex.quote(cfa['name']))
+        print(cmd_str)
+        # interactive: the setup scripts may ask questions (without a trailing newline)
+        return executor.run_step(cf_exec.Step('setup cFa', ['/bin/bash', '-c', cmd_str], cwd=folder_abspath,
+                                              interactive=True), prefix=cfa['name']).rc
+
+    def prepare_env():
+        # the first setenv.sh may (re-)create the environment, the concurrent setups then take its fast path
+        return executor.run_step(cf_exec.Step('setenv', ['/bin/bash', '-c', "source {}/env/setenv.sh".format(
+            shlex.quote(folder_abspath))], cwd=folder_abspath, interactive=True), prefix='setenv').rc
+
+    names = [c['name'] for c in cfas]
+    tasks = [cf_exec.Task('setenv', prepare_env)]
+    for cfa in cfas:
+        tasks.append(cf_exec.Task('fetch ' + cfa['name'], lambda c=cfa: fetch(c)))
+        tasks.append(cf_exec.Task('setup ' + cfa['name'], lambda c=cfa: setup(c),
+                                  deps=['setenv', 'fetch ' + cfa['name']] +
+                                       ['setup ' + r for r in cfa['requires'] if r in names]))
+    cf_exec.run_dag(tasks)
+    if len(cfas) > 1:
+        cf_exec.print_critical_path(tasks, title="[cFCreate] Critical path of installing {}".format(', '.join(names)))
+    by_name = {t.name: t for t in tasks}
+    done = [c['name'] for c in cfas if by_name['setup ' + c['name']].rc == 0]
+    failed = [t.name for t in tasks if t.rc is not None and t.rc != 0]
+
+    if len(done) > 0:
+        update_json_data = {}
+        update_json_data['additional_lines'] = ['export {}Dir="$rootDir/{}/"'.format(n.lower(), n) for n in done]
+        update_json_data['cFa'] = [str(n) for n in done]
+        update_json(folder_path, update_list=update_json_data)
+
+        # commit changes if it is a git
+        if is_git:
+            cf_exec.run('git add', ['git', 'add'] + ['./{}/'.format(n) for n in done], cwd=folder_abspath)
+            cf_exec.run('git commit', ['git', 'commit', '-a', '-m', 'Installed cFa {}'.format(', '.join(done))],
+                        cwd=folder_abspath)
+
+    if len(failed) > 0:
+        return "ERROR: Failed to {} (installed: {})".format(', '.join(failed), ', '.join(done) or 'none'), 1
+    return "SUCCESSfully added cFa {}!".format(', '.join(done)), 0
 
-    if zip_path is not None:
-        rc = os.system("unzip {} -d {}/{}/".format(zip_path, folder_abspath, addon_name))
-        if rc != 0:
-            return "ERROR: Failed to unzip cFa", 1
-    else:  # use git
-        rc = os.system("cd {}; git submodule add -f {} ./{}/".format(folder_abspath, git_url, addon_name))
-        if rc != 0:
-            return "ERROR: Failed to add submodule cFa", 1
-
-    # execute setup script
-    cmd_str = "/bin/bash -c \"source {}/env/setenv.sh && {}/{}/install/setup.sh '{}'\"".format(folder_abspath,
-                                                                                               folder_abspath,
-                                                                                               addon_name, addon_name)
-    print(cmd_str)
-    rc = os.system(cmd_str)
-    if rc != 0:
-        return "ERROR: Failed to setup cFa", 1
-
-    update_json_data = {}
-    update_json_data['additional_lines'] = ['export {}Dir="$rootDir/{}/"'.format(addon_name.lower(), addon_name)]
-    update_json_data['cFa'] = [str(addon_name)]
-    # update_json(folder_path, update_json_data)
-    update_json(folder_path, update_list=update_json_data)
 
-    # commit changes if it is a git
-    os.system("[ -d {}/.git/ ] && (cd {}; git add ./{}/ ;git commit -a -m'Installed cFa {}')".format(
-        folder_abspath, folder_abspath, addon_name, addon_name))
-
-    return "SUCCESSfully added cFa {}!".format(addon_name), 0
+def install_cfa(folder_path, addon_name, git_url=None, zip_path=None):
+    if git_url is None and zip_path is None:
+        return "ERROR: Missing mandatory arguments", 1
+    return install_cfas(folder_path, [{'name': addon_name, 'repo': git_url, 'zip': zip_path, 'requires': []}])
 
 
 def main():
-    from PyInquirer import prompt, print_json
     arguments = docopt(docstr, version=__version__)
+    if arguments['status']:
+        try:
+            jobs = int(arguments['--jobs'])
+        except ValueError:
+            print("ERROR: Invalid number of jobs {}".format(arguments['--jobs']))
+            exit(1)
+        exit(cf_status.main(arguments['<workspace-folder>'], as_json=arguments['--json'], jobs=jobs,
+                            use_cfrm=not arguments['--no-cfrm']))
+    from PyInquirer import prompt, print_json
 
     folder_path = arguments['<path-to-project-folder>']
     # if folder_path[-1] == '/':
@@ -538,8 +710,19 @@ def main():
             print(msg)
             exit(1)
     elif arguments['adorn']:
-        msg, rc = install_cfa(folder_path, arguments['<folder-name-for-addon>'], git_url=arguments['--cfa-repo'],
-                              zip_path=arguments['--cfa-zip'])
+        if arguments['--manifest'] is not None or len(arguments['--cfa']) > 0:
+            try:
+                if arguments['--manifest'] is not None:
+                    cfas = load_cfa_manifest(arguments['--manifest'])
+                else:
+                    cfas = parse_cfa_specs(arguments['--cfa'])
+            except (OSError, ValueError) as e:
+                print("ERROR: Invalid list of cFas: {}".format(e))
+                exit(1)
+            msg, rc = install_cfas(folder_path, cfas)
+        else:
+            msg, rc = install_cfa(folder_path, arguments['<folder-name-for-addon>'],
+                                  git_url=arguments['--cfa-repo'], zip_path=arguments['--cfa-zip'])
         print(msg)
         exit(rc)
     elif arguments['upgrade']:
@@ -551,20 +734,16 @@ def main():
         also_do_update = True
 
     question_defaults = None
+    existing_cfp_data = None
     if arguments['update'] or also_do_update:
         json_path = "{}/cFp.json".format(folder_path)
         if os.path.exists(json_path):
             question_defaults = {}
-            with open(json_path, 'r') as json_file:
-                data = json.load(json_file)
-            if "roleName1" in data.keys():
-                question_defaults['roleName1'] = data['roleName1']
-            if "roleName2" in data.keys():
-                question_defaults['roleName2'] = data['roleName2']
-            if "usedRoleDir" in data.keys():
-                question_defaults['usedRoleDir'] = data['usedRoleDir']
-            if "usedRoleDir2" in data.keys():
-                question_defaults['usedRoleDir2'] = data['usedRoleDir2']
+            # not validated, since update is also meant to fix an invalid cFp.json
+            existing_cfp_data = cfp_config.CfpConfig.load(json_path, validate=False)
+            for k in ['roleName1', 'roleName2', 'usedRoleDir', 'usedRoleDir2']:
+                if k in existing_cfp_data:
+                    question_defaults[k] = existing_cfp_data[k]
 
     questions = prepare_questions(folder_path, additional_defaults=question_defaults)
     answers = prompt(questions)
@@ -609,14 +788,16 @@ def main():
     envs['abs_path'] = os.path.abspath(folder_path)
     # pprint(envs)
 
-    backup_json = False
+    backup_cfp_data = None
     if arguments["update"]:
-        backup_json = True
+        backup_cfp_data = existing_cfp_data
 
-    copy_templates_and_set_env(folder_path, envs, backup_json=backup_json)
+    if copy_templates_and_set_env(folder_path, envs, backup_config=backup_cfp_data) != 0:
+        exit(1)
 
     if arguments['--git-init']:
-        os.system("cd {}; git add .; git commit -m'cFp init by cFCreate'".format(folder_path))
+        cf_exec.run('git add', ['git', 'add', '.'], cwd=folder_path)
+        cf_exec.run('git commit', ['git', 'commit', '-m', 'cFp init by cFCreate'], cwd=folder_path)
         print("To complete the git repository initialization execute: \n" +
               "\t$ git remote add origin <remote-repository-URL>\n" +
               "\t$ git push origin master\n")
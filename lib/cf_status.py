@@ -0,0 +1,344 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Status of all cFps below a workspace folder (cFCreate status): cFDK version, state of the machine
+#  *       environment, static DCP, Roles and cFas. The projects are scanned by a thread pool, the results are
+#  *       cached per project (valid as long as the mtimes of the inspected files are unchanged) and CFRM is asked
+#  *       once per Shell type.
+#  *
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import cfp_config
+import get_latest_dcp
+
+__cache_file_env_key__ = 'cFpStatusCache'
+__cache_file_default__ = '~/.cache/cloudFPGA/cfcreate-status.json'
+__cache_version__ = 1
+__cfp_json_name__ = 'cFp.json'
+__env_file_name__ = 'env/this_machine_env.sh'
+# the inputs of this_machine_env.sh, as checked by gen_env.py
+__env_input_names__ = [__cfp_json_name__, 'env/machine_env.template', 'env/gen_env.py']
+__cfdk_folder_name__ = 'cFDK'
+# not searched for cFps (e.g. the matrix workspaces below .sra/ contain a cFp.json, too)
+__skip_dir_prefixes__ = ('.',)
+__skip_dirs__ = ['__pycache__', 'node_modules']
+__cfrm_timeout_s__ = 10
+
+__env_ok__ = 'ok'
+__env_stale__ = 'stale'
+__env_missing__ = 'missing'
+__dcp_up_to_date__ = 'up-to-date'
+__dcp_outdated__ = 'outdated'
+__dcp_missing__ = 'none'
+__dcp_unknown__ = 'unknown'
+
+
+def get_cache_file():
+    return os.path.abspath(os.path.expanduser(os.environ.get(__cache_file_env_key__, __cache_file_default__)))
+
+
+def find_cfps(workspace_root):
+    """All folders below workspace_root that contain a cFp.json (cFps are not searched for nested cFps)."""
+    cfps = []
+    for root, dirs, files in os.walk(workspace_root):
+        if __cfp_json_name__ in files:
+            cfps.append(root)
+            dirs[:] = []
+            continue
+        dirs[:] = sorted([d for d in dirs if not d.startswith(__skip_dir_prefixes__) and d not in __skip_dirs__])
+    return cfps
+
+
+def get_mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def read_text(path):
+    try:
+        with open(path, 'r') as infile:
+            return infile.read().strip()
+    except OSError:
+        return None
+
+
+def get_git_dir(repo_dir):
+    git_path = os.path.join(repo_dir, '.git')
+    if os.path.isdir(git_path):
+        return git_path
+    # submodules have a .git file pointing to the git dir in the super project
+    content = read_text(git_path)
+    if content is not None and content.startswith('gitdir:'):
+        return os.path.normpath(os.path.join(repo_dir, content[len('gitdir:'):].strip()))
+    return None
+
+
+def get_git_head(repo_dir, deps):
+    """Returns (branch or None, commit sha or None, tags of the commit), without starting git; the files that
+    were read are added to deps.
+    """
+    git_dir = get_git_dir(repo_dir)
+    if git_dir is None:
+        return None, None, []
+    head_file = os.path.join(git_dir, 'HEAD')
+    packed_refs_file = os.path.join(git_dir, 'packed-refs')
+    deps[head_file] = get_mtime_ns(head_file)
+    deps[packed_refs_file] = get_mtime_ns(packed_refs_file)
+    packed_refs = {}
+    peeled = {}
+    last_ref = None
+    for line in (read_text(packed_refs_file) or '').splitlines():
+        if line.startswith('#'):
+            continue
+        if line.startswith('^'):
+            # the commit of the annotated tag in the line before
+            peeled[last_ref] = line[1:]
+            continue
+        parts = line.split(' ')
+        if len(parts) == 2:
+            packed_refs[parts[1]] = parts[0]
+            last_ref = parts[1]
+    tags_dir = os.path.join(git_dir, 'refs', 'tags')
+    deps[tags_dir] = get_mtime_ns(tags_dir)
+    if os.path.isdir(tags_dir):
+        # (only lightweight tags can be matched here, annotated ones are peeled in packed-refs only)
+        for tag in os.listdir(tags_dir):
+            packed_refs['refs/tags/' + tag] = read_text(os.path.join(tags_dir, tag))
+    head = read_text(head_file) or ''
+    branch = None
+    sha = head or None
+    if head.startswith('ref:'):
+        ref = head[len('ref:'):].strip()
+        branch = ref.split('refs/heads/')[-1]
+        ref_file = os.path.join(git_dir, ref)
+        deps[ref_file] = get_mtime_ns(ref_file)
+        sha = read_text(ref_file) or packed_refs.get(ref)
+    tags = sorted([r.split('refs/tags/')[-1] for r, s in packed_refs.items()
+                   if r.startswith('refs/tags/') and sha is not None and peeled.get(r, s) == sha])
+    return branch, sha, tags
+
+
+def scan_cfp(cfp_root):
+    """Returns (status dict, deps), deps are the files (path -> mtime) the status depends on."""
+    deps = {}
+    cfp_json_file = os.path.join(cfp_root, __cfp_json_name__)
+    status = {'path': cfp_root, 'mod': None, 'sra': None, 'cfdk_version': None, 'cfdk_commit': None,
+              'env': None, 'dcp_id': None, 'roles': [], 'active_role': None, 'cfa': [], 'has_credentials': False,
+              'error': None}
+    for name in __env_input_names__ + [__env_file_name__]:
+        deps[os.path.join(cfp_root, name)] = get_mtime_ns(os.path.join(cfp_root, name))
+    try:
+        cfp_data = cfp_config.load(cfp_json_file)
+    except (OSError, ValueError) as e:
+        status['error'] = 'invalid {}: {}'.format(__cfp_json_name__, e)
+        return status, deps
+    status['mod'] = cfp_data.get('cFpMOD')
+    status['sra'] = cfp_data.get('cFpSRAtype')
+    status['cfa'] = list(cfp_data.get('cFa', []))
+    sra_conf = cfp_data.get(cfp_config.__sra_key__, {})
+    status['roles'] = [r['name'] for r in sra_conf.get(cfp_config.__roles_key__, []) if 'name' in r]
+    status['active_role'] = sra_conf.get('active_role')
+
+    # the same check as gen_env.py (and setenv.sh) do
+    env_time = deps[os.path.join(cfp_root, __env_file_name__)]
+    input_times = [deps[os.path.join(cfp_root, n)] for n in __env_input_names__]
+    if env_time is None:
+        status['env'] = __env_missing__
+    elif env_time >= max([t for t in input_times if t is not None] or [0]):
+        status['env'] = __env_ok__
+    else:
+        status['env'] = __env_stale__
+
+    cfdk_dir = os.path.join(cfp_root, __cfdk_folder_name__)
+    deps[os.path.join(cfdk_dir, '.git')] = get_mtime_ns(os.path.join(cfdk_dir, '.git'))
+    branch, sha, tags = get_git_head(cfdk_dir, deps)
+    if sha is not None:
+        status['cfdk_commit'] = sha
+        status['cfdk_version'] = tags[-1] if len(tags) > 0 else (branch or 'detached')
+    elif os.path.isdir(cfdk_dir):
+        # e.g. from a cFDK zip
+        status['cfdk_version'] = 'no git'
+
+    if status['mod'] is not None:
+        meta_file = os.path.join(cfp_root, 'dcps', '3_top{}_STATIC.json'.format(status['mod']))
+        deps[meta_file] = get_mtime_ns(meta_file)
+        if deps[meta_file] is not None:
+            try:
+                meta = cfp_config.load(meta_file)
+                # for Mantles
+                status['dcp_id'] = meta.get('pl_id', meta.get('id'))
+            except (OSError, ValueError):
+                pass
+    credentials_file = os.path.join(cfp_root, get_latest_dcp.__credentials_file_name__)
+    deps[credentials_file] = get_mtime_ns(credentials_file)
+    status['has_credentials'] = deps[credentials_file] is not None
+    return status, deps
+
+
+def load_cache():
+    try:
+        with open(get_cache_file(), 'r') as json_file:
+            cache = json.load(json_file)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('version') != __cache_version__:
+        return {}
+    return cache.get('projects', {})
+
+
+def write_cache(projects):
+    cache_file = get_cache_file()
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file + '.tmp', 'w') as json_file:
+            json.dump({'version': __cache_version__, 'projects': projects}, json_file)
+        os.replace(cache_file + '.tmp', cache_file)
+    except OSError as e:
+        print("WARNING: Failed to write the status cache {}: {}".format(cache_file, e), file=sys.stderr)
+
+
+def is_cache_valid(entry):
+    for path, mtime in entry['deps'].items():
+        if get_mtime_ns(path) != mtime:
+            return False
+    return True
+
+
+def get_cfrm_latest(sra_type, credentials_file):
+    """Id of the latest static DCP of sra_type at CFRM (one request for all cFps of that Shell type)."""
+    try:
+        with open(credentials_file, 'r') as json_file:
+            credentials = json.load(json_file)['credentials']
+        r = requests.get("http://" + get_latest_dcp.__cf_manager_url__ + "/composablelogic/by_shell/" + str(sra_type),
+                         params={'username': credentials['username'], 'password': credentials['password']},
+                         timeout=__cfrm_timeout_s__)
+        if r.status_code != 200:
+            return None
+        return json.loads(r.text)[-1]['id']
+    except Exception:
+        return None
+
+
+def add_cfrm_status(statuses, jobs):
+    by_sra = {}
+    for s in statuses:
+        if s['sra'] is not None and s['has_credentials']:
+            # the credentials of any cFp of this Shell type will do
+            by_sra.setdefault(s['sra'], os.path.join(s['path'], get_latest_dcp.__credentials_file_name__))
+    with ThreadPoolExecutor(max_workers=max(min(jobs, len(by_sra)), 1)) as pool:
+        latest = dict(zip(by_sra.keys(), pool.map(lambda e: get_cfrm_latest(*e), by_sra.items())))
+    for s in statuses:
+        s['dcp_latest'] = latest.get(s['sra'])
+        if s['dcp_id'] is None:
+            s['dcp'] = __dcp_missing__
+        elif s['dcp_latest'] is None:
+            s['dcp'] = __dcp_unknown__
+        elif s['dcp_latest'] == s['dcp_id']:
+            s['dcp'] = __dcp_up_to_date__
+        else:
+            s['dcp'] = __dcp_outdated__
+
+
+def get_status(workspace_root, jobs=16, use_cfrm=True):
+    """Returns (list of status dicts, number of cFps taken from the cache)."""
+    workspace_root = os.path.abspath(workspace_root)
+    cfps = [os.path.abspath(c) for c in find_cfps(workspace_root)]
+    cache = load_cache()
+
+    def scan(cfp_root):
+        entry = cache.get(cfp_root)
+        if entry is not None and is_cache_valid(entry):
+            return entry, True
+        status, deps = scan_cfp(cfp_root)
+        return {'status': status, 'deps': deps}, False
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        results = list(pool.map(scan, cfps))
+    cached = len([r for r in results if r[1]])
+    # (the cFps that were removed from this workspace are dropped from the cache)
+    removed = [p for p in cache if p.startswith(workspace_root + os.sep) and p not in cfps]
+    if cached < len(results) or len(removed) > 0:
+        for p in removed:
+            del cache[p]
+        for cfp_root, (entry, _) in zip(cfps, results):
+            cache[cfp_root] = entry
+        write_cache(cache)
+    statuses = [dict(entry['status']) for entry, _ in results]
+    if use_cfrm:
+        add_cfrm_status(statuses, jobs)
+    else:
+        for s in statuses:
+            s['dcp_latest'] = None
+            s['dcp'] = __dcp_missing__ if s['dcp_id'] is None else __dcp_unknown__
+    return statuses, cached
+
+
+def print_table(statuses, workspace_root):
+    header = ['cFp', 'Shell/MOD', 'cFDK', 'commit', 'env', 'DCP', 'roles', 'cFa']
+    rows = []
+    errors = []
+    for s in statuses:
+        if s['error'] is not None:
+            errors.append("ERROR: {}: {}".format(os.path.relpath(s['path'], workspace_root), s['error']))
+            continue
+        dcp = '-'
+        if s['dcp_id'] is not None:
+            dcp = '{} ({})'.format(s['dcp_id'], s['dcp'])
+            if s['dcp'] == __dcp_outdated__:
+                dcp = '{} (latest {})'.format(s['dcp_id'], s['dcp_latest'])
+        roles = ','.join([r + ('*' if r == s['active_role'] else '') for r in s['roles']]) or '-'
+        rows.append([os.path.relpath(s['path'], workspace_root), '{}/{}'.format(s['sra'], s['mod']),
+                     s['cfdk_version'] or '-', (s['cfdk_commit'] or '-')[:10], s['env'], dcp, roles,
+                     ','.join(s['cfa']) or '-'])
+    widths = [max([len(str(r[i])) for r in rows + [header]]) for i in range(len(header))]
+    for r in [header] + rows:
+        print('  '.join([str(c).ljust(w) for c, w in zip(r, widths)]).rstrip())
+    for e in errors:
+        print(e)
+
+
+def main(workspace_root, as_json=False, jobs=16, use_cfrm=True):
+    if not os.path.isdir(workspace_root):
+        print("ERROR: {} is not a directory.".format(workspace_root))
+        return 1
+    start = time.time()
+    statuses, cached = get_status(workspace_root, jobs=jobs, use_cfrm=use_cfrm)
+    if as_json:
+        print(json.dumps(statuses, indent=1))
+        return 0
+    if len(statuses) == 0:
+        print("No cFps found below {}.".format(os.path.abspath(workspace_root)))
+        return 0
+    print_table(statuses, os.path.abspath(workspace_root))
+    print("\n{} cFps scanned in {:.1f}s ({} unchanged since the last scan); roles marked with * are active."
+          .format(len(statuses), time.time() - start, cached))
+    return 0
@@ -29,14 +29,14 @@ import os
 import json
 import hashlib
 
+import cfp_config
+
 # 'hardcoded' version strings
 # __THIS_FILE_VERSION_NUMBER__ = 3
 # __THIS_FILE_VERSION_STRING__ = "0.0.3"
 __THIS_FILE_ALGORITHM_VERSION = 'hc1'  # hash concat version 1
 
 __cfp_json_path__ = '/../cFp.json'
-__shell_type_key__ = 'cFpSRAtype'
-__mod_type_key__ = 'cFpMOD'
 __dcps_folder_name__ = '/dcps/'
 __sig_file_ending__ = 'sig'
 __admin_sig_file_name__ = 'admin'
@@ -78,19 +78,21 @@ def main(new_mcs_file_name, new_bit_file_name, pr_verify_rpt_file_name):
     debugging_flow = os.environ.get('CFP_DEBUGGING')
     if debugging_flow is not None:
         cfp_json_file = me_abs_dir + debugging_flow + '/cFp.json'
-    with open(cfp_json_file, 'r') as json_file:
-        cFp_data = json.load(json_file)
+    try:
+        cFp_data = cfp_config.CfpConfig.load(cfp_json_file)
+    except cfp_config.CfpConfigError as e:
+        print("[cFBuild] ERROR: The project describing file {} is invalid: {}".format(cfp_json_file, e))
+        exit(1)
 
     # 1. check folders and file names
     root_abs = os.path.realpath(me_abs_dir+"/../")
     if debugging_flow is not None:
         root_abs = os.path.realpath(me_abs_dir + debugging_flow + "/env/" + "/../")
-    cFp_data['abs_path'] = root_abs
     dcps_folder = root_abs + __dcps_folder_name__
     # folder should exist...
-    dcp_file_name = "3_top{}_STATIC.dcp".format(cFp_data[__mod_type_key__])
+    dcp_file_name = "3_top{}_STATIC.dcp".format(cFp_data.cFpMOD)
     target_file_name = os.path.abspath(dcps_folder + "/" + dcp_file_name)
-    # meta_file_name = "3_top{}_STATIC.json".format(cFp_data[__mod_type_key__])
+    # meta_file_name = "3_top{}_STATIC.json".format(cFp_data.cFpMOD)
     # target_meta_name = os.path.abspath(dcps_folder + "/" + meta_file_name)
 
     new_mcs_file_path = os.path.abspath(dcps_folder + '/' + new_mcs_file_name)
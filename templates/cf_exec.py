@@ -0,0 +1,319 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Execution of external commands (make, git, ...) for cFCreate and the sra tools: explicit working
+#  *       directory and environment, streamed (and optionally prefixed) output, timing, timeouts, cancellation
+#  *       and concurrent steps.
+#  *
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+__kill_grace_period_s__ = 5.0
+__rc_not_started__ = 127
+__rc_cancelled__ = -2
+__rc_timeout__ = -3
+# interactive steps share the terminal, so (concurrent) prompts are shown one after another
+_terminal_lock = threading.Lock()
+
+
+class Step(object):
+    """A command to execute. env is added to (and overrides) base_env, which defaults to the current environment.
+
+    Interactive steps keep the terminal (e.g. for the credential prompts of git or the questions of a cFa setup),
+    their output is neither prefixed nor captured.
+    """
+    __slots__ = ('name', 'args', 'cwd', 'env', 'base_env', 'timeout', 'capture', 'quiet', 'interactive', 'on_start')
+
+    def __init__(self, name, args, cwd=None, env=None, base_env=None, timeout=None, capture=False, quiet=False,
+                 interactive=False, on_start=None):
+        self.name = name
+        self.args = args
+        self.cwd = cwd
+        self.env = env
+        self.base_env = base_env
+        self.timeout = timeout
+        self.capture = capture
+        self.quiet = quiet
+        self.interactive = interactive
+        self.on_start = on_start
+
+
+class StepResult(object):
+    __slots__ = ('name', 'rc', 'duration_s', 'output', 'timed_out', 'cancelled')
+
+    def __init__(self, name):
+        self.name = name
+        self.rc = __rc_not_started__
+        self.duration_s = 0.0
+        self.output = []
+        self.timed_out = False
+        self.cancelled = False
+
+
+class Executor(object):
+    """Runs steps and keeps their results (for the timing summary).
+
+    Non-interactive steps run in their own process group with the output read line by line, so that a timeout or
+    cancel() stops the complete process tree (e.g. make and all its sub-makes).
+    """
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.results = []
+        self._lock = threading.Lock()
+        self._procs = {}
+        self._cancelled = threading.Event()
+
+    def write_line(self, line, prefix=None):
+        with self._lock:
+            if prefix is not None:
+                self.out.write('[{}] '.format(prefix))
+            self.out.write(line)
+            if not line.endswith('\n'):
+                self.out.write('\n')
+            self.out.flush()
+
+    def _stop(self, proc, sig, group):
+        try:
+            if group:
+                os.killpg(proc.pid, sig)
+            else:
+                proc.send_signal(sig)
+        except OSError:
+            pass
+
+    def _terminate(self, proc, group=True):
+        self._stop(proc, signal.SIGTERM, group)
+        try:
+            proc.wait(timeout=__kill_grace_period_s__)
+        except subprocess.TimeoutExpired:
+            self._stop(proc, signal.SIGKILL, group)
+
+    def cancel(self):
+        """Stops all running steps; steps that are not yet started will not start."""
+        self._cancelled.set()
+        with self._lock:
+            procs = list(self._procs.values())
+        for proc, interactive in procs:
+            self._terminate(proc, group=not interactive)
+
+    @property
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run_step(self, step, prefix=None):
+        result = StepResult(step.name)
+        with self._lock:
+            self.results.append(result)
+        if step.interactive:
+            with _terminal_lock:
+                return self._run_step(step, result, prefix)
+        return self._run_step(step, result, prefix)
+
+    def _run_step(self, step, result, prefix):
+        if self.is_cancelled:
+            result.cancelled = True
+            result.rc = __rc_cancelled__
+            return result
+        env = dict(os.environ if step.base_env is None else step.base_env)
+        if step.env is not None:
+            env.update(step.env)
+        start = time.time()
+        try:
+            if step.interactive:
+                proc = subprocess.Popen(step.args, cwd=step.cwd, env=env)
+            else:
+                proc = subprocess.Popen(step.args, cwd=step.cwd, env=env, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, bufsize=1, universal_newlines=True,
+                                        errors='replace', start_new_session=True)
+        except OSError as e:
+            self.write_line("[ERROR] Can not execute {}: {}".format(step.args[0], e), prefix)
+            result.duration_s = time.time() - start
+            return result
+        with self._lock:
+            self._procs[id(result)] = (proc, step.interactive)
+        timer = None
+        if step.timeout is not None and not step.interactive:
+            def on_timeout():
+                result.timed_out = True
+                self._terminate(proc)
+            timer = threading.Timer(step.timeout, on_timeout)
+            timer.daemon = True
+            timer.start()
+        if step.on_start is not None:
+            step.on_start(proc)
+        try:
+            if not step.interactive:
+                for line in proc.stdout:
+                    if step.capture:
+                        result.output.append(line.rstrip('\n'))
+                    if not step.quiet:
+                        self.write_line(line, prefix)
+            result.rc = proc.wait()
+        except KeyboardInterrupt:
+            self.cancel()
+            proc.wait()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with self._lock:
+                self._procs.pop(id(result), None)
+            result.duration_s = time.time() - start
+        if result.timed_out:
+            self.write_line("[ERROR] {} timed out after {}s.".format(step.name, step.timeout), prefix)
+            result.rc = __rc_timeout__
+        elif self.is_cancelled and result.rc != 0:
+            result.cancelled = True
+            result.rc = __rc_cancelled__
+        return result
+
+    def run(self, name, args, **kwargs):
+        return self.run_step(Step(name, args, **kwargs))
+
+    def run_concurrent(self, steps, max_workers=None, stop_on_error=False):
+        """Runs independent steps concurrently (their output prefixed with the step name)."""
+        def run_one(step):
+            result = self.run_step(step, prefix=step.name)
+            if stop_on_error and result.rc != 0 and not self.is_cancelled:
+                self.cancel()
+            return result
+        with ThreadPoolExecutor(max_workers=max_workers or max(len(steps), 1)) as executor:
+            futures = [executor.submit(run_one, s) for s in steps]
+            try:
+                return [f.result() for f in futures]
+            except KeyboardInterrupt:
+                self.cancel()
+                raise
+
+    def print_timing(self, title="Timing"):
+        with self._lock:
+            results = list(self.results)
+        self.write_line("{}:".format(title))
+        for r in results:
+            status = 'ok'
+            if r.cancelled:
+                status = 'cancelled'
+            elif r.timed_out:
+                status = 'timeout'
+            elif r.rc != 0:
+                status = 'rc {}'.format(r.rc)
+            self.write_line("\t{:<40}{:>9.1f}s   {}".format(r.name, r.duration_s, status))
+
+
+def run(name, args, **kwargs):
+    # single step with a throwaway executor
+    return Executor().run(name, args, **kwargs)
+
+
+class Task(object):
+    """A node of a task graph: func() returns a return code and runs after all deps (task names) succeeded."""
+    __slots__ = ('name', 'func', 'deps', 'rc', 'start', 'end', 'skipped')
+
+    def __init__(self, name, func, deps=None):
+        self.name = name
+        self.func = func
+        self.deps = deps or []
+        self.rc = None
+        self.start = None
+        self.end = None
+        self.skipped = False
+
+    @property
+    def duration_s(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+
+def _run_task(task):
+    task.start = time.time()
+    try:
+        task.rc = task.func()
+    except Exception as e:
+        print("[ERROR] {} failed: {}".format(task.name, e))
+        task.rc = -1
+    finally:
+        task.end = time.time()
+
+
+def run_dag(tasks, max_workers=None):
+    """Runs every task as soon as its dependencies succeeded; dependents of failed tasks are skipped.
+
+    Returns True if all tasks succeeded.
+    """
+    by_name = {t.name: t for t in tasks}
+    pending = list(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(tasks), 1)) as executor:
+        while True:
+            for t in list(pending):
+                deps = [by_name[d] for d in t.deps]
+                if any([d.skipped or (d.rc is not None and d.rc != 0) for d in deps]):
+                    t.skipped = True
+                    pending.remove(t)
+                elif all([d.rc == 0 for d in deps]):
+                    pending.remove(t)
+                    running[executor.submit(_run_task, t)] = t
+            if len(running) == 0:
+                break
+            done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for f in done:
+                del running[f]
+    for t in pending:
+        t.skipped = True
+    return all([t.rc == 0 for t in tasks])
+
+
+def get_critical_path(tasks):
+    # the chain of tasks that determined the total run time, following the dependency that finished last
+    by_name = {t.name: t for t in tasks}
+    finished = [t for t in tasks if t.end is not None]
+    if len(finished) == 0:
+        return []
+    cur = max(finished, key=lambda t: t.end)
+    path = [cur]
+    while True:
+        deps = [by_name[d] for d in cur.deps if by_name[d].end is not None]
+        if len(deps) == 0:
+            break
+        cur = max(deps, key=lambda t: t.end)
+        path.insert(0, cur)
+    return path
+
+
+def print_critical_path(tasks, title="Critical path"):
+    path = get_critical_path(tasks)
+    if len(path) == 0:
+        return
+    t0 = min([t.start for t in tasks if t.start is not None])
+    total = max([t.end for t in tasks if t.end is not None]) - t0
+    print("{} (total {:.1f}s, sum of all steps {:.1f}s):".format(title, total, sum([t.duration_s for t in tasks])))
+    for t in path:
+        print("\t{:<30}{:>8.1f}s   (started at +{:.1f}s)".format(t.name, t.duration_s, t.start - t0))
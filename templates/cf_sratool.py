@@ -25,10 +25,27 @@
 #  *
 #  *
 
-import json
+import copy
+import fnmatch
+import glob
 import os
+import shlex
 import sys
-from docopt import docopt
+import time
+from concurrent.futures import ThreadPoolExecutor
+from docopt import docopt, DocoptExit
+from sra_profiler import BuildProfiler
+import cf_exec
+import cfp_config
+import sra_history
+import sra_incr
+import sra_ledger
+import sra_archive
+import sra_matrix
+import sra_queue
+import sra_retention
+import sra_trash
+import sra_watch
 
 __version__ = 0.3
 
@@ -36,11 +53,24 @@ docstr = """sra tools -- cloudFPGA Project Build & Management Framework
 
 Usage:
     sra update-shell
-    sra config (add-role <path-to-role-dir> <name> | use-role <name> | del-role <name> | show )
-    sra build (proj | monolithic | pr) [--role=<name>] [--incr] [--debug] 
-    sra clean [--full]
-    sra admin (build (pr_full | pr_flash) | full_clean | set-2nd-role <name> | write-to-json)
+    sra config (add-role <path-to-role-dir> <name> | add-roles <glob> | use-role <name> | del-role <name> |
+                del-roles <pattern> | show )
+    sra config retention [--keep-last=<n>] [--max-size=<GB>]
+    sra build (proj | monolithic | pr) [--role=<name>] [--incr] [--debug] [--jobs=<n>] [--profile]
+              [--profile-interval=<sec>] [--queue] [--priority=<n>]
+    sra build matrix --shells=<list> --mods=<list> [--role=<name>] [--flow=<flow>] [--jobs=<n>] [--parallel=<n>]
+              [--keep]
+    sra perf-check [--role=<name>] [--flow=<flow>] [--window=<n>] [--threshold=<pct>]
+    sra history [--role=<name>] [--dcp-id=<id>] [--hash=<sha256>] [--limit=<n>]
+    sra watch [--role=<name>] [--flow=<flow>] [--debounce=<sec>]
+    sra queue (list | cancel <job-id> | attach <job-id>)
+    sra clean [--full] [--background]
+    sra archive (ingest [<build-id>] [--role=<name>] | list | restore <build-id>)
+    sra admin (build (pr_full | pr_flash | pr_multi) | full_clean | set-2nd-role <name> | set-pr-roles <role-names>... |
+               write-to-json)
     sra open-gui
+    sra shell
+    sra run-script <script-file> [--keep-going]
     
     sra -h|--help
     sra -v|--version
@@ -49,9 +79,20 @@ Commands:
     update-shell    Checks for a new static DCP of the selected shell and downloads it if necessary.
     config          Changes the project configuration (cFp.json) by adding, deleting and selecting Roles.
     build           Builds a new FPGA design, if not specified otherwise, the last selected/activated Role will be used.
+    perf-check      Compares the timings of the latest build against the previous builds and fails on regressions.
+    history         Queries the build ledger (<cFp-Root>/.sra/ledger.sqlite) that records all builds with their
+                    bitstreams, hashes, signatures and the static DCP they were built against.
+    watch           Rebuilds the Role whenever its sources or the ones of TOP/ change (until Ctrl-C): changes of HLS
+                    sources of the Role only rebuild its HLS cores, all other changes start a complete build (the
+                    flow is monolithic, if not specified otherwise). A running build is cancelled by new changes.
+    queue           Shows and controls the builds of the build queue of this host (see --queue).
     clean           Deletes temporary build files.
+    archive         Keeps the outputs of builds (bitstreams, signatures and reports) in a deduplicated, compressed
+                    archive, from which they can be restored into dcps/.
     admin           Provide additional commands for cFDK Shell developers.
     open-gui        Opens the graphical user interface of the design (i.e. Vivado).
+    shell           Starts an interactive session that executes sra commands without re-loading the environment.
+    run-script      Executes the sra commands of a file (one per line, '#' starts a comment) in one session.
 
 Options:
     -h --help       Show this screen.
@@ -63,7 +104,18 @@ Options:
                                          the previous activated Role will be deactivated. By default, the activated Role
                                          will be used for the build process.
     del-role <name>                      Deletes a Role from the configuration, it wil *not* delete files.
+    add-roles <glob>                     Adds all directories matching <glob> (below <cFp-Root>/ROLE/, e.g. 'dse/v*')
+                                         as Roles, named after their directory.
+    del-roles <pattern>                  Deletes all Roles whose name matches <pattern> (e.g. 'v1*') from the
+                                         configuration.
     show                                 Show current project configuration.
+    retention                            Shows (or sets) the retention policy of the build outputs in <cFp-Root>/dcps/
+                                         and their disk usage per Role. After each build, the older builds of each
+                                         Role beyond --keep-last are deleted, then the least recently used (unsigned
+                                         first) builds until dcps/ fits into --max-size. The static DCP and its meta
+                                         are never deleted.
+    --keep-last=<n>                      Number of builds that are kept per Role (0 means all, the default).
+    --max-size=<GB>                      Byte budget of the builds in dcps/ (0 means unlimited, the default).
 
     proj                                 Create only the Vivado project files for a monolithic build and exit (useful if
                                          one wants to use the Vivado GUI).
@@ -71,11 +123,65 @@ Options:
     pr                                   Invokes the  `pr` (partial reconfiguration) build flow, using the activated
                                          Role and the latest downloaded static DCP (downloads a new DCP, if none is 
                                          present).
+    matrix                               Builds the Role for each combination of --shells and --mods (comma separated
+                                         lists) in throwaway workspaces (below <cFp-Root>/.sra/matrix/) that share the
+                                         cFDK and Role sources read-only. Bitstreams, logs and a timing report are
+                                         gathered in <cFp-Root>/dcps/matrix/.
+    --parallel=<n>                       Number of matrix builds that run concurrently [default: 2].
+    --keep                               Keeps the matrix workspaces after the build (e.g. for debugging).
     --role=<name>                        Uses the specified Role for the build process, not the current active Role.
-    --incr                               Enables the incremental build feature for monolithic designs.
+    --incr                               Enables the incremental build feature for monolithic designs. The reference
+                                         is the checkpoint of the latest monolithic build of the Role (or, if there
+                                         is none, of another Role), which sra saves after each successful monolithic
+                                         build in <cFp-Root>/.sra/incr/.
     --debug                              Adds debug probes during the build process, as specified in TOP/xdc/debug.xdc.
+    --jobs=<n>                           Builds up to <n> independent prerequisites (Shell, Middleware and Role HLS
+                                         cores) in parallel, using the make jobserver [default: 1].
+    --profile                            Samples RSS, CPU and I/O of all build processes (per phase) and writes the time
+                                         series to <cFp-Root>/dcps/; a summary of the peaks is printed at the end.
+    --profile-interval=<sec>             Sampling interval of the build profile in seconds [default: 2].
+    --queue                              Submits the build to the build queue daemon of this host (started if
+                                         necessary) and shows its log; Ctrl-C detaches, the build continues even if the
+                                         terminal is closed. A build with the same Role, flow and sources as a queued
+                                         or running one is not repeated. The daemon runs up to $cFpQueueMaxJobs builds
+                                         (default 2), but only one per cFp.
+    --priority=<n>                       Queued builds with a higher priority start first [default: 0].
     
+    --flow=<flow>                        The build flow (monolithic or pr) of the builds to compare; by default the
+                                         flow of the latest build of the Role.
+    --window=<n>                         Number of previous builds that form the baseline [default: 10].
+    --dcp-id=<id>                        (history) Only the builds against (or signed for) this static DCP id.
+    --hash=<sha256>                      (history) Only the builds with an artifact whose sha256 starts with this.
+    --limit=<n>                          (history) Maximum number of builds shown [default: 20].
+    --threshold=<pct>                    A phase is flagged as regression if it is slower than the median of the
+                                         baseline by more than this percentage (and beyond its usual jitter)
+                                         [default: 30].
+    --debounce=<sec>                     A watch build starts only when no further change happened for this time
+                                         [default: 2].
+
     --full                               Makes a full clean, also removing generated HLS cores from the IP library.
+    --background                         Moves the build outputs of TOP (xpr/, hd_visual/, dcps/ and logs) into
+                                         <cFp-Root>/.trash/, a detached low-priority process deletes them. Only these
+                                         are deferred: the remaining `make clean` (or `full_clean`, which also cleans
+                                         the Shell and the Roles) still runs in the foreground.
+
+    --keep-going                         Continues with the next command of the script, if a command fails.
+
+    list                                 (queue) Lists the queued, running and finished builds.
+    cancel <job-id>                      (queue) Removes a queued build or stops a running one.
+    attach <job-id>                      (queue) Shows the log of a build until it is finished.
+
+    ingest [<build-id>]                  Stores the files of a build (see 'sra config retention') in the archive (by
+                                         default in <cFp-Root>/.sra/archive/, or in $cFpArchiveDir, which can be shared
+                                         by several cFps). Without <build-id>, the latest build (of --role) is stored.
+    list                                 (archive) Lists the archived builds of this cFp.
+    restore <build-id>                   Restores the files of an archived build into <cFp-Root>/dcps/ (only builds
+                                         of this cFp with its current Shell and MOD).
+
+    set-pr-roles <role-names>...         (admin) Sets the list of Roles that are built by `admin build pr_multi`.
+    pr_multi                             (admin) Builds the static design with the first Role of the `set-pr-roles` list
+                                         (once) and then implements the partial bitstreams of the other listed Roles
+                                         against its checkpoint, one after another.
 
 Copyright IBM Research, licensed under the Apache License 2.0.
 Contact: {ngl,fab,wei, did, hle}@zurich.ibm.com
@@ -90,11 +196,15 @@ __default_role_entry__ = {'name': 'default', 'path': ""}
 __sra_dict_template__ = {'version': __version__, 'roles': [__default_role_entry__],
                          'active_role': __to_be_defined_key__}
 __admin_key__ = 'admin'
-__admin_dict_template__ = {'2nd-role': __to_be_defined_key__}
+__admin_dict_template__ = {'2nd-role': __to_be_defined_key__, 'pr-roles': []}
 __shell_type_key__ = 'cFpSRAtype'
 __mod_type_key__ = 'cFpMOD'
 __dcps_folder_name__ = '/dcps/'
 __sratool_user_env_key__ = 'cFpSraToolsUserFlowActive'
+__profile_file_template__ = 'build_profile_{}_{}_{}.csv'
+__session_prompt__ = 'sra> '
+__session_exit_cmds__ = ['exit', 'quit']
+__role_check_workers__ = 16
 
 
 def get_cfp_role_path(cfp_root, role_entry):
@@ -102,19 +212,233 @@ def get_cfp_role_path(cfp_root, role_entry):
     return role_path
 
 
+def get_role_relative_path(path_to_role_dir):
+    # path relative to <cFp-Root>/ROLE/, with trailing '/'
+    relative_path = ''
+    path_parts = path_to_role_dir.split('/')
+    for pp in path_parts:
+        if len(pp) == 0:
+            break
+        if pp == '.':
+            continue
+        if pp == 'ROLE':
+            # maybe they specified it with relative path/tab completion
+            continue
+        relative_path += pp + '/'  # must be there also for the last entry
+    return relative_path
+
+
+def add_roles(cfp_root, cFp_data, role_glob):
+    role_base = os.path.abspath(cfp_root + '/ROLE/')
+    candidates = sorted(glob.glob(os.path.join(role_base, get_role_relative_path(role_glob)).rstrip('/')))
+    # the checks can be slow on network file systems, hence they are done in parallel
+    with ThreadPoolExecutor(max_workers=__role_check_workers__) as executor:
+        is_dir = list(executor.map(os.path.isdir, candidates))
+    new_entries = []
+    new_names = {}
+    for path, valid in zip(candidates, is_dir):
+        relative_path = os.path.relpath(path, role_base)
+        if not valid or relative_path == '.' or relative_path.startswith('..'):
+            continue
+        name = os.path.basename(path)
+        if name in new_names:
+            print("[sra:ERROR] The directories {} and {} would both be added as role {}."
+                  .format(new_names[name], path, name))
+            return cFp_data, False, -1
+        new_names[name] = path
+        if cFp_data.has_role(name):
+            print("[sra:WARNING] A role with the name {} exists already, skipping {}.".format(name, path))
+            continue
+        new_entries.append({'name': name, 'path': relative_path + '/'})
+    if len(new_entries) == 0:
+        print("[sra:ERROR] No new role directories match {} (below {}).".format(role_glob, role_base))
+        return cFp_data, False, -1
+    cFp_data.add_roles(new_entries)
+    print("[sra:INFO] Added {} roles.".format(len(new_entries)))
+    return cFp_data, True, 0
+
+
+def invoke_make(cfp_root, make_cmd, make_env, profiler=None, jobs=1):
+    # start make and OVERWRITE the environment variables
+    # sub-makes are invoked via $(MAKE), so they join the jobserver of the top-level make
+    make_args = ['make', make_cmd]
+    if jobs > 1:
+        make_args = ['make', '-j{}'.format(jobs), make_cmd]
+    if profiler is None:
+        return cf_exec.run('make ' + make_cmd, make_args, cwd=cfp_root, env=make_env).rc
+    try:
+        rc = cf_exec.run('make ' + make_cmd, make_args, cwd=cfp_root, env=make_env,
+                         on_start=lambda proc: profiler.attach(proc.pid)).rc
+    except KeyboardInterrupt:
+        rc = -1
+    profiler.stop()
+    profiler.print_summary()
+    return rc
+
+
+def run_get_latest_dcp(cfenv_small_py_bin, cfp_env_folder):
+    return cf_exec.run('get_latest_dcp', [cfenv_small_py_bin, cfp_env_folder + '/get_latest_dcp.py']).rc
+
+
+def prefetch_dcp_with_role(cfp_root, cfenv_small_py_bin, cfp_env_folder, make_env, make_jobs):
+    # the static DCP is needed only by the implementation (pr2_only), so it is downloaded while the role is built
+    print("[sra:INFO] No static DCP present, downloading it while the role is built...")
+    make_args = ['make', 'ensureNotMonolithic', 'Role2']
+    if make_jobs > 1:
+        make_args.insert(1, '-j{}'.format(make_jobs))
+    executor = cf_exec.Executor()
+    results = executor.run_concurrent([cf_exec.Step('get_latest_dcp', [cfenv_small_py_bin,
+                                                                       cfp_env_folder + '/get_latest_dcp.py']),
+                                       cf_exec.Step('Role2', make_args, cwd=cfp_root, env=make_env)],
+                                      stop_on_error=True)
+    executor.print_timing("[sra:INFO] Timing of the DCP download and the role build")
+    for r in results:
+        if r.rc != 0:
+            return r.rc
+    return 0
+
+
+def queue_build(arguments, cfp_root, role_name, role_dict):
+    flow = [f for f in ['proj', 'monolithic', 'pr'] if arguments[f]][0]
+    # the role is resolved now, a later 'use-role' must not change the queued build
+    args = ['build', flow, '--role={}'.format(role_name), '--jobs={}'.format(arguments['--jobs'])]
+    for flag in ['--incr', '--debug', '--profile']:
+        if arguments[flag]:
+            args.append(flag)
+    if arguments['--profile']:
+        args.append('--profile-interval={}'.format(arguments['--profile-interval']))
+    try:
+        priority = int(arguments['--priority'])
+    except ValueError:
+        print("[sra:ERROR] Invalid priority {}.".format(arguments['--priority']))
+        return -1
+    job_id = sra_queue.submit(cfp_root, role_name, get_cfp_role_path(cfp_root, role_dict), flow, args, priority,
+                              os.path.realpath(__file__))
+    if job_id is None:
+        return -1
+    return sra_queue.attach(job_id)
+
+
+def get_build_profiler(cfp_root, role_name, flow_name, interval):
+    if interval is None:
+        return None
+    csv_name = __profile_file_template__.format(role_name, flow_name, time.strftime('%Y%m%d-%H%M%S'))
+    return BuildProfiler(cfp_root, os.path.abspath(cfp_root + __dcps_folder_name__ + csv_name), interval=interval)
+
+
+def build_matrix(arguments, cfp_root, cFp_data, role_dict, make_jobs):
+    flow = arguments['--flow']
+    if flow is None:
+        flow = 'monolithic'
+    if flow not in ['monolithic', 'pr']:
+        print("[sra:ERROR] Matrix builds support only the monolithic and pr flow.")
+        return -1
+    try:
+        parallel = int(arguments['--parallel'])
+    except ValueError:
+        parallel = 0
+    if parallel < 1:
+        print("[sra:ERROR] Invalid number of parallel builds {}.".format(arguments['--parallel']))
+        return -1
+    shells = [e.strip() for e in arguments['--shells'].split(',') if len(e.strip()) > 0]
+    mods = [e.strip() for e in arguments['--mods'].split(',') if len(e.strip()) > 0]
+    for sra_type in shells:
+        if not os.path.isdir(cfp_root + '/cFDK/SRA/LIB/SHELL/' + sra_type):
+            print("[sra:ERROR] The shell {} is not available in the cFDK of this cFp.".format(sra_type))
+            return -1
+    for mod in mods:
+        if not os.path.isdir(cfp_root + '/cFDK/MOD/' + mod):
+            print("[sra:ERROR] The MOD {} is not available in the cFDK of this cFp.".format(mod))
+            return -1
+    combinations = [(sra_type, mod) for sra_type in shells for mod in mods]
+    if len(combinations) == 0:
+        print("[sra:ERROR] At least one shell and one MOD must be given.")
+        return -1
+    make_cmd = 'monolithic'
+    if flow == 'pr':
+        make_cmd = 'pr2_only'
+    matrix_start = time.time()
+    matrix_id = 'matrix-' + sra_retention.get_build_id(matrix_start)
+    print("[sra:INFO] Starting {} {} builds of role {} ({} in parallel)...".format(len(combinations), flow,
+                                                                                 role_dict['name'], parallel))
+    results, report_file = sra_matrix.run_matrix(cfp_root, cFp_data.to_dict(), combinations, role_dict['name'],
+                                                 get_cfp_role_path(cfp_root, role_dict), make_cmd,
+                                                 parallel=parallel, make_jobs=make_jobs,
+                                                 keep_workspaces=arguments['--keep'])
+    sra_matrix.print_report(results, report_file)
+    for r in results:
+        sra_ledger.record_build(cfp_root, '{}-{}-{}'.format(matrix_id, r['shell'], r['mod']), matrix_start,
+                                role_dict['name'], flow, r['mod'], r['shell'], make_cmd, r['rc'], r['duration_s'])
+    if any([r['rc'] != 0 for r in results]):
+        return -1
+    return 0
+
+
 def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cFp_data, dcp_file_path, meta_file_path):
     if arguments['update-shell']:
-        # os.system("{} {}/get_latest_dcp.py".format(os.environ['cFsysPy3_cmd'], cfp_env_folder))
-        rc = os.system("{} {}/get_latest_dcp.py".format(cfenv_small_py_bin, cfp_env_folder))
+        rc = run_get_latest_dcp(cfenv_small_py_bin, cfp_env_folder)
         return cFp_data, False, rc
     if arguments['clean']:
+        make_cmd = 'clean'
         if arguments['--full']:
-            rc = os.system('cd {}; make full_clean'.format(cfp_root))
+            make_cmd = 'full_clean'
+        if arguments['--background']:
+            moved = sra_trash.move_to_trash(cfp_root)
+            if moved > 0:
+                sra_trash.start_reaper(cfp_root)
+                print("[sra:INFO] Moved {} build outputs to {}, they are deleted in the background."
+                      .format(moved, sra_trash.get_trash_folder(cfp_root)))
+        # with --background, make is still run in the foreground for the rest (a detached make could delete the
+        # outputs of a build started right after the clean)
+        rc = cf_exec.run('make ' + make_cmd, ['make', make_cmd], cwd=cfp_root).rc
+        return cFp_data, False, rc
+    if arguments['watch']:
+        role = cFp_data[__sra_key__]['active_role']
+        if arguments['--role'] is not None:
+            role = arguments['--role']
+        role_dict = cFp_data.get_role(role)
+        if role_dict is None:
+            print("[sra:ERROR] A role must be set active first, or defined using the --role option.")
+            return cFp_data, False, -1
+        flow = arguments['--flow'] or 'monolithic'
+        if flow == 'monolithic':
+            make_env = {__sratool_user_env_key__: 'true', 'roleName1': role_dict['name'],
+                        'usedRoleDir': get_cfp_role_path(cfp_root, role_dict)}
+            ip_target = 'RoleIp'
+        elif flow == 'pr':
+            make_env = {__sratool_user_env_key__: 'true',
+                        'roleName1': __to_be_defined_key__, 'usedRoleDir': __to_be_defined_key__,
+                        'roleName2': role_dict['name'], 'usedRole2Dir': get_cfp_role_path(cfp_root, role_dict)}
+            ip_target = 'RoleIp2'
         else:
-            rc = os.system('cd {}; make clean'.format(cfp_root))
+            print("[sra:ERROR] The flow must be monolithic or pr.")
+            return cFp_data, False, -1
+        try:
+            debounce = float(arguments['--debounce'])
+        except ValueError:
+            print("[sra:ERROR] Invalid debounce time {}.".format(arguments['--debounce']))
+            return cFp_data, False, -1
+        rc = sra_watch.watch(cfp_root, role, get_cfp_role_path(cfp_root, role_dict), flow, make_env, ip_target,
+                             debounce)
         return cFp_data, False, rc
+    if arguments['queue']:
+        if arguments['list']:
+            return cFp_data, False, sra_queue.print_list()
+        if arguments['cancel']:
+            return cFp_data, False, sra_queue.cancel(arguments['<job-id>'])
+        return cFp_data, False, sra_queue.attach(arguments['<job-id>'])
+    if arguments['archive']:
+        if arguments['list']:
+            return cFp_data, False, sra_archive.print_list(cfp_root)
+        if arguments['restore']:
+            return cFp_data, False, sra_archive.restore(cfp_root, cFp_data, arguments['<build-id>'])
+        if arguments['--role'] is not None and not cFp_data.has_role(arguments['--role']):
+            print("[sra:ERROR] No role with name {} is defined.".format(arguments['--role']))
+            return cFp_data, False, -1
+        return cFp_data, False, sra_archive.ingest(cfp_root, cFp_data, arguments['<build-id>'], arguments['--role'])
     if arguments['open-gui']:
-        rc = os.system('cd; vivado xpr/top{}.xpr'.format(cfp_root, cFp_data[__mod_type_key__]))
+        rc = cf_exec.run('vivado', ['vivado', 'xpr/top{}.xpr'.format(cFp_data[__mod_type_key__])], cwd=cfp_root,
+                         interactive=True).rc
         return cFp_data, False, rc
 
     if arguments['config']:
@@ -130,17 +454,7 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
                 print("\tCurrent active role: {}".format(cFp_data[__sra_key__]['active_role']))
             return cFp_data, False, 0
         if arguments['add-role']:
-            relative_path = ''
-            path_parts = arguments['<path-to-role-dir>'].split('/')
-            for pp in path_parts:
-                if len(pp) == 0:
-                    break
-                if pp == '.':
-                    continue
-                if pp == 'ROLE':
-                    # maybe they specified it with relative path/tab completion
-                    continue
-                relative_path += pp + '/'  # must be there also for the last entry
+            relative_path = get_role_relative_path(arguments['<path-to-role-dir>'])
             new_abs_path = os.path.abspath(cfp_root + '/ROLE/' + relative_path)
             if not os.path.isdir(new_abs_path):
                 print("[ERROR] The specified path {} seems not to be a valid directory.".format(new_abs_path))
@@ -148,20 +462,34 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
                       .format(os.path.abspath(cfp_root + '/ROLE/')))
                 return cFp_data, False, -1
             new_role_dict = {'name': arguments['<name>'], 'path': relative_path}
-            for existing_entry in cFp_data[__sra_key__]['roles']:
-                if existing_entry['name'] == new_role_dict['name']:
-                    print("[sra:ERROR] A role with the name {} exists already.".format(new_role_dict['name']))
-                    return cFp_data, False, -1
-            cFp_data[__sra_key__]['roles'].append(new_role_dict)
+            if cFp_data.has_role(new_role_dict['name']):
+                print("[sra:ERROR] A role with the name {} exists already.".format(new_role_dict['name']))
+                return cFp_data, False, -1
+            cFp_data.add_roles([new_role_dict])
             return cFp_data, True, 0
+        if arguments['add-roles']:
+            return add_roles(cfp_root, cFp_data, arguments['<glob>'])
+        if arguments['retention']:
+            new_policy = {}
+            try:
+                if arguments['--keep-last'] is not None:
+                    new_policy[sra_retention.__keep_last_key__] = int(arguments['--keep-last'])
+                if arguments['--max-size'] is not None:
+                    new_policy[sra_retention.__max_gb_key__] = float(arguments['--max-size'])
+            except ValueError:
+                print("[sra:ERROR] --keep-last and --max-size must be numbers.")
+                return cFp_data, False, -1
+            if any([v < 0 for v in new_policy.values()]):
+                print("[sra:ERROR] --keep-last and --max-size must not be negative.")
+                return cFp_data, False, -1
+            if len(new_policy) > 0:
+                cFp_data[__sra_key__][sra_retention.__retention_key__] = sra_retention.get_policy(cFp_data[__sra_key__])
+                cFp_data[__sra_key__][sra_retention.__retention_key__].update(new_policy)
+            sra_retention.print_summary(cfp_root, cFp_data[__sra_key__])
+            return cFp_data, len(new_policy) > 0, 0
         if arguments['use-role']:
             new_active_role = arguments['<name>']
-            is_existing = False
-            for existing_entry in cFp_data[__sra_key__]['roles']:
-                if existing_entry['name'] == new_active_role:
-                    is_existing = True
-                    break
-            if is_existing:
+            if cFp_data.has_role(new_active_role):
                 cFp_data[__sra_key__]['active_role'] = new_active_role
                 return cFp_data, True, 0
             else:
@@ -169,20 +497,27 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
                 return cFp_data, False, -1
         if arguments['del-role']:
             del_role = arguments['<name>']
-            is_existing = False
-            entry_to_delete = None
-            for existing_entry in cFp_data[__sra_key__]['roles']:
-                if existing_entry['name'] == del_role:
-                    is_existing = True
-                    entry_to_delete = existing_entry
-                    break
-            if is_existing:
-                idx_to_del = cFp_data[__sra_key__]['roles'].index(entry_to_delete)
-                del cFp_data[__sra_key__]['roles'][idx_to_del]
+            active_role = cFp_data[__sra_key__]['active_role']
+            if cFp_data.del_roles([del_role]) > 0:
+                if active_role == del_role:
+                    print("[sra:WARNING] The active role {} was deleted, activate another one with `sra config "
+                          "use-role <name>`.".format(active_role))
                 return cFp_data, True, 0
             else:
                 print("[sra:ERROR] No role with name {} is defined.".format(del_role))
                 return cFp_data, False, -1
+        if arguments['del-roles']:
+            del_names = fnmatch.filter(cFp_data.get_role_names(), arguments['<pattern>'])
+            if len(del_names) == 0:
+                print("[sra:ERROR] No role matches {}.".format(arguments['<pattern>']))
+                return cFp_data, False, -1
+            active_role = cFp_data[__sra_key__]['active_role']
+            cFp_data.del_roles(del_names)
+            print("[sra:INFO] Deleted {} roles.".format(len(del_names)))
+            if active_role in del_names:
+                print("[sra:WARNING] The active role {} was deleted, activate another one with `sra config use-role "
+                      "<name>`.".format(active_role))
+            return cFp_data, True, 0
 
     if arguments['build'] and not arguments['admin']:
         rc = -1
@@ -192,14 +527,8 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
         if cur_active_role == __none_key__ or cur_active_role == __to_be_defined_key__:
             print("[sra:ERROR] A role must be set active first, or defined using the --role option.")
             return cFp_data, False, -1
-        is_existing = False
-        cur_active_role_dict = None
-        for existing_entry in cFp_data[__sra_key__]['roles']:
-            if existing_entry['name'] == cur_active_role:
-                is_existing = True
-                cur_active_role_dict = existing_entry
-                break
-        if not is_existing:
+        cur_active_role_dict = cFp_data.get_role(cur_active_role)
+        if cur_active_role_dict is None:
             print("[sra:ERROR] No role with name {} is defined.".format(cur_active_role))
             return cFp_data, False, -1
         with_debug = False
@@ -208,13 +537,38 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
             with_debug = True
         if arguments['--incr']:
             with_incr = True
+        build_start = time.time()
+        profiler = None
+        flow_name = None
+        # files put into dcps/ for the build that keep their original mtime
+        restored_files = []
+        try:
+            make_jobs = int(arguments['--jobs'])
+        except ValueError:
+            make_jobs = 0
+        if make_jobs < 1:
+            print("[sra:ERROR] Invalid number of jobs {}.".format(arguments['--jobs']))
+            return cFp_data, False, -1
+        if arguments['--queue']:
+            return cFp_data, False, queue_build(arguments, cfp_root, cur_active_role, cur_active_role_dict)
+        if arguments['matrix']:
+            return cFp_data, False, build_matrix(arguments, cfp_root, cFp_data, cur_active_role_dict, make_jobs)
+        profile_interval = None
+        if arguments['--profile']:
+            try:
+                profile_interval = float(arguments['--profile-interval'])
+            except ValueError:
+                print("[sra:ERROR] Invalid profile interval {}.".format(arguments['--profile-interval']))
+                return cFp_data, False, -1
         if arguments['proj']:
             print("[sra:INFO] Starting to create the project files for a monolithic design with role {}..."
                   .format(cur_active_role))
-            # start make and OVERWRITE the environment variables
-            rc = os.system('cd {}; export {}=true; export roleName1={}; export usedRoleDir={}; make monolithic_proj'
-                           .format(cfp_root, __sratool_user_env_key__, cur_active_role_dict['name'],
-                                   get_cfp_role_path(cfp_root, cur_active_role_dict)))
+            flow_name = 'proj'
+            make_cmd = 'monolithic_proj'
+            make_env = {__sratool_user_env_key__: 'true', 'roleName1': cur_active_role_dict['name'],
+                        'usedRoleDir': get_cfp_role_path(cfp_root, cur_active_role_dict)}
+            profiler = get_build_profiler(cfp_root, cur_active_role, flow_name, profile_interval)
+            rc = invoke_make(cfp_root, make_cmd, make_env, profiler=profiler, jobs=make_jobs)
         elif arguments['monolithic']:
             info_str = "[sra:INFO] Starting to to build a monolithic design with role {}" \
                 .format(cur_active_role)
@@ -228,10 +582,16 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
                     .format(os.path.abspath(cfp_root + '/TOP/xdc/debug.xdc'))
             info_str += '...'
             print(info_str)
-            # start make and OVERWRITE the environment variables
-            rc = os.system('cd {}; export {}=true; export roleName1={}; export usedRoleDir={}; make {}'
-                           .format(cfp_root, __sratool_user_env_key__, cur_active_role_dict['name'],
-                                   get_cfp_role_path(cfp_root, cur_active_role_dict), make_cmd))
+            flow_name = 'monolithic'
+            make_env = {__sratool_user_env_key__: 'true', 'roleName1': cur_active_role_dict['name'],
+                        'usedRoleDir': get_cfp_role_path(cfp_root, cur_active_role_dict)}
+            if with_incr:
+                slot = sra_incr.restore_slot(cfp_root, cur_active_role, cFp_data[__mod_type_key__],
+                                             cFp_data[__shell_type_key__])
+                if slot is not None:
+                    restored_files = slot['files']
+            profiler = get_build_profiler(cfp_root, cur_active_role, flow_name, profile_interval)
+            rc = invoke_make(cfp_root, make_cmd, make_env, profiler=profiler, jobs=make_jobs)
         elif arguments['pr']:
             if with_incr:
                 print("[sra:INFO] Incremental compile with a partial reconfiguration design is not (yet) " +
@@ -242,60 +602,147 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
             if with_debug:
                 print("[sra:ERROR] NOT-YET-IMPLEMENTED (pr build with debug probes).")
                 return cFp_data, False, -1
+            make_env = {__sratool_user_env_key__: 'true',
+                        # role 1 should be totally ignored?
+                        'roleName1': __to_be_defined_key__, 'usedRoleDir': __to_be_defined_key__,
+                        'roleName2': cur_active_role_dict['name'],
+                        'usedRole2Dir': get_cfp_role_path(cfp_root, cur_active_role_dict)}
             # check for dcp
             if not os.path.isfile(dcp_file_path) or not os.path.isfile(meta_file_path):
-                # os.system("{} {}/get_latest_dcp.py".format(os.environ['cFsysPy3_cmd'], cfp_env_folder))
-                rc = os.system("{} {}/get_latest_dcp.py".format(cfenv_small_py_bin, cfp_env_folder))
+                rc = prefetch_dcp_with_role(cfp_root, cfenv_small_py_bin, cfp_env_folder, make_env, make_jobs)
                 if (not os.path.isfile(dcp_file_path)) or (rc != 0):
                     print("sra:ERROR] No DCP present, can not build pr designs. Stop.")
                     return cFp_data, False, -1
             info_str += '...'
             print(info_str)
-            # start make and OVERWRITE the environment variables
-            rc = os.system('cd {}; export {}=true; export roleName1={}; export usedRoleDir={}; \
-                        export roleName2={}; export usedRole2Dir={}; make {}'
-                           .format(cfp_root, __sratool_user_env_key__,
-                                   # cur_active_role_dict['name'], get_cfp_role_path(cfp_root, cur_active_role_dict),
-                                   __to_be_defined_key__, __to_be_defined_key__,  # role 1 should be totally ignored?
-                                   cur_active_role_dict['name'], get_cfp_role_path(cfp_root, cur_active_role_dict),
-                                   make_cmd))
+            flow_name = 'pr'
+            profiler = get_build_profiler(cfp_root, cur_active_role, flow_name, profile_interval)
+            rc = invoke_make(cfp_root, make_cmd, make_env, profiler=profiler, jobs=make_jobs)
+        if flow_name is not None:
+            phases = None
+            if profiler is not None:
+                phases = profiler.get_phase_durations()
+            build_duration = time.time() - build_start
+            if flow_name == 'monolithic' and rc == 0 and not with_debug:
+                # keep the routed design as reference for later incremental builds of this role
+                checkpoints_before = sra_incr.get_checkpoint_snapshot(cfp_root)
+                if invoke_make(cfp_root, 'save_mono_incr', make_env) == 0:
+                    sra_incr.save_slot(cfp_root, checkpoints_before, cur_active_role, cFp_data[__mod_type_key__],
+                                       cFp_data[__shell_type_key__])
+                    sra_incr.evict_slots(cfp_root, cFp_data[__sra_key__])
+            sra_retention.enforce(cfp_root, cFp_data[__sra_key__], cur_active_role, flow_name, build_start,
+                                  build_files=restored_files)
+            build_id = sra_retention.get_build_id(build_start)
+            build_files = [f for f, e in sra_retention.load_index(cfp_root).items() if e['build'] == build_id]
+            sra_ledger.record_build(cfp_root, build_id, build_start, cur_active_role, flow_name,
+                                    cFp_data[__mod_type_key__], cFp_data[__shell_type_key__], make_cmd, rc,
+                                    build_duration, phases=phases, file_names=build_files)
+            # create_sig.sh (and admin_sig.sh) run within the make targets, their .sig files are outputs of the build
+            sra_ledger.record_signatures(cfp_root, build_id, build_files)
         return cFp_data, False, rc
 
+    if arguments['history']:
+        try:
+            limit = int(arguments['--limit'])
+        except ValueError:
+            print("[sra:ERROR] Invalid limit {}.".format(arguments['--limit']))
+            return cFp_data, False, -1
+        rc = sra_ledger.print_history(cfp_root, arguments['--role'], arguments['--dcp-id'], arguments['--hash'],
+                                      limit)
+        return cFp_data, False, rc
+    if arguments['perf-check']:
+        role = cFp_data[__sra_key__]['active_role']
+        if arguments['--role'] is not None:
+            role = arguments['--role']
+        if role == __none_key__ or role == __to_be_defined_key__:
+            print("[sra:ERROR] A role must be set active first, or defined using the --role option.")
+            return cFp_data, False, -1
+        if not cFp_data.has_role(role):
+            print("[sra:ERROR] No role with name {} is defined.".format(role))
+            return cFp_data, False, -1
+        try:
+            window = int(arguments['--window'])
+            threshold = float(arguments['--threshold'])
+        except ValueError:
+            print("[sra:ERROR] --window and --threshold must be numbers.")
+            return cFp_data, False, -1
+        history = sra_history.load_history(cfp_root, role)
+        flow = arguments['--flow']
+        if flow is None:
+            for e in reversed(history):
+                if e['role'] == role and e['flow'] in ['monolithic', 'pr']:
+                    flow = e['flow']
+                    break
+        if flow not in ['monolithic', 'pr']:
+            print("[sra:ERROR] No recorded monolithic or pr builds of role {} found.".format(role))
+            return cFp_data, False, -1
+        latest, results = sra_history.check_regressions(history, role, flow, cFp_data[__mod_type_key__], window,
+                                                        threshold)
+        if latest is None:
+            print("[sra:ERROR] No successful {} build of role {} for {} recorded.".format(
+                flow, role, cFp_data[__mod_type_key__]))
+            return cFp_data, False, -1
+        previous_shell = sra_history.get_previous_shell(history, latest)
+        if previous_shell is not None:
+            print("[sra:WARNING] The Shell changed from {} to {} since the previous {} build, the builds with {} are "
+                  "not part of the baseline.".format(previous_shell, latest['sra'], latest['make_target'],
+                                                     previous_shell))
+        print("[sra:INFO] Timings of the {} build ({} with {}) of role {} from {} (baseline: up to {} previous "
+              "builds of the same target and Shell):".format(flow, latest['make_target'], latest['sra'], role,
+                                                             latest['time'], window))
+        found_regression = False
+        for r in results:
+            if r['median'] is None:
+                print("	{:<12}{:>10.1f}s   (only {} baseline builds, skipped)"
+                      .format(r['phase'], r['latest'], r['baseline_builds']))
+                continue
+            status = 'ok'
+            if r['regression']:
+                status = 'REGRESSION'
+                found_regression = True
+            change = '   n/a'
+            if r['change_pct'] is not None:
+                change = '{:+6.1f}%'.format(r['change_pct'])
+            print("	{:<12}{:>10.1f}s   median {:>10.1f}s   MAD {:>8.1f}s   {}   {}"
+                  .format(r['phase'], r['latest'], r['median'], r['mad'], change, status))
+        if found_regression:
+            print("[sra:ERROR] Build-time regression detected (threshold {}%).".format(threshold))
+            return cFp_data, False, -1
+        return cFp_data, False, 0
+
     if arguments['admin']:
         if arguments['full_clean']:
-            rc = os.system('cd {}; make full_clean'.format(cfp_root))
+            rc = cf_exec.run('make full_clean', ['make', 'full_clean'], cwd=cfp_root).rc
             return cFp_data, False, rc
         if arguments['set-2nd-role']:
             cFp_data[__sra_key__][__admin_key__]['2nd-role'] = arguments['<name>']
             return cFp_data, True, 0
+        if arguments['set-pr-roles']:
+            for role_name in arguments['<role-names>']:
+                if not cFp_data.has_role(role_name):
+                    print("[sra:ERROR] No role with name {} is defined.".format(role_name))
+                    return cFp_data, False, -1
+            if len(set(arguments['<role-names>'])) != len(arguments['<role-names>']):
+                print("[sra:ERROR] Each role can be listed only once.")
+                return cFp_data, False, -1
+            cFp_data[__sra_key__][__admin_key__]['pr-roles'] = arguments['<role-names>']
+            return cFp_data, True, 0
         if arguments['write-to-json']:
             print("[sra:INFO] Writing current role setting to cFp.json.")
             cur_active_role_1 = cFp_data[__sra_key__]['active_role']
             if cur_active_role_1 == __none_key__ or cur_active_role_1 == __to_be_defined_key__:
                 print("[sra:ERROR] A role must be set active first.")
                 return cFp_data, False, -1
-            is_existing = False
-            cur_active_role_dict_1 = None
-            for existing_entry in cFp_data[__sra_key__]['roles']:
-                if existing_entry['name'] == cur_active_role_1:
-                    is_existing = True
-                    cur_active_role_dict_1 = existing_entry
-                    break
-            if not is_existing:
+            cur_active_role_dict_1 = cFp_data.get_role(cur_active_role_1)
+            if cur_active_role_dict_1 is None:
                 print("[sra:ERROR] No role with name {} is defined.".format(cur_active_role_1))
                 return cFp_data, False, -1
             write_2nd_role = True
             cur_active_role_2 = cFp_data[__sra_key__][__admin_key__]['2nd-role']
-            cur_active_role_dict_2 = None
             if cur_active_role_2 == __none_key__ or cur_active_role_2 == __to_be_defined_key__:
                 write_2nd_role = False
-            is_existing = False
-            for existing_entry in cFp_data[__sra_key__]['roles']:
-                if existing_entry['name'] == cur_active_role_2:
-                    is_existing = True
-                    cur_active_role_dict_2 = existing_entry
-                    break
-            if not is_existing:
+            cur_active_role_dict_2 = cFp_data.get_role(cur_active_role_2)
+            if cur_active_role_dict_2 is None:
                 write_2nd_role = False
             # update cFp struct
             cFp_data['roleName1'] = cur_active_role_dict_1['name']
@@ -304,6 +751,34 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
                 cFp_data['roleName2'] = cur_active_role_dict_2['name']
                 cFp_data['usedRoleDir2'] = cur_active_role_dict_2['path']
             return cFp_data, True, 0
+        elif arguments['build'] and arguments['pr_multi']:
+            pr_roles = cFp_data[__sra_key__][__admin_key__].get('pr-roles', [])
+            if len(pr_roles) == 0:
+                print("[sra:ERROR] The roles must be set first, using `sra admin set-pr-roles <role-names>...`.")
+                return cFp_data, False, -1
+            pr_role_dicts = []
+            for role_name in pr_roles:
+                role_dict = cFp_data.get_role(role_name)
+                if role_dict is None:
+                    print("[sra:ERROR] No role with name {} is defined.".format(role_name))
+                    return cFp_data, False, -1
+                role_path = get_cfp_role_path(cfp_root, role_dict)
+                if ' ' in role_name or ' ' in role_path:
+                    print("[sra:ERROR] Role {} (in {}) contains spaces, which the pr_multi flow can not handle."
+                          .format(role_name, role_path))
+                    return cFp_data, False, -1
+                pr_role_dicts.append(role_dict)
+            print("[sra:INFO] Starting to build a *complete* partial reconfiguration design with role {}, and the "
+                  "partial bitstreams of roles {} against its static design...".format(pr_roles[0],
+                                                                                     ', '.join(pr_roles[1:])))
+            # no __sratool_user_env_key__ in admin case
+            make_env = {'roleName1': pr_role_dicts[0]['name'],
+                        'usedRoleDir': get_cfp_role_path(cfp_root, pr_role_dicts[0]),
+                        'roleName2': __to_be_defined_key__, 'usedRole2Dir': __to_be_defined_key__,
+                        'cFpPrRoleNames': ' '.join([d['name'] for d in pr_role_dicts]),
+                        'cFpPrRoleDirs': ' '.join([get_cfp_role_path(cfp_root, d) for d in pr_role_dicts])}
+            rc = invoke_make(cfp_root, 'pr_multi', make_env)
+            return cFp_data, False, rc
         elif arguments['build']:
             cur_active_role = cFp_data[__sra_key__]['active_role']
             # if arguments['--role'] is not None:
@@ -312,14 +787,8 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
                 # print("[sra:ERROR] A role must be set active first, or defined using the --role option.")
                 print("[sra:ERROR] A role must be set active first.")
                 return cFp_data, False, -1
-            is_existing = False
-            cur_active_role_dict = None
-            for existing_entry in cFp_data[__sra_key__]['roles']:
-                if existing_entry['name'] == cur_active_role:
-                    is_existing = True
-                    cur_active_role_dict = existing_entry
-                    break
-            if not is_existing:
+            cur_active_role_dict = cFp_data.get_role(cur_active_role)
+            if cur_active_role_dict is None:
                 print("[sra:ERROR] No role with name {} is defined.".format(cur_active_role))
                 return cFp_data, False, -1
             if arguments['pr_flash']:
@@ -331,14 +800,11 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
                 print(info_str)
                 # start make and OVERWRITE the environment variables
                 # no __sratool_user_env_key__ in admin case
-                rc = os.system('cd {}; export roleName1={}; export usedRoleDir={}; \
-                            export roleName2={}; export usedRole2Dir={}; make {}'
-                               .format(cfp_root,
-                                       cur_active_role_dict['name'], get_cfp_role_path(cfp_root, cur_active_role_dict),
-                                       __to_be_defined_key__, __to_be_defined_key__,
-                                       # role 2 should be totally ignored?
-                                       # cur_active_role_dict['name'], get_cfp_role_path(cfp_root, cur_active_role_dict),
-                                       make_cmd))
+                make_env = {'roleName1': cur_active_role_dict['name'],
+                            'usedRoleDir': get_cfp_role_path(cfp_root, cur_active_role_dict),
+                            # role 2 should be totally ignored?
+                            'roleName2': __to_be_defined_key__, 'usedRole2Dir': __to_be_defined_key__}
+                rc = invoke_make(cfp_root, make_cmd, make_env)
                 return cFp_data, False, rc
             elif arguments['pr_full']:
                 # two active roles are required
@@ -346,14 +812,8 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
                 if cur_active_role_2 == __none_key__ or cur_active_role_2 == __to_be_defined_key__:
                     print("[sra:ERROR] A 2nd role must be set active first.")
                     return cFp_data, False, -1
-                is_existing = False
-                cur_active_role_dict_2 = None
-                for existing_entry in cFp_data[__sra_key__]['roles']:
-                    if existing_entry['name'] == cur_active_role_2:
-                        is_existing = True
-                        cur_active_role_dict_2 = existing_entry
-                        break
-                if not is_existing:
+                cur_active_role_dict_2 = cFp_data.get_role(cur_active_role_2)
+                if cur_active_role_dict_2 is None:
                     print("[sra:ERROR] No role with name {} is defined.".format(cur_active_role_2))
                     return cFp_data, False, -1
                 info_str = "[sra:INFO] Starting to build a *complete* partial reconfiguration design, " + \
@@ -364,44 +824,49 @@ def handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root, cF
                 print(info_str)
                 # start make and OVERWRITE the environment variables
                 # no __sratool_user_env_key__ in admin case
-                rc = os.system('cd {}; export roleName1={}; export usedRoleDir={}; \
-                            export roleName2={}; export usedRole2Dir={}; make {}'
-                               .format(cfp_root,
-                                       cur_active_role_dict['name'], get_cfp_role_path(cfp_root, cur_active_role_dict),
-                                       cur_active_role_dict_2['name'],
-                                       get_cfp_role_path(cfp_root, cur_active_role_dict_2),
-                                       make_cmd))
+                make_env = {'roleName1': cur_active_role_dict['name'],
+                            'usedRoleDir': get_cfp_role_path(cfp_root, cur_active_role_dict),
+                            'roleName2': cur_active_role_dict_2['name'],
+                            'usedRole2Dir': get_cfp_role_path(cfp_root, cur_active_role_dict_2)}
+                rc = invoke_make(cfp_root, make_cmd, make_env)
                 return cFp_data, False, rc
     return cFp_data, False, 0
 
 
-def main():
-    arguments = docopt(docstr, version=__version__)
-
-    # first, get and parse cFp.json
-    cfp_root = os.environ['cFpRootDir']
-    cfp_env_folder = os.path.abspath(cfp_root + '/env/')
-    cfenv_small_py_bin = os.path.abspath(cfp_root + 'env/cfenv-small/bin/python3')
-    cfp_json_file = os.path.abspath(cfp_root + '/' + __cfp_json_name__)
-    with open(cfp_json_file, 'r') as json_file:
-        cFp_data = json.load(json_file)
-
-    store_updated_cfp_json = False
-    # check for structure
+def check_cfp_structure(cFp_data, with_admin):
+    # returns True if cFp_data had to be extended
+    updated = False
     if __sra_key__ not in cFp_data:
-        cFp_data[__sra_key__] = __sra_dict_template__
-        store_updated_cfp_json = True
+        cFp_data[__sra_key__] = copy.deepcopy(__sra_dict_template__)
+        updated = True
 
-    if arguments['admin']:
+    if with_admin:
         if __admin_key__ not in cFp_data[__sra_key__]:
-            cFp_data[__sra_key__][__admin_key__] = __admin_dict_template__
-            store_updated_cfp_json = True
+            cFp_data[__sra_key__][__admin_key__] = copy.deepcopy(__admin_dict_template__)
+            cFp_data.mark_dirty(__sra_key__)
+            updated = True
 
     # check for used role 1
     if cFp_data['roleName1'] == __to_be_defined_key__:
-        store_updated_cfp_json = True
+        updated = True
         cFp_data['roleName1'] = 'default'
         cFp_data['usedRoleDir'] = ''  # default ROLE/ folder, no hierarchy
+    if updated:
+        # always update version
+        cFp_data[__sra_key__]['version'] = __version__
+    return updated
+
+
+def is_config_change(arguments):
+    if arguments['config']:
+        return not arguments['show']
+    return arguments['admin'] and (arguments['set-2nd-role'] or arguments['set-pr-roles'] or
+                                   arguments['write-to-json'])
+
+
+def run_command(arguments, cfp_root, cfp_json_file, cFp_data):
+    cfp_env_folder = os.path.abspath(cfp_root + '/env/')
+    cfenv_small_py_bin = os.path.abspath(cfp_root + 'env/cfenv-small/bin/python3')
 
     dcps_folder = os.path.abspath(cfp_root + __dcps_folder_name__)
     dcp_file_name = "3_top{}_STATIC.dcp".format(cFp_data[__mod_type_key__])
@@ -409,18 +874,117 @@ def main():
     meta_file_name = "3_top{}_STATIC.json".format(cFp_data[__mod_type_key__])
     meta_file_path = os.path.abspath(dcps_folder + "/" + meta_file_name)
 
+    if is_config_change(arguments):
+        # read-modify-write under the lock of cFp.json, so that concurrent sra invocations do not lose updates
+        with cfp_config.transaction(cfp_json_file) as cur_data:
+            check_cfp_structure(cur_data, arguments['admin'])
+            cFp_data_new, data_updated, rc = handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder,
+                                                              cfp_root, cur_data, dcp_file_path, meta_file_path)
+            if data_updated:
+                # always update version
+                cFp_data_new[__sra_key__]['version'] = __version__
+                cFp_data_new.mark_dirty(__sra_key__)
+        return cFp_data_new, rc
+
+    # other commands (e.g. builds) do not hold the lock while running, only a structure update is stored
+    if check_cfp_structure(cFp_data, arguments['admin']):
+        cFp_data.flush()
+
     # print(arguments)
     cFp_data_new, data_updated, rc = handle_arguments(arguments, cfenv_small_py_bin, cfp_env_folder, cfp_root,
                                                       cFp_data, dcp_file_path, meta_file_path)
+    return cFp_data_new, rc
 
-    # finally
-    if store_updated_cfp_json or data_updated:
-        # always update version
-        # cFp_data[__sra_key__]['version'] = __version__
-        cFp_data_new[__sra_key__]['version'] = __version__
-        with open(cfp_json_file, 'w') as json_file:
-            # json.dump(cFp_data, json_file, indent=4)
-            json.dump(cFp_data_new, json_file, indent=4)
+
+def run_session(arguments, cfp_root, cfp_json_file, cFp_data):
+    # the environment is sourced and cFp.json is parsed only once, for all commands of the session
+    interactive = arguments['shell']
+    if interactive:
+        try:
+            import readline  # noqa: F401 (enables line editing and history for input())
+        except ImportError:
+            pass
+        print("[sra:INFO] sra shell for {} (type 'exit' or press Ctrl-D to leave).".format(os.path.abspath(cfp_root)))
+    else:
+        try:
+            with open(arguments['<script-file>'], 'r') as script_file:
+                script_lines = script_file.read().splitlines()
+        except (IOError, OSError) as e:
+            print("[sra:ERROR] Can not read script {}: {}".format(arguments['<script-file>'], e))
+            return -1
+    rc = 0
+    line_nr = 0
+    while True:
+        if interactive:
+            try:
+                line = input(__session_prompt__)
+            except EOFError:
+                print('')
+                break
+            except KeyboardInterrupt:
+                print('')
+                continue
+        else:
+            if line_nr >= len(script_lines):
+                break
+            line = script_lines[line_nr]
+        line_nr += 1
+        try:
+            argv = shlex.split(line, comments=True)
+        except ValueError as e:
+            print("[sra:ERROR] Line {}: {}".format(line_nr, e))
+            argv = None
+        if argv is not None and len(argv) > 0 and argv[0] == 'sra':
+            argv = argv[1:]
+        if argv is not None and len(argv) == 0:
+            continue
+        if argv is not None and argv[0] in __session_exit_cmds__:
+            break
+        cmd_rc = -1
+        if argv is not None:
+            if not interactive:
+                print("[sra:INFO] ({}:{}) sra {}".format(arguments['<script-file>'], line_nr, ' '.join(argv)))
+            try:
+                cmd_arguments = docopt(docstr, argv=argv, version=__version__)
+            except DocoptExit as e:
+                print(e)
+                cmd_arguments = None
+            except SystemExit:
+                # -h or -v
+                cmd_arguments = None
+                cmd_rc = 0
+            if cmd_arguments is not None:
+                if cmd_arguments['shell'] or cmd_arguments['run-script']:
+                    print("[sra:ERROR] Sessions can not be nested.")
+                else:
+                    cFp_data, cmd_rc = run_command(cmd_arguments, cfp_root, cfp_json_file, cFp_data)
+        if cmd_rc != 0:
+            if interactive:
+                print("[sra:INFO] Command returned {}.".format(cmd_rc))
+            else:
+                rc = cmd_rc
+                if not arguments['--keep-going']:
+                    print("[sra:ERROR] Stopping the script after the failed command in line {}.".format(line_nr))
+                    break
+    return rc
+
+
+def main():
+    arguments = docopt(docstr, version=__version__)
+
+    # first, get and parse cFp.json
+    cfp_root = os.environ['cFpRootDir']
+    cfp_json_file = os.path.abspath(cfp_root + '/' + __cfp_json_name__)
+    try:
+        cFp_data = cfp_config.CfpConfig.load(cfp_json_file)
+    except cfp_config.CfpConfigError as e:
+        print("[sra:ERROR] The project describing file {} is invalid: {}".format(cfp_json_file, e))
+        return -1
+
+    if arguments['shell'] or arguments['run-script']:
+        rc = run_session(arguments, cfp_root, cfp_json_file, cFp_data)
+    else:
+        cFp_data, rc = run_command(arguments, cfp_root, cfp_json_file, cFp_data)
 
     if 'SraToolShowHint' in os.environ:
         if os.environ['SraToolShowHint'] == "True" and not 'SraToolHintWasShown' in os.environ:
@@ -435,8 +999,8 @@ def main():
                           'sra=srafunc\n' \
                           '--------------\n'
             print(srat_fyi + srat_bashrc)
-            os.system('cd {}/env; echo "export SraToolHintWasShown=1" >> this_machine_env.sh'
-                      .format(cfp_root))
+            with open(cfp_root + '/env/this_machine_env.sh', 'a') as env_file:
+                env_file.write('export SraToolHintWasShown=1\n')
     return rc
 
 
@@ -0,0 +1,120 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Single-pass renderer for ##KEY## templates (e.g. machine_env.template),
+#  *       used by cFCreate and gen_env.py.
+#  *
+
+import hashlib
+import json
+import re
+
+__placeholder_regex__ = re.compile(r'##([A-Za-z0-9_]+)##')
+__stamp_prefix__ = '# cFp-env-stamp: '
+
+# placeholder of machine_env.template -> key of the cFp data
+__machine_env_keys__ = [('ROOTDIR', 'abs_path'),
+                        ('MOD', 'cFpMOD'),
+                        ('SRA', 'cFpSRAtype'),
+                        ('DIR1', 'usedRoleDir'),
+                        ('DIR2', 'usedRoleDir2'),
+                        ('ROLE1', 'roleName1'),
+                        ('ROLE2', 'roleName2'),
+                        ('virtual_path', 'cfenvPath'),
+                        ('python3_bin', 'sysPython3Bin'),
+                        ('python3_hint_0', 'sysPython3Hint0'),
+                        ('python3_hint_1', 'sysPython3Hint1')]
+# deactivated placeholders, they stay in the output as (bash) comment
+__machine_env_passthrough__ = ['SOURCE_VIVADO']
+
+_compiled_templates = {}
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def compile_template(template):
+    """Splits the template once into literals (even positions) and placeholder names (odd positions)."""
+    tokens = _compiled_templates.get(template)
+    if tokens is None:
+        tokens = __placeholder_regex__.split(template)
+        _compiled_templates[template] = tokens
+    return tokens
+
+
+def render(template, values, passthrough=None):
+    tokens = compile_template(template)
+    out = list(tokens)
+    unknown = []
+    for i in range(1, len(tokens), 2):
+        key = tokens[i]
+        if key in values:
+            out[i] = values[key]
+        elif passthrough is not None and key in passthrough:
+            out[i] = '##' + key + '##'
+        else:
+            unknown.append(key)
+    if len(unknown) > 0:
+        raise TemplateError("No value for the template placeholder(s) {}.".format(
+            ', '.join(['##{}##'.format(k) for k in sorted(set(unknown))])))
+    return ''.join(out)
+
+
+def get_machine_env_values(data):
+    values = {}
+    missing = []
+    for placeholder, key in __machine_env_keys__:
+        if key not in data:
+            missing.append(key)
+        else:
+            values[placeholder] = str(data[key])
+    if len(missing) > 0:
+        raise TemplateError("The key(s) {} are missing.".format(', '.join(missing)))
+    return values
+
+
+def get_machine_env_stamp(data, template):
+    # hash over everything that ends up in the env file, so unrelated changes of cFp.json (e.g. roles) are ignored
+    stamp_data = [data.get(key) for _, key in __machine_env_keys__]
+    stamp_data.append(data.get('additional_lines', []))
+    stamp_data.append(template)
+    return hashlib.sha256(json.dumps(stamp_data).encode('utf-8')).hexdigest()
+
+
+def read_machine_env_stamp(env_file):
+    with open(env_file, 'r') as infile:
+        for line in infile:
+            if line.startswith(__stamp_prefix__):
+                return line[len(__stamp_prefix__):].strip()
+    return None
+
+
+def render_machine_env(template, data):
+    out = [render(template, get_machine_env_values(data), passthrough=__machine_env_passthrough__)]
+    if 'additional_lines' in data:
+        out.append('\n\n')
+        out.extend([str(e) + '\n' for e in data['additional_lines']])
+        out.append('\n\n')
+    out.append(__stamp_prefix__ + get_machine_env_stamp(data, template) + '\n')
+    return ''.join(out)
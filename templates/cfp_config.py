@@ -0,0 +1,286 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Lock-protected, atomic access to cFp.json and the in-memory model of it (CfpConfig), used by
+#  *       cFCreate and all scripts of a cFp.
+#  *
+
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+__lock_suffix__ = '.lock'
+__json_indent__ = 4
+
+# (key in cFp.json, attribute of CfpConfig, type)
+__typed_fields__ = [('cFpMOD', 'cFpMOD', str),
+                    ('cFpSRAtype', 'cFpSRAtype', str),
+                    ('srat-conf', 'srat_conf', dict),
+                    ('cFa', 'cFa', list),
+                    ('additional_lines', 'additional_lines', list)]
+__mandatory_keys__ = ['cFpMOD', 'usedRoleDir', 'usedRoleDir2', 'cFpSRAtype', 'roleName1', 'roleName2']
+__key_to_attr__ = {k: a for k, a, _ in __typed_fields__}
+__sra_key__ = 'srat-conf'
+__roles_key__ = 'roles'
+__active_role_key__ = 'active_role'
+__admin_key__ = 'admin'
+__to_be_defined_key__ = 'to-be-defined'
+
+
+class CfpConfigError(ValueError):
+    pass
+
+
+@contextmanager
+def locked(cfp_json_file, exclusive=True):
+    """Holds the advisory lock of cfp_json_file.
+
+    The lock is taken on a separate file, since every write replaces the inode of cfp_json_file itself.
+    """
+    with open(cfp_json_file + __lock_suffix__, 'a') as lock_file:
+        if exclusive:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load(cfp_json_file):
+    # no lock necessary: writers replace the file atomically, so a reader sees either the old or the new version
+    with open(cfp_json_file, 'r') as json_file:
+        return json.load(json_file)
+
+
+def write_atomic(cfp_json_file, data):
+    """Writes to a temporary file in the same directory, syncs it and renames it over cfp_json_file."""
+    target_dir = os.path.dirname(os.path.abspath(cfp_json_file))
+    fd, tmp_file = tempfile.mkstemp(prefix='.' + os.path.basename(cfp_json_file) + '.', dir=target_dir)
+    try:
+        with os.fdopen(fd, 'w') as json_file:
+            json.dump(data, json_file, indent=__json_indent__)
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        if os.path.exists(cfp_json_file):
+            os.chmod(tmp_file, os.stat(cfp_json_file).st_mode & 0o777)
+        else:
+            os.chmod(tmp_file, 0o644)
+        os.replace(tmp_file, cfp_json_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    dir_fd = os.open(target_dir, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class CfpConfig(object):
+    """The content of cFp.json.
+
+    The typed fields are attributes, all other keys (e.g. roleName1) are kept as they are and can be accessed like
+    the ones of a dict (config['roleName1'], which works for the typed fields, too). Every assignment marks the key
+    as dirty; changes *inside* a field (e.g. appending a role to srat_conf) must be announced with mark_dirty().
+    flush() writes the dirty keys once, on top of the current file content.
+
+    The roles of srat-conf are indexed by name; they must be changed with add_roles() and del_roles() only.
+    """
+    __slots__ = ('path', 'cFpMOD', 'cFpSRAtype', 'srat_conf', 'cFa', 'additional_lines', '_extra', '_dirty',
+                 '_replace', '_role_index')
+
+    def __init__(self, path, data=None):
+        object.__setattr__(self, '_dirty', set())
+        object.__setattr__(self, '_replace', data is None)
+        object.__setattr__(self, 'path', path)
+        self._set_data(data or {})
+
+    @classmethod
+    def load(cls, path, validate=True):
+        config = cls(path, load(path))
+        if validate:
+            config.validate()
+        return config
+
+    def _set_data(self, data):
+        extra = dict(data)
+        for key, attr, _ in __typed_fields__:
+            object.__setattr__(self, attr, extra.pop(key, None))
+        object.__setattr__(self, '_extra', extra)
+        self._build_role_index()
+
+    def _build_role_index(self):
+        index = {}
+        if isinstance(self.srat_conf, dict):
+            for entry in self.srat_conf.get(__roles_key__, []):
+                # the first entry wins, as for the former linear search
+                index.setdefault(entry['name'], entry)
+        object.__setattr__(self, '_role_index', index)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        for key, attr, _ in __typed_fields__:
+            if attr == name:
+                self._dirty.add(key)
+        if name == 'srat_conf':
+            self._build_role_index()
+
+    def __getitem__(self, key):
+        if key in __key_to_attr__:
+            value = getattr(self, __key_to_attr__[key])
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in __key_to_attr__:
+            setattr(self, __key_to_attr__[key], value)
+        else:
+            self._extra[key] = value
+            self._dirty.add(key)
+
+    def __delitem__(self, key):
+        self[key]  # raises KeyError if not present
+        if key in __key_to_attr__:
+            setattr(self, __key_to_attr__[key], None)
+        else:
+            del self._extra[key]
+            self._dirty.add(key)
+
+    def __contains__(self, key):
+        if key in __key_to_attr__:
+            return getattr(self, __key_to_attr__[key]) is not None
+        return key in self._extra
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def keys(self):
+        return [k for k, _, _ in __typed_fields__ if k in self] + list(self._extra.keys())
+
+    def to_dict(self):
+        return {k: self[k] for k in self.keys()}
+
+    def get_role(self, name):
+        # returns the role entry or None
+        return self._role_index.get(name)
+
+    def get_role_names(self):
+        return list(self._role_index.keys())
+
+    def has_role(self, name):
+        return name in self._role_index
+
+    def add_roles(self, entries):
+        roles = self.srat_conf[__roles_key__]
+        for entry in entries:
+            roles.append(entry)
+            self._role_index.setdefault(entry['name'], entry)
+        self._dirty.add(__sra_key__)
+
+    def del_roles(self, names):
+        # deletes all entries with the given names (in one pass), resets the settings that refer to them (active role,
+        # admin roles) and returns the number of deleted entries
+        names = set(names)
+        roles = self.srat_conf[__roles_key__]
+        kept = [e for e in roles if e['name'] not in names]
+        if len(kept) == len(roles):
+            return 0
+        self.srat_conf[__roles_key__] = kept
+        for name in names:
+            self._role_index.pop(name, None)
+        # no setting may refer to a deleted role
+        if self.srat_conf.get(__active_role_key__) in names:
+            self.srat_conf[__active_role_key__] = __to_be_defined_key__
+        admin = self.srat_conf.get(__admin_key__)
+        if admin is not None:
+            if admin.get('2nd-role') in names:
+                admin['2nd-role'] = __to_be_defined_key__
+            if 'pr-roles' in admin:
+                admin['pr-roles'] = [n for n in admin['pr-roles'] if n not in names]
+        self._dirty.add(__sra_key__)
+        return len(roles) - len(kept)
+
+    def mark_dirty(self, key):
+        self._dirty.add(key)
+
+    @property
+    def is_dirty(self):
+        return len(self._dirty) > 0
+
+    def validate(self):
+        problems = []
+        for key in __mandatory_keys__:
+            if key not in self:
+                problems.append("The mandatory key {} is missing.".format(key))
+        for key, attr, field_type in __typed_fields__:
+            value = getattr(self, attr)
+            if value is not None and not isinstance(value, field_type):
+                problems.append("The key {} must be of type {} (and not {}).".format(key, field_type.__name__,
+                                                                                     type(value).__name__))
+        if len(problems) > 0:
+            raise CfpConfigError(' '.join(problems))
+
+    def _write_dirty(self):
+        # must be called with the lock held
+        if self._replace or not os.path.exists(self.path):
+            data = self.to_dict()
+        else:
+            data = load(self.path)
+            for key in self._dirty:
+                if key in self:
+                    data[key] = self[key]
+                else:
+                    data.pop(key, None)
+        write_atomic(self.path, data)
+        self._dirty.clear()
+        object.__setattr__(self, '_replace', False)
+
+    def flush(self):
+        """Writes the dirty keys (or everything, for a new config) and returns whether a write was necessary."""
+        if not self.is_dirty and not self._replace:
+            return False
+        with locked(self.path):
+            self._write_dirty()
+        return True
+
+
+@contextmanager
+def transaction(cfp_json_file):
+    """Read-modify-write of cfp_json_file under the exclusive lock.
+
+    Yields the freshly loaded CfpConfig, its changes are written if the block did not raise.
+    """
+    with locked(cfp_json_file):
+        config = CfpConfig(cfp_json_file, load(cfp_json_file))
+        yield config
+        if config.is_dirty:
+            config._write_dirty()
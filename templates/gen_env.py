@@ -25,9 +25,13 @@
 #  *       Python file to parse cFp.json
 #  *
 
-import json
+import fcntl
+import hashlib
 import os
-import re
+import subprocess
+
+import cf_template
+import cfp_config
 
 __cfp_json_path__ = "/../cFp.json"
 __env_file_name__ = "/this_machine_env.sh"
@@ -36,39 +40,17 @@ __lignin_key__ = 'lignin-conf'
 __cfenv_small_name__ = 'cfenv-small'
 __cfenv_path_from_root__ = '/env/' + __cfenv_small_name__ + '/'
 __cfenv_req_packages__ = 'docopt==0.6.2 requests==2.26.0 cfsp'
+# host-wide pool of virtualenvs, shared by all cFps (set cFpCfenvPool=none to create one per cFp, as before)
+__cfenv_pool_env_key__ = 'cFpCfenvPool'
+__cfenv_pool_default__ = '~/.cache/cloudFPGA/cfenv-pool'
+__cfenv_pool_disabled__ = 'none'
+__cfenv_complete_marker__ = '.cfenv-complete'
+# local directory with wheels for offline installations (env variable or optional key in cFp.json)
+__wheelhouse_env_key__ = 'cFpWheelhouse'
+__wheelhouse_key__ = 'wheelhouse'
 
-__mandatory_keys__ = ['cFpMOD', 'usedRoleDir', 'usedRoleDir2', 'cFpSRAtype', 'roleName1', 'roleName2']
-__optional_keys__ = ['cFa', 'additional_lines', __lignin_key__]
-
-__match_regex__ = []
-__replace_regex__ = []
-
-__match_regex__.append("##ROOTDIR##")
-__replace_regex__.append("abs_path")
-
-__match_regex__.append("##MOD##")
-__replace_regex__.append("cFpMOD")
-
-__match_regex__.append("##SRA##")
-__replace_regex__.append("cFpSRAtype")
-
-__match_regex__.append("##DIR1##")
-__replace_regex__.append("usedRoleDir")
-
-__match_regex__.append("##DIR2##")
-__replace_regex__.append("usedRoleDir2")
-
-__match_regex__.append("##ROLE1##")
-__replace_regex__.append("roleName1")
-
-__match_regex__.append("##ROLE2##")
-__replace_regex__.append("roleName2")
-
-__match_regex__.append("##virtual_path##")
-__replace_regex__.append("cfenvPath")
-
-__match_regex__.append("##python3_bin##")
-__replace_regex__.append("sysPython3Bin")
+__optional_keys__ = ['cFa', 'additional_lines', __lignin_key__, __wheelhouse_key__]
+__template_file_name__ = "/machine_env.template"
 
 
 def print_incomplete(msg=""):
@@ -98,11 +80,67 @@ def get_sys_python_env():
     return sys_py_bin
 
 
+def get_pip_install_cmd(wheelhouse=None):
+    if wheelhouse is None:
+        return 'pip install {}'.format(__cfenv_req_packages__)
+    return 'pip install --no-index --find-links {} {}'.format(os.path.abspath(os.path.expanduser(wheelhouse)),
+                                                             __cfenv_req_packages__)
+
+
+def create_cfenv(cfenv_dir, sys_py_bin, wheelhouse=None):
+    os.system("rm -rf {}".format(cfenv_dir))
+    rc = os.system('cd {}; virtualenv -p {} {}'
+                   .format(os.path.dirname(cfenv_dir), sys_py_bin, os.path.basename(cfenv_dir)))
+    if rc != 0:
+        return rc
+    return os.system('/bin/bash -c "source {}/bin/activate; {}"'.format(cfenv_dir, get_pip_install_cmd(wheelhouse)))
+
+
+def get_cfenv_pool_key(sys_py_bin):
+    try:
+        py_version = subprocess.check_output([sys_py_bin.strip(), '-c', 'import sys; print(sys.version)'],
+                                             universal_newlines=True)
+    except (OSError, subprocess.CalledProcessError):
+        py_version = sys_py_bin
+    return hashlib.sha256((py_version + __cfenv_req_packages__).encode('utf-8')).hexdigest()[:16]
+
+
+def provision_cfenv(cfenv_dir, sys_py_bin, wheelhouse=None):
+    # links cfenv_dir to the virtualenv of the host pool, which is created if necessary (exactly once per host, even
+    # if several cFps bootstrap at the same time)
+    pool_dir = os.environ.get(__cfenv_pool_env_key__, __cfenv_pool_default__)
+    if pool_dir == __cfenv_pool_disabled__:
+        print("[INFO] the python virutalenv for this project on this machine is missing, installing it...")
+        return create_cfenv(cfenv_dir, sys_py_bin, wheelhouse)
+    pool_dir = os.path.abspath(os.path.expanduser(pool_dir))
+    os.makedirs(pool_dir, exist_ok=True)
+    pool_key = get_cfenv_pool_key(sys_py_bin)
+    pool_env = pool_dir + '/' + pool_key
+    rc = 0
+    with open(pool_env + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.isfile(pool_env + '/' + __cfenv_complete_marker__):
+            print("[INFO] the shared python virtualenv {} is missing, installing it...".format(pool_env))
+            rc = create_cfenv(pool_env, sys_py_bin, wheelhouse)
+            if rc == 0:
+                with open(pool_env + '/' + __cfenv_complete_marker__, 'w') as marker:
+                    marker.write(__cfenv_req_packages__ + '\n')
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    if rc != 0:
+        print("[ERROR] Failed to create the python virtualenv {}.".format(pool_env))
+        return rc
+    os.system("rm -rf {}".format(cfenv_dir))
+    os.symlink(pool_env, cfenv_dir)
+    return 0
+
+
 def main():
     me_abs = os.path.dirname(os.path.realpath(__file__))
     cfp_json_file = me_abs + __cfp_json_path__
-    with open(cfp_json_file, 'r') as json_file:
-        data = json.load(json_file)
+    try:
+        data = cfp_config.CfpConfig.load(cfp_json_file).to_dict()
+    except cfp_config.CfpConfigError as e:
+        print_incomplete(str(e))
 
     root_abs = os.path.realpath(me_abs+"/../")
     data['abs_path'] = root_abs
@@ -111,44 +149,40 @@ def main():
     # check for virtualenv
     cfenv_dir = os.path.abspath(root_abs + __cfenv_path_from_root__)
     if not os.path.isdir(cfenv_dir) or not os.path.isfile("{}/bin/activate".format(cfenv_dir)):
-        # delete it, to be sure
-        os.system("rm -rf {}".format(cfenv_dir))
-        # creating it
-        print("[INFO] the python virutalenv for this project on this machine is missing, installing it...")
-        os.system('cd {}; virtualenv -p {} {}'
-                  .format(os.path.abspath(cfenv_dir + '/../'), sys_py_bin, __cfenv_small_name__))
-        os.system('/bin/bash -c "source {}/bin/activate; pip install {}"'.format(cfenv_dir, __cfenv_req_packages__))
+        wheelhouse = os.environ.get(__wheelhouse_env_key__, data.get(__wheelhouse_key__))
+        provision_cfenv(cfenv_dir, sys_py_bin, wheelhouse)
 
     data['cfenvPath'] = cfenv_dir
     data['sysPython3Bin'] = sys_py_bin
-
-    for e in __mandatory_keys__:
-        if e not in data.keys():
-            print_incomplete("The mandatory key {} is missing.".format(e))
+    data['sysPython3Hint0'] = os.environ.get('cFsysPy3_cmd_hint_0', 'failed')
+    data['sysPython3Hint1'] = os.environ.get('cFsysPy3_cmd_hint_1', 'failed')
 
     env_file = me_abs + __env_file_name__
 
-    # first, check the timestamps
+    template_file = me_abs + __template_file_name__
+    # first, check the timestamps (the same check is done by setenv.sh, before python is started)
     if os.path.exists(env_file):
-        json_time = os.path.getmtime(cfp_json_file)
+        input_time = max(os.path.getmtime(cfp_json_file), os.path.getmtime(template_file),
+                         os.path.getmtime(os.path.realpath(__file__)))
         env_time = os.path.getmtime(env_file)
 
-        if env_time >= json_time:
+        if env_time >= input_time:
             # the environment was already created...nothing to do
             exit(0)
 
-    with open(me_abs + "/machine_env.template", "r") as input, open(env_file, "w+") as outfile:
-        out = input.read()
-        for i in range(0, len(__match_regex__)):
-            out = re.sub(re.escape(__match_regex__[i]), data[__replace_regex__[i]], out)
-
-        if 'additional_lines' in data.keys():
-            out += '\n\n'
-            for e in data['additional_lines']:
-                new_line = str(e) + '\n'
-                out += new_line
-            out += '\n\n'
-
+    with open(template_file, "r") as input:
+        template = input.read()
+    env_stamp = cf_template.get_machine_env_stamp(data, template)
+    if os.path.exists(env_file) and cf_template.read_machine_env_stamp(env_file) == env_stamp:
+        # content is still up to date, only refresh the timestamp for the fast path of setenv.sh
+        os.utime(env_file, None)
+        exit(0)
+
+    try:
+        out = cf_template.render_machine_env(template, data)
+    except cf_template.TemplateError as e:
+        print_incomplete(str(e))
+    with open(env_file, "w+") as outfile:
         outfile.write(out)
 
     os.system("chmod +x {}".format(env_file))
@@ -26,11 +26,13 @@
 
 import os
 import json
+import hashlib
 import requests
 
+import cfp_config
+import sra_ledger
+
 __cfp_json_path__ = "/../cFp.json"
-__shell_type_key__ = 'cFpSRAtype'
-__mod_type_key__ = 'cFpMOD'
 __dcps_folder_name__ = '/dcps/'
 
 __credentials_file_name__ = "user.json"
@@ -70,22 +72,24 @@ def main():
     debugging_flow = os.environ.get('CFP_DEBUGGING')
     if debugging_flow is not None:
         cfp_json_file = me_abs + debugging_flow + '/cFp.json'
-    with open(cfp_json_file, 'r') as json_file:
-        cFp_data = json.load(json_file)
+    try:
+        cFp_data = cfp_config.CfpConfig.load(cfp_json_file)
+    except cfp_config.CfpConfigError as e:
+        print("[cFBuild] ERROR: The project describing file {} is invalid: {}".format(cfp_json_file, e))
+        exit(1)
 
     # 1. check folders and file names
     root_abs = os.path.realpath(me_abs+"/../")
     if debugging_flow is not None:
         root_abs = os.path.realpath(me_abs + debugging_flow + "/env/" + "/../")
-    cFp_data['abs_path'] = root_abs
     dcps_folder = root_abs + __dcps_folder_name__
     os.system("mkdir -p {}".format(dcps_folder))  # to be sure
-    dcp_file_name = "3_top{}_STATIC.dcp".format(cFp_data[__mod_type_key__])
+    dcp_file_name = "3_top{}_STATIC.dcp".format(cFp_data.cFpMOD)
     target_file_name = os.path.abspath(dcps_folder + "/" + dcp_file_name)
-    meta_file_name = "3_top{}_STATIC.json".format(cFp_data[__mod_type_key__])
+    meta_file_name = "3_top{}_STATIC.json".format(cFp_data.cFpMOD)
     target_meta_name = os.path.abspath(dcps_folder + "/" + meta_file_name)
 
-    shell_type = cFp_data[__shell_type_key__]
+    shell_type = cFp_data.cFpSRAtype
 
     # 2. check credentials
     if load_user_credentials(root_abs) == -1:
@@ -148,6 +152,8 @@ def main():
     download_url = "http://"+cfrm_url+"/composablelogic/"+str(latest_shell_id)+"/dcp" + \
                    "?username={0}&password={1}".format(__openstack_user__, __openstack_pw__)
     err_msg = ""
+    # hashed while downloading, for the ledger
+    dcp_hash = hashlib.sha256()
     with requests.get(download_url, stream=True) as r2:
         r2.raise_for_status()
         if r2.status_code != 200:
@@ -156,12 +162,14 @@ def main():
         with open(target_file_name, 'wb') as f:
             for chunk in r2.iter_content(chunk_size=8192):
                 f.write(chunk)
+                dcp_hash.update(chunk)
     if requests_error:
         print("ERROR: Failed to download latest dcp ({}). STOP.".format(err_msg))
         exit(1)
 
     with open(target_meta_name, 'w') as outfile:
         json.dump(dcp_meta, outfile)
+    sra_ledger.record_dcp(root_abs, cFp_data.cFpMOD, shell_type, dcp_meta, target_file_name, dcp_hash.hexdigest())
 
     print("[cFBuild] Updated dcp of Shell '{}' to latest version ({}) successfully. DONE.\n\t(downloaded dcp to {})"
           .format(shell_type, latest_shell_id, target_file_name))
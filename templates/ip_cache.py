@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Host-wide, content-addressed cache of the generated HLS/IP cores of the ShellSrc, MidlwSrc and RoleIp
+#  *       steps (called by the Makefile with the system python, hence without external packages).
+#  *
+#  *     Synopsis:
+#  *       ip_cache.py (restore | store) <step> <src-dir>
+#  *
+#  *       restore (before the sub-make): computes the key of <src-dir> and restores the cores of a hit.
+#  *       store (after a successful sub-make): saves all files the sub-make created or changed.
+#  *       A cache problem never fails the build.
+#  *
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+
+__cache_dir_env_key__ = 'cFpIpCacheDir'
+__cache_disabled__ = 'none'
+__max_size_env_key__ = 'cFpIpCacheMaxGB'
+__max_size_default_gb__ = 20.0
+__state_folder_name__ = '/.sra/ip_cache/'
+__archive_name__ = 'cores.tar.gz'
+__meta_name__ = 'meta.json'
+__lock_name__ = '.lock'
+__src_prefix__ = 'src/'
+__ip_prefix__ = 'ip/'
+# all files of the source tree are part of the key, except the output folders (as in sra_watch); the generated HDL
+# lives in the *_prj folders of the HLS cores
+__skip_dirs__ = ['.git', '.Xil', '__pycache__', 'ip', 'build', 'xpr', 'dcps', 'hd_visual']
+__skip_dir_suffixes__ = ('_prj',)
+# tools whose (resolved) installation path identifies the tool version
+__tool_names__ = ['vivado_hls', 'vitis_hls', 'vivado']
+__tool_env_keys__ = ['XILINX_VIVADO', 'XILINX_HLS']
+
+
+def print_info(msg):
+    print("[ip_cache] {}".format(msg))
+    sys.stdout.flush()
+
+
+def get_cache_dir():
+    cache_dir = os.environ.get(__cache_dir_env_key__, '').strip()
+    if cache_dir == '' or cache_dir == __cache_disabled__:
+        return None
+    return os.path.abspath(os.path.expanduser(cache_dir))
+
+
+def get_max_size():
+    try:
+        return int(float(os.environ.get(__max_size_env_key__, __max_size_default_gb__)) * 1024 ** 3)
+    except ValueError:
+        return int(__max_size_default_gb__ * 1024 ** 3)
+
+
+def get_state_file(src_dir, step):
+    # per cFp, step and directory (RoleIp and RoleIp2 may run concurrently in different directories)
+    dir_hash = hashlib.sha256(src_dir.encode('utf-8')).hexdigest()[:12]
+    return os.path.abspath(os.environ.get('cFpRootDir', '.') + __state_folder_name__ +
+                           '{}-{}.json'.format(step, dir_hash))
+
+
+def walk_files(top, skip_outputs=False):
+    # yields the paths relative to top
+    for root, dirs, files in os.walk(top):
+        dirs[:] = sorted([d for d in dirs if d not in __skip_dirs__ and not d.endswith(__skip_dir_suffixes__)]) \
+            if skip_outputs else sorted(dirs)
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), top)
+
+
+def get_file_hash(file_path):
+    sha256_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for byte_block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256_hash.update(byte_block)
+    return sha256_hash.hexdigest()
+
+
+def get_tool_version():
+    parts = []
+    for tool in __tool_names__:
+        tool_path = shutil.which(tool)
+        parts.append(os.path.realpath(tool_path) if tool_path is not None else '')
+    for key in __tool_env_keys__:
+        parts.append(os.environ.get(key, ''))
+    return '|'.join(parts)
+
+
+def get_cache_key(step, src_dir, ignored_files):
+    key_hash = hashlib.sha256()
+    for part in [step, os.environ.get('cFpMOD', ''), os.environ.get('cFpSRAtype', ''), get_tool_version()]:
+        key_hash.update((part + '\n').encode('utf-8'))
+    for rel_path in walk_files(src_dir, skip_outputs=True):
+        if rel_path in ignored_files:
+            continue
+        try:
+            key_hash.update('{} {}\n'.format(rel_path, get_file_hash(os.path.join(src_dir, rel_path)))
+                            .encode('utf-8'))
+        except OSError:
+            # e.g. a dangling link
+            continue
+    return key_hash.hexdigest()
+
+
+def get_snapshot(top):
+    snapshot = {}
+    if not os.path.isdir(top):
+        return snapshot
+    for rel_path in walk_files(top):
+        try:
+            st = os.stat(os.path.join(top, rel_path))
+        except OSError:
+            continue
+        snapshot[rel_path] = [st.st_mtime, st.st_size]
+    return snapshot
+
+
+def load_state(state_file):
+    try:
+        with open(state_file, 'r') as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_state(state_file, state):
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    with open(state_file + '.tmp', 'w') as json_file:
+        json.dump(state, json_file)
+    os.replace(state_file + '.tmp', state_file)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def touch_entry(entry_dir):
+    # the mtime of an entry is its last use (for the LRU eviction)
+    try:
+        os.utime(entry_dir, None)
+    except OSError:
+        pass
+
+
+def extract_entry(entry_dir, src_dir, ip_dir):
+    now = time.time()
+    with tarfile.open(os.path.join(entry_dir, __archive_name__), 'r:gz') as tar:
+        for member in tar.getmembers():
+            if member.name.startswith(__src_prefix__):
+                base, rel_path = src_dir, member.name[len(__src_prefix__):]
+            elif member.name.startswith(__ip_prefix__) and ip_dir is not None:
+                base, rel_path = ip_dir, member.name[len(__ip_prefix__):]
+            else:
+                continue
+            target = os.path.normpath(os.path.join(base, rel_path))
+            if not member.isfile() or not target.startswith(os.path.normpath(base) + os.sep):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with tar.extractfile(member) as infile, open(target + '.ip_cache_tmp', 'wb') as outfile:
+                shutil.copyfileobj(infile, outfile)
+            os.chmod(target + '.ip_cache_tmp', member.mode & 0o777)
+            os.replace(target + '.ip_cache_tmp', target)
+            # newer than all sources, so the sub-make considers the restored cores as up to date
+            os.utime(target, (now, now))
+
+
+def restore(step, src_dir):
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return
+    src_dir = os.path.abspath(src_dir)
+    ip_dir = os.environ.get('cFpIpDir')
+    state_file = get_state_file(src_dir, step)
+    old_state = load_state(state_file) or {}
+    # outputs of the last run outside of the output folders (e.g. logs) must not change the key
+    ignored_files = set(old_state.get('outputs', []))
+    start = time.time()
+    key = get_cache_key(step, src_dir, ignored_files)
+    state = {'step': step, 'key': key, 'start': start, 'end': None, 'pid': os.getppid(),
+             'outputs': sorted(ignored_files), 'ip_snapshot': get_snapshot(ip_dir) if ip_dir else {}}
+    write_state(state_file, state)
+    entry_dir = os.path.join(cache_dir, key)
+    if not os.path.isfile(os.path.join(entry_dir, __meta_name__)):
+        print_info("{}: no cached cores for {} (key {}).".format(step, src_dir, key[:12]))
+        return
+    try:
+        extract_entry(entry_dir, src_dir, ip_dir)
+    except (OSError, tarfile.TarError) as e:
+        # e.g. evicted by another build in the meantime
+        print_info("{}: could not restore the cached cores ({}), building them.".format(step, e))
+        return
+    touch_entry(entry_dir)
+    print_info("{}: restored the cores of {} from the cache (key {}).".format(step, src_dir, key[:12]))
+
+
+def other_step_overlaps(state_file, state):
+    # another cached step of this cFp that ran at the same time could have written into cFpIpDir, too
+    state_dir = os.path.dirname(state_file)
+    for name in os.listdir(state_dir):
+        other_file = os.path.join(state_dir, name)
+        if other_file == state_file or not name.endswith('.json'):
+            continue
+        other = load_state(other_file)
+        if other is None or other.get('start') is None:
+            continue
+        if other.get('end') is None:
+            if is_alive(other.get('pid', -1)) and other['start'] < state['end']:
+                return True
+        elif other['start'] < state['end'] and other['end'] > state['start']:
+            return True
+    return False
+
+
+def evict(cache_dir, keep):
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        meta = load_state(os.path.join(entry_dir, __meta_name__))
+        if meta is None:
+            continue
+        total += meta.get('size', 0)
+        entries.append((os.path.getmtime(entry_dir), meta.get('size', 0), name))
+    max_size = get_max_size()
+    for _, size, name in sorted(entries):
+        if total <= max_size:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
+        print_info("evicted {} ({:.1f} MB) from the cache.".format(name[:12], size / 1024.0 ** 2))
+
+
+def store(step, src_dir):
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return
+    src_dir = os.path.abspath(src_dir)
+    ip_dir = os.environ.get('cFpIpDir')
+    state_file = get_state_file(src_dir, step)
+    state = load_state(state_file)
+    if state is None or state.get('end') is not None:
+        print_info("{}: no restore before this build, nothing to store.".format(step))
+        return
+    state['end'] = time.time()
+    key = state['key']
+    entry_dir = os.path.join(cache_dir, key)
+    # outputs: everything the sub-make created or changed
+    outputs = []
+    for rel_path in walk_files(src_dir):
+        try:
+            if os.path.getmtime(os.path.join(src_dir, rel_path)) >= state['start']:
+                outputs.append(rel_path)
+        except OSError:
+            continue
+    ip_outputs = []
+    if ip_dir:
+        for rel_path, stat in get_snapshot(ip_dir).items():
+            if state['ip_snapshot'].get(rel_path) != stat:
+                ip_outputs.append(rel_path)
+    if len(ip_outputs) > 0 and other_step_overlaps(state_file, state):
+        print_info("{}: another step wrote to {} at the same time, only the cores of {} are cached."
+                   .format(step, ip_dir, src_dir))
+        ip_outputs = []
+    keyed_files = set(walk_files(src_dir, skip_outputs=True))
+    state['outputs'] = sorted(set(state.get('outputs', [])) | (set(outputs) & keyed_files))
+    del state['ip_snapshot']
+    write_state(state_file, state)
+    if os.path.isfile(os.path.join(entry_dir, __meta_name__)):
+        touch_entry(entry_dir)
+        return
+    if len(outputs) + len(ip_outputs) == 0:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=cache_dir)
+    try:
+        with tarfile.open(os.path.join(tmp_dir, __archive_name__), 'w:gz', compresslevel=1) as tar:
+            for rel_path in outputs:
+                tar.add(os.path.join(src_dir, rel_path), arcname=__src_prefix__ + rel_path, recursive=False)
+            for rel_path in ip_outputs:
+                tar.add(os.path.join(ip_dir, rel_path), arcname=__ip_prefix__ + rel_path, recursive=False)
+        size = os.path.getsize(os.path.join(tmp_dir, __archive_name__))
+        with open(os.path.join(tmp_dir, __meta_name__), 'w') as json_file:
+            json.dump({'step': step, 'mod': os.environ.get('cFpMOD', ''), 'src_dir': src_dir, 'size': size,
+                       'files': len(outputs) + len(ip_outputs), 'created': time.strftime('%Y-%m-%dT%H:%M:%S')},
+                      json_file)
+        with open(os.path.join(cache_dir, __lock_name__), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if os.path.exists(entry_dir):
+                # stored by another cFp in the meantime
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            else:
+                os.rename(tmp_dir, entry_dir)
+                print_info("{}: stored {} files ({:.1f} MB) in the cache (key {})."
+                           .format(step, len(outputs) + len(ip_outputs), size / 1024.0 ** 2, key[:12]))
+            evict(cache_dir, key)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    except (OSError, tarfile.TarError) as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        print_info("{}: could not store the cores in the cache ({}).".format(step, e))
+
+
+def main(command, step, src_dir):
+    try:
+        if command == 'restore':
+            restore(step, src_dir)
+        elif command == 'store':
+            store(step, src_dir)
+        else:
+            print("[ip_cache] ERROR: unknown command {}.".format(command))
+    except OSError as e:
+        print_info("cache not available ({}), continuing without it.".format(e))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        print('ERROR: Usage is {} (restore | store) <step> <src-dir>. STOP'.format(sys.argv[0]))
+        exit(1)
+    main(sys.argv[1], sys.argv[2], sys.argv[3])
+    exit(0)
@@ -37,15 +37,25 @@ while [ -h "$SOURCE" ]; do # resolve $SOURCE until the file is no longer a symli
   SOURCE="$(readlink "$SOURCE")"
   [[ $SOURCE != /* ]] && SOURCE="$DIR/$SOURCE" # if $SOURCE was a relative symlink, we need to resolve it relative to the path where the symlink file was located
 done
-DIR="$( cd -P "$( dirname "$SOURCE" )" >/dev/null 2>&1 && pwd )"
+[[ $SOURCE != */* ]] && SOURCE="./$SOURCE"
+DIR="$( cd -P "${SOURCE%/*}" >/dev/null 2>&1 && pwd )"
 #echo $DIR
 
-export cFsysPy3_cmd_hint_0=$(hash -d python3.8 2>>/dev/null; which python3.8 2>>/dev/null || echo "failed")
-export cFsysPy3_cmd_hint_1=$(hash -d python3 2>>/dev/null; which python3 2>>/dev/null || echo "failed")
-
-# cFCreate also requires python3...so it should be there
-# will guarantee an up to date env file
-# on success, load env
-$DIR/gen_env.py && source $DIR/this_machine_env.sh
-
+# fast path (bash builtins only): the env file is up to date, if it is newer than cFp.json and its generator,
+# and if the virtualenv exists. Otherwise gen_env.py decides (it also compares the stamp in the env file).
+cFpEnvFile_="$DIR/this_machine_env.sh"
+if [[ -z "$cFpForceGenEnv" && -f "$cFpEnvFile_" && -f "$DIR/cfenv-small/bin/activate" \
+      && ! "$DIR/../cFp.json" -nt "$cFpEnvFile_" && ! "$DIR/machine_env.template" -nt "$cFpEnvFile_" \
+      && ! "$DIR/gen_env.py" -nt "$cFpEnvFile_" ]]; then
+  source "$cFpEnvFile_"
+else
+  export cFsysPy3_cmd_hint_0=$(hash -d python3.8 2>>/dev/null; which python3.8 2>>/dev/null || echo "failed")
+  export cFsysPy3_cmd_hint_1=$(hash -d python3 2>>/dev/null; which python3 2>>/dev/null || echo "failed")
+
+  # cFCreate also requires python3...so it should be there
+  # will guarantee an up to date env file
+  # on success, load env
+  $DIR/gen_env.py && source $DIR/this_machine_env.sh
+fi
+unset cFpEnvFile_
 
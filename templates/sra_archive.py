@@ -0,0 +1,275 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Archive of built bitstreams, signatures and reports (for rollbacks): the files of a build are split into
+#  *       chunks that are stored once per content hash and compressed with zstd (if the zstandard package is
+#  *       installed) or lzma.
+#  *
+
+import hashlib
+import json
+import lzma
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import sra_retention
+
+__archive_dir_env_key__ = 'cFpArchiveDir'
+__archive_folder_name__ = '/.sra/archive/'
+__chunks_folder_name__ = 'chunks'
+__builds_folder_name__ = 'builds'
+__chunk_size__ = 1024 * 1024
+__zstd_level__ = 10
+__lzma_preset__ = 6
+__zstd_ending__ = '.zst'
+__lzma_ending__ = '.xz'
+__io_workers__ = 8
+__codec_errors__ = (lzma.LZMAError,) if zstandard is None else (lzma.LZMAError, zstandard.ZstdError)
+
+
+def get_archive_folder(cfp_root):
+    archive_dir = os.environ.get(__archive_dir_env_key__)
+    if archive_dir is not None and archive_dir.strip() != '':
+        return os.path.abspath(os.path.expanduser(archive_dir))
+    return os.path.abspath(cfp_root + __archive_folder_name__)
+
+
+def get_cfp_id(cfp_root):
+    # several cFps can share one archive ($cFpArchiveDir), hence their builds are kept apart by the cFp location
+    cfp_root = os.path.realpath(cfp_root)
+    return '{}-{}'.format(os.path.basename(cfp_root), hashlib.sha256(cfp_root.encode('utf-8')).hexdigest()[:12])
+
+
+def get_chunk_path(archive_folder, chunk_hash, ending):
+    return os.path.join(archive_folder, __chunks_folder_name__, chunk_hash[:2], chunk_hash + ending)
+
+
+def compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=__zstd_level__).compress(data), __zstd_ending__
+    return lzma.compress(data, preset=__lzma_preset__), __lzma_ending__
+
+
+def decompress(data, ending):
+    if ending == __zstd_ending__:
+        if zstandard is None:
+            raise IOError("the chunk is compressed with zstd, but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return lzma.decompress(data)
+
+
+def find_chunk(archive_folder, chunk_hash):
+    # returns (path, ending) of a stored chunk or (None, None)
+    for ending in [__zstd_ending__, __lzma_ending__]:
+        chunk_path = get_chunk_path(archive_folder, chunk_hash, ending)
+        if os.path.isfile(chunk_path):
+            return chunk_path, ending
+    return None, None
+
+
+def write_file_atomic(target, data):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(target))
+    with os.fdopen(fd, 'wb') as outfile:
+        outfile.write(data)
+    os.replace(tmp_file, target)
+
+
+def ingest_file(archive_folder, file_path):
+    """Stores the new chunks of file_path; returns (file entry, number of new chunks, stored bytes)."""
+    entry = {'name': os.path.basename(file_path), 'size': 0, 'mode': os.stat(file_path).st_mode & 0o777,
+             'chunks': []}
+    file_hash = hashlib.sha256()
+    new_chunks = 0
+    stored_bytes = 0
+    with open(file_path, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(__chunk_size__), b""):
+            file_hash.update(chunk)
+            entry['size'] += len(chunk)
+            chunk_hash = hashlib.sha256(chunk).hexdigest()
+            entry['chunks'].append(chunk_hash)
+            if find_chunk(archive_folder, chunk_hash)[0] is not None:
+                continue
+            data, ending = compress(chunk)
+            write_file_atomic(get_chunk_path(archive_folder, chunk_hash, ending), data)
+            new_chunks += 1
+            stored_bytes += len(data)
+    entry['sha256'] = file_hash.hexdigest()
+    return entry, new_chunks, stored_bytes
+
+
+def get_manifest_path(archive_folder, cfp_id, mod, build_id):
+    return os.path.join(archive_folder, __builds_folder_name__, cfp_id, mod, build_id + '.json')
+
+
+def load_manifest(archive_folder, cfp_id, mod, build_id):
+    manifest_path = get_manifest_path(archive_folder, cfp_id, mod, build_id)
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path, 'r') as json_file:
+        return json.load(json_file)
+
+
+def list_manifests(archive_folder, cfp_id):
+    # the manifests of all MODs of a cFp
+    cfp_folder = os.path.join(archive_folder, __builds_folder_name__, cfp_id)
+    if not os.path.isdir(cfp_folder):
+        return []
+    manifests = []
+    for mod in sorted(os.listdir(cfp_folder)):
+        if not os.path.isdir(os.path.join(cfp_folder, mod)):
+            continue
+        for file_name in sorted(os.listdir(os.path.join(cfp_folder, mod))):
+            if file_name.endswith('.json'):
+                with open(os.path.join(cfp_folder, mod, file_name), 'r') as json_file:
+                    manifests.append(json.load(json_file))
+    return manifests
+
+
+def select_build(cfp_root, build_id=None, role=None):
+    """Returns (build id, build of the dcps/ index): the given one, or the latest one (of role)."""
+    builds = sra_retention.get_builds(sra_retention.update_index(cfp_root))
+    if build_id is not None:
+        return build_id, builds.get(build_id)
+    candidates = [b for b in builds if builds[b]['role'] != sra_retention.__unknown_role__ and
+                  (role is None or builds[b]['role'] == role)]
+    if len(candidates) == 0:
+        return None, None
+    latest = max(candidates, key=lambda b: builds[b]['time'])
+    return latest, builds[latest]
+
+
+def ingest(cfp_root, cFp_data, build_id=None, role=None):
+    build_id, build = select_build(cfp_root, build_id, role)
+    if build is None:
+        print("[sra:ERROR] No such build in {} (see 'sra config retention').".format(
+            sra_retention.get_dcps_folder(cfp_root)))
+        return -1
+    archive_folder = get_archive_folder(cfp_root)
+    cfp_id = get_cfp_id(cfp_root)
+    if load_manifest(archive_folder, cfp_id, cFp_data['cFpMOD'], build_id) is not None:
+        print("[sra:INFO] Build {} is already archived.".format(build_id))
+        return 0
+    if not build['signed']:
+        print("[sra:WARNING] Build {} has no signature (.sig).".format(build_id))
+    dcps_folder = sra_retention.get_dcps_folder(cfp_root)
+    start = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=__io_workers__) as executor:
+            results = list(executor.map(lambda f: ingest_file(archive_folder, os.path.join(dcps_folder, f)),
+                                        sorted(build['files'])))
+    except (IOError, OSError) + __codec_errors__ as e:
+        print("[sra:ERROR] Failed to archive build {}: {}".format(build_id, e))
+        return -1
+    manifest = {'id': build_id, 'cfp': cfp_id, 'cfp_root': os.path.realpath(cfp_root), 'role': build['role'],
+                'flow': build['flow'], 'time': build['time'], 'mod': cFp_data['cFpMOD'],
+                'sra': cFp_data['cFpSRAtype'], 'signed': build['signed'],
+                'archived': time.strftime('%Y-%m-%dT%H:%M:%S'), 'files': [r[0] for r in results]}
+    write_file_atomic(get_manifest_path(archive_folder, cfp_id, cFp_data['cFpMOD'], build_id),
+                      json.dumps(manifest, indent=1).encode('utf-8'))
+    total = sum([r[0]['size'] for r in results])
+    stored = sum([r[2] for r in results])
+    print("[sra:INFO] Archived build {} ({} files, {:.1f} MB) in {:.1f}s: {} new chunks with {:.1f} MB ({}) in {}."
+          .format(build_id, len(results), total / 1024.0 ** 2, time.time() - start, sum([r[1] for r in results]),
+                  stored / 1024.0 ** 2, 'zstd' if zstandard is not None else 'lzma', archive_folder))
+    return 0
+
+
+def restore_file(archive_folder, entry, target):
+    # streams the chunks into a temporary file, which replaces target only if the content is complete and correct
+    file_hash = hashlib.sha256()
+    fd, tmp_file = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, 'wb') as outfile:
+            for chunk_hash in entry['chunks']:
+                chunk_path, ending = find_chunk(archive_folder, chunk_hash)
+                if chunk_path is None:
+                    raise IOError("the chunk {} is missing".format(chunk_hash))
+                with open(chunk_path, 'rb') as infile:
+                    chunk = decompress(infile.read(), ending)
+                file_hash.update(chunk)
+                outfile.write(chunk)
+        if file_hash.hexdigest() != entry['sha256']:
+            raise IOError("the checksum of {} does not match".format(entry['name']))
+        os.chmod(tmp_file, entry['mode'])
+        os.replace(tmp_file, target)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+
+def restore(cfp_root, cFp_data, build_id):
+    archive_folder = get_archive_folder(cfp_root)
+    cfp_id = get_cfp_id(cfp_root)
+    manifests = [m for m in list_manifests(archive_folder, cfp_id) if m['id'] == build_id]
+    if len(manifests) == 0:
+        print("[sra:ERROR] Build {} of this cFp is not archived in {}.".format(build_id, archive_folder))
+        return -1
+    manifest = manifests[0]
+    for m in manifests:
+        if m['mod'] == cFp_data['cFpMOD']:
+            manifest = m
+    if manifest['mod'] != cFp_data['cFpMOD'] or manifest['sra'] != cFp_data['cFpSRAtype']:
+        print("[sra:ERROR] Build {} was archived with {}/{}, but this cFp uses {}/{}. Stop."
+              .format(build_id, manifest['sra'], manifest['mod'], cFp_data['cFpSRAtype'], cFp_data['cFpMOD']))
+        return -1
+    dcps_folder = sra_retention.get_dcps_folder(cfp_root)
+    os.makedirs(dcps_folder, exist_ok=True)
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=__io_workers__) as executor:
+        futures = [executor.submit(restore_file, archive_folder, e, os.path.join(dcps_folder, e['name']))
+                   for e in manifest['files']]
+        errors = []
+        for f in futures:
+            try:
+                f.result()
+            except (IOError, OSError) + __codec_errors__ as e:
+                errors.append(str(e))
+    if len(errors) > 0:
+        print("[sra:ERROR] Failed to restore build {}: {}".format(build_id, '; '.join(errors)))
+        return -1
+    file_names = [e['name'] for e in manifest['files']]
+    sra_retention.add_build(cfp_root, file_names, manifest['role'], manifest['flow'], build_id, manifest['time'])
+    print("[sra:INFO] Restored build {} of role {} ({} files) to {} in {:.1f}s."
+          .format(build_id, manifest['role'], len(file_names), dcps_folder, time.time() - start))
+    return 0
+
+
+def print_list(cfp_root):
+    archive_folder = get_archive_folder(cfp_root)
+    manifests = list_manifests(archive_folder, get_cfp_id(cfp_root))
+    print("[sra:INFO] Archived builds of this cFp in {}:".format(archive_folder))
+    if len(manifests) == 0:
+        print("\tnone")
+    for m in manifests:
+        print("\t{:<22}{:<24}{:<12}{:<10}{:<10}{:>10.1f} MB   {}"
+              .format(m['id'], m['role'], str(m['flow']), m['mod'], m['sra'],
+                      sum([f['size'] for f in m['files']]) / 1024.0 ** 2, 'signed' if m['signed'] else 'unsigned'))
+    return 0
@@ -0,0 +1,113 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Build history of a cFp (read from the build ledger) and detection of build-time regressions.
+#  *
+
+import json
+import os
+import sqlite3
+import time
+
+import sra_ledger
+
+__total_phase_key__ = 'total'
+__mad_to_sigma__ = 1.4826
+__sigma_factor__ = 3.0
+__min_baseline_builds__ = 3
+
+
+def load_history(cfp_root, role=None):
+    """Returns the builds recorded in the ledger (oldest first), with their durations per phase."""
+    if not os.path.isfile(sra_ledger.get_ledger_file(cfp_root)):
+        return []
+    try:
+        db = sra_ledger.connect(cfp_root)
+        try:
+            # a negative limit means no limit
+            rows = sra_ledger.query_builds(db, role=role, limit=-1)
+        finally:
+            db.close()
+    except sqlite3.Error as e:
+        print("[sra:WARNING] Failed to read the build ledger {}: {}".format(sra_ledger.get_ledger_file(cfp_root), e))
+        return []
+    history = []
+    for row in reversed(rows):
+        durations = {__total_phase_key__: row['duration_s'] or 0.0}
+        if row['phases'] is not None:
+            durations.update(json.loads(row['phases']))
+        history.append({'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(row['time'])), 'role': row['role'],
+                        'flow': row['flow'], 'mod': row['mod'], 'sra': row['sra'], 'make_target': row['make_target'],
+                        'rc': row['rc'], 'durations': durations})
+    return history
+
+
+def median(values):
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    if len(ordered) % 2 == 1:
+        return float(ordered[mid])
+    return (ordered[mid - 1] + ordered[mid]) / 2.0
+
+
+def check_regressions(history, role, flow, mod, window, threshold_pct):
+    """Compares the latest successful build against the median of the previous ones.
+
+    The baseline only contains builds with the same make target (e.g. monolithic_incr is not compared with a full
+    monolithic build) and the same Shell. A phase is flagged, if it is slower than the baseline median by more than
+    threshold_pct percent *and* by more than __sigma_factor__ robust standard deviations (derived from the MAD), so
+    that noisy phases do not trigger on normal jitter. Returns (latest entry, list of result dicts).
+    """
+    builds = [e for e in history if e['role'] == role and e['flow'] == flow and e['mod'] == mod and e['rc'] == 0]
+    if len(builds) == 0:
+        return None, []
+    latest = builds[-1]
+    builds = [e for e in builds if e['make_target'] == latest['make_target'] and e['sra'] == latest['sra']]
+    baseline = builds[-(window + 1):-1]
+    results = []
+    for phase, cur_value in sorted(latest['durations'].items()):
+        values = [e['durations'][phase] for e in baseline if phase in e['durations']]
+        result = {'phase': phase, 'latest': cur_value, 'baseline_builds': len(values), 'median': None,
+                  'mad': None, 'change_pct': None, 'regression': False}
+        if len(values) >= __min_baseline_builds__:
+            med = median(values)
+            mad = median([abs(v - med) for v in values])
+            result['median'] = med
+            result['mad'] = mad
+            if med > 0:
+                result['change_pct'] = (cur_value - med) * 100.0 / med
+                result['regression'] = result['change_pct'] > threshold_pct and \
+                    (cur_value - med) > __sigma_factor__ * __mad_to_sigma__ * mad
+        results.append(result)
+    return latest, results
+
+
+def get_previous_shell(history, latest):
+    """Returns the Shell of the previous successful build of the same target, if it differs from the one of latest
+    (the timings of both Shells are not compared).
+    """
+    for e in reversed(history[:history.index(latest)]):
+        if e['role'] == latest['role'] and e['flow'] == latest['flow'] and e['mod'] == latest['mod'] and \
+                e['make_target'] == latest['make_target'] and e['rc'] == 0:
+            return e['sra'] if e['sra'] != latest['sra'] else None
+    return None
@@ -0,0 +1,194 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Per-Role slots of the reference checkpoints for incremental monolithic builds: the checkpoints that
+#  *       'make save_mono_incr' writes to dcps/ are kept below <cFp-Root>/.sra/incr/<role>/ and the best matching
+#  *       one is put back into dcps/ before 'sra build monolithic --incr'.
+#  *
+
+import json
+import os
+import shutil
+import time
+
+__sra_state_folder_name__ = '/.sra/'
+__incr_folder_name__ = 'incr'
+__dcps_folder_name__ = '/dcps/'
+__meta_file_name__ = 'slot.json'
+__checkpoint_ending__ = '.dcp'
+__incr_key__ = 'incr-checkpoints'
+__slots_per_role_key__ = 'slots-per-role'
+__max_age_key__ = 'max-age-days'
+__max_gb_key__ = 'max-gb'
+__incr_defaults__ = {__slots_per_role_key__: 2, __max_age_key__: 30, __max_gb_key__: 20}
+
+
+def get_incr_folder(cfp_root):
+    return os.path.abspath(cfp_root + __sra_state_folder_name__ + __incr_folder_name__)
+
+
+def get_dcps_folder(cfp_root):
+    return os.path.abspath(cfp_root + __dcps_folder_name__)
+
+
+def get_policy(sra_conf):
+    policy = dict(__incr_defaults__)
+    policy.update(sra_conf.get(__incr_key__, {}))
+    return policy
+
+
+def get_checkpoint_snapshot(cfp_root):
+    # name -> (mtime, size) of all checkpoints in dcps/
+    dcps_folder = get_dcps_folder(cfp_root)
+    snapshot = {}
+    if not os.path.isdir(dcps_folder):
+        return snapshot
+    for file_name in os.listdir(dcps_folder):
+        file_path = os.path.join(dcps_folder, file_name)
+        if file_name.endswith(__checkpoint_ending__) and os.path.isfile(file_path):
+            st = os.stat(file_path)
+            snapshot[file_name] = (st.st_mtime, st.st_size)
+    return snapshot
+
+
+def load_slots(cfp_root):
+    """Returns the meta data of all slots (with their folder in 'path'), the newest first."""
+    incr_folder = get_incr_folder(cfp_root)
+    slots = []
+    if not os.path.isdir(incr_folder):
+        return slots
+    for role_folder in os.listdir(incr_folder):
+        role_path = os.path.join(incr_folder, role_folder)
+        if not os.path.isdir(role_path):
+            continue
+        for slot_id in os.listdir(role_path):
+            meta_file = os.path.join(role_path, slot_id, __meta_file_name__)
+            if not os.path.isfile(meta_file):
+                continue
+            try:
+                with open(meta_file, 'r') as json_file:
+                    slot = json.load(json_file)
+            except ValueError:
+                continue
+            slot['path'] = os.path.dirname(meta_file)
+            slots.append(slot)
+    slots.sort(key=lambda s: s['time'], reverse=True)
+    return slots
+
+
+def save_slot(cfp_root, before, role, mod, sra):
+    """Copies the checkpoints that changed since the snapshot before into a new slot of role."""
+    after = get_checkpoint_snapshot(cfp_root)
+    changed = sorted([f for f in after if before.get(f) != after[f]])
+    if len(changed) == 0:
+        print("[sra:WARNING] 'make save_mono_incr' did not write a checkpoint to dcps/, no incremental slot saved.")
+        return None
+    slot_id = '{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid())
+    role_folder = role.replace(os.sep, '~')
+    slot_path = os.path.join(get_incr_folder(cfp_root), role_folder, slot_id)
+    tmp_path = os.path.join(get_incr_folder(cfp_root), role_folder, '.' + slot_id)
+    os.makedirs(tmp_path)
+    dcps_folder = get_dcps_folder(cfp_root)
+    size = 0
+    for file_name in changed:
+        shutil.copy2(os.path.join(dcps_folder, file_name), os.path.join(tmp_path, file_name))
+        size += after[file_name][1]
+    with open(os.path.join(tmp_path, __meta_file_name__), 'w') as json_file:
+        json.dump({'role': role, 'mod': mod, 'sra': sra, 'time': time.time(), 'files': changed, 'size': size},
+                  json_file)
+    # a slot becomes visible only when it is complete
+    os.rename(tmp_path, slot_path)
+    print("[sra:INFO] Saved the incremental checkpoint of role {} ({:.1f} MB) in {}."
+          .format(role, size / 1024.0 ** 2, slot_path))
+    return slot_path
+
+
+def select_slot(slots, role, mod, sra):
+    """The newest slot of role, otherwise the newest slot of another Role (the static part still matches);
+    only slots of the same MOD and Shell are considered.
+    """
+    candidates = [s for s in slots if s['mod'] == mod and s['sra'] == sra]
+    for s in candidates:
+        if s['role'] == role:
+            return s
+    if len(candidates) > 0:
+        return candidates[0]
+    return None
+
+
+def restore_slot(cfp_root, role, mod, sra):
+    slot = select_slot(load_slots(cfp_root), role, mod, sra)
+    if slot is None:
+        print("[sra:INFO] No incremental checkpoint for role {} available, using the content of dcps/ (if any)."
+              .format(role))
+        return None
+    dcps_folder = get_dcps_folder(cfp_root)
+    os.makedirs(dcps_folder, exist_ok=True)
+    for file_name in slot['files']:
+        shutil.copy2(os.path.join(slot['path'], file_name), os.path.join(dcps_folder, file_name + '.tmp'))
+        os.replace(os.path.join(dcps_folder, file_name + '.tmp'), os.path.join(dcps_folder, file_name))
+    # for the age based eviction, a used slot counts as new
+    os.utime(os.path.join(slot['path'], __meta_file_name__), None)
+    if slot['role'] == role:
+        print("[sra:INFO] Using the incremental checkpoint of role {} from {}."
+              .format(role, time.strftime('%Y-%m-%d %H:%M', time.localtime(slot['time']))))
+    else:
+        print("[sra:INFO] No incremental checkpoint of role {}, using the one of role {} from {}."
+              .format(role, slot['role'], time.strftime('%Y-%m-%d %H:%M', time.localtime(slot['time']))))
+    return slot
+
+
+def evict_slots(cfp_root, sra_conf):
+    """Deletes the slots beyond slots-per-role (per Role), the unused ones older than max-age-days and the oldest
+    ones above max-gb; the newest slot of each Role is kept by the latter two.
+    """
+    policy = get_policy(sra_conf)
+    slots = load_slots(cfp_root)
+    now = time.time()
+    evict = []
+    kept = []
+    per_role = {}
+    for s in slots:
+        n = per_role.get(s['role'], 0)
+        per_role[s['role']] = n + 1
+        last_used = os.path.getmtime(os.path.join(s['path'], __meta_file_name__))
+        if policy[__slots_per_role_key__] > 0 and n >= policy[__slots_per_role_key__]:
+            evict.append(s)
+        elif n > 0 and policy[__max_age_key__] > 0 and now - last_used > policy[__max_age_key__] * 24 * 3600:
+            evict.append(s)
+        else:
+            kept.append((n, s))
+    max_bytes = float(policy[__max_gb_key__]) * 1024 ** 3
+    total = sum([s['size'] for _, s in kept])
+    for n, s in sorted(kept, key=lambda e: e[1]['time']):
+        if max_bytes <= 0 or total <= max_bytes:
+            break
+        if n > 0:
+            evict.append(s)
+            total -= s['size']
+    for s in evict:
+        shutil.rmtree(s['path'], ignore_errors=True)
+    if len(evict) > 0:
+        print("[sra:INFO] Evicted {} old incremental checkpoints ({:.1f} MB)."
+              .format(len(evict), sum([s['size'] for s in evict]) / 1024.0 ** 2))
+    return len(evict)
@@ -0,0 +1,304 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Build ledger of a cFp (<cFp-Root>/.sra/ledger.sqlite), the only store of build records: the builds
+#  *       (with their phase durations), their artifacts in dcps/ (with hashes and signature information), the
+#  *       signatures created during a build, the downloaded static DCPs and a digest cache, so that recording a
+#  *       build does not re-hash unchanged files.
+#  *       The ledger is informative only, an error while writing it never fails a build.
+#  *
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+__sra_state_folder_name__ = '/.sra/'
+__ledger_file_name__ = 'ledger.sqlite'
+__dcps_folder_name__ = '/dcps/'
+__schema_version__ = 2
+__busy_timeout_s__ = 30.0
+__sig_file_ending__ = '.sig'
+__bitstream_endings__ = ('.bit', '.bin', '.mcs')
+__hash_block_size__ = 1024 * 1024
+__schema__ = """
+CREATE TABLE IF NOT EXISTS builds (id INTEGER PRIMARY KEY, build_id TEXT UNIQUE NOT NULL, time REAL NOT NULL,
+    role TEXT, flow TEXT, mod TEXT, sra TEXT, make_target TEXT, rc INTEGER, duration_s REAL, phases TEXT,
+    pl_id TEXT, dcp_cert TEXT);
+CREATE TABLE IF NOT EXISTS artifacts (id INTEGER PRIMARY KEY, build INTEGER NOT NULL REFERENCES builds(id),
+    file_name TEXT NOT NULL, size INTEGER, sha256 TEXT, sig TEXT, pl_id TEXT, verify TEXT);
+CREATE TABLE IF NOT EXISTS dcps (id INTEGER PRIMARY KEY, time REAL NOT NULL, mod TEXT, sra TEXT, pl_id TEXT,
+    cert TEXT, sha256 TEXT, size INTEGER);
+CREATE TABLE IF NOT EXISTS signatures (id INTEGER PRIMARY KEY, build INTEGER REFERENCES builds(id),
+    time REAL NOT NULL, sig_file TEXT NOT NULL, file_name TEXT, algorithm TEXT, signer TEXT, pl_id TEXT, sig TEXT,
+    sha256 TEXT, verify TEXT);
+CREATE TABLE IF NOT EXISTS digests (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS builds_role ON builds(role, time);
+CREATE INDEX IF NOT EXISTS builds_pl_id ON builds(pl_id);
+CREATE INDEX IF NOT EXISTS artifacts_build ON artifacts(build);
+CREATE INDEX IF NOT EXISTS artifacts_sha256 ON artifacts(sha256);
+CREATE INDEX IF NOT EXISTS artifacts_pl_id ON artifacts(pl_id);
+CREATE INDEX IF NOT EXISTS dcps_pl_id ON dcps(pl_id);
+CREATE INDEX IF NOT EXISTS signatures_build ON signatures(build);
+CREATE INDEX IF NOT EXISTS signatures_pl_id ON signatures(pl_id);
+"""
+
+
+def get_ledger_file(cfp_root):
+    return os.path.abspath(cfp_root + __sra_state_folder_name__ + __ledger_file_name__)
+
+
+def connect(cfp_root):
+    ledger_file = get_ledger_file(cfp_root)
+    os.makedirs(os.path.dirname(ledger_file), exist_ok=True)
+    db = sqlite3.connect(ledger_file, timeout=__busy_timeout_s__)
+    db.row_factory = sqlite3.Row
+    # several sra processes (e.g. queued builds and the signing scripts) write the same ledger
+    db.execute('PRAGMA journal_mode=WAL')
+    if db.execute('PRAGMA user_version').fetchone()[0] < __schema_version__:
+        with db:
+            db.executescript(__schema__)
+            db.execute('PRAGMA user_version = {}'.format(__schema_version__))
+    return db
+
+
+def hash_file(file_path):
+    sha256_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(__hash_block_size__), b""):
+            sha256_hash.update(block)
+    return sha256_hash.hexdigest()
+
+
+def _lookup_digest(db, file_path, st):
+    row = db.execute('SELECT sha256 FROM digests WHERE path = ? AND size = ? AND mtime_ns = ?',
+                     (file_path, st.st_size, st.st_mtime_ns)).fetchone()
+    if row is None:
+        return None
+    return row['sha256']
+
+
+def _store_digest(db, file_path, st, sha256):
+    db.execute('INSERT OR REPLACE INTO digests (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)',
+               (file_path, st.st_size, st.st_mtime_ns, sha256))
+
+
+def read_sig(sig_file_path):
+    try:
+        with open(sig_file_path, 'r') as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+
+def read_dcp_meta(meta_file_path):
+    """Returns (pl_id, cert) of the meta of a static DCP (or Nones)."""
+    sig = read_sig(meta_file_path)
+    if sig is None:
+        return None, None
+    # for Mantles
+    pl_id = sig.get('pl_id', sig.get('id'))
+    return (str(pl_id) if pl_id is not None else None), sig.get('cert')
+
+
+def get_artifact(db, dcps_folder, file_name):
+    file_path = os.path.join(dcps_folder, file_name)
+    st = os.stat(file_path)
+    sig = None
+    sig_is_current = False
+    if file_name.endswith(__bitstream_endings__):
+        for sig_file_path in [file_path + __sig_file_ending__, os.path.splitext(file_path)[0] + __sig_file_ending__]:
+            sig = read_sig(sig_file_path)
+            if sig is not None:
+                sig_is_current = os.path.getmtime(sig_file_path) >= st.st_mtime
+                break
+    sha256 = _lookup_digest(db, file_path, st)
+    if sha256 is None and sig_is_current and sig.get('file') == file_name and len(str(sig.get('hash', ''))) == 64:
+        # the signature (written after the bitstream) already contains its hash
+        sha256 = sig['hash']
+    if sha256 is None:
+        sha256 = hash_file(file_path)
+    _store_digest(db, file_path, st, sha256)
+    artifact = {'file_name': file_name, 'size': st.st_size, 'sha256': sha256, 'sig': None, 'pl_id': None,
+                'verify': None}
+    if sig is not None:
+        artifact['sig'] = sig.get('sig')
+        artifact['pl_id'] = str(sig['pl_id']) if sig.get('pl_id') is not None else None
+        artifact['verify'] = sig.get('verify')
+    return artifact
+
+
+def record_build(cfp_root, build_id, build_time, role, flow, mod, sra, make_target, rc, duration_s, phases=None,
+                 file_names=None):
+    """Adds a build and its artifacts (file names in dcps/) to the ledger; returns 0 or -1 (with a warning)."""
+    dcps_folder = os.path.abspath(cfp_root + __dcps_folder_name__)
+    pl_id, dcp_cert = None, None
+    if flow == 'pr':
+        pl_id, dcp_cert = read_dcp_meta(os.path.join(dcps_folder, '3_top{}_STATIC.json'.format(mod)))
+    try:
+        db = connect(cfp_root)
+        try:
+            artifacts = [get_artifact(db, dcps_folder, f) for f in sorted(file_names or [])
+                         if os.path.isfile(os.path.join(dcps_folder, f))]
+            with db:
+                cur = db.execute('INSERT INTO builds (build_id, time, role, flow, mod, sra, make_target, '
+                                 'rc, duration_s, phases, pl_id, dcp_cert) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                 (build_id, build_time, role, flow, mod, sra, make_target, rc, round(duration_s, 1),
+                                  json.dumps(phases) if phases is not None else None, pl_id, dcp_cert))
+                db.executemany('INSERT INTO artifacts (build, file_name, size, sha256, sig, pl_id, verify) '
+                               'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               [(cur.lastrowid, a['file_name'], a['size'], a['sha256'], a['sig'], a['pl_id'],
+                                 a['verify']) for a in artifacts])
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError) as e:
+        print("[sra:WARNING] Failed to record build {} in the ledger {}: {}".format(build_id,
+                                                                                   get_ledger_file(cfp_root), e))
+        return -1
+    return 0
+
+
+def record_signatures(cfp_root, build_id, file_names):
+    """Adds the signatures (.sig files in dcps/, written by create_sig.sh or admin_sig.sh) of a build to the ledger."""
+    dcps_folder = os.path.abspath(cfp_root + __dcps_folder_name__)
+    sig_files = [f for f in sorted(file_names or []) if f.endswith(__sig_file_ending__)]
+    if len(sig_files) == 0:
+        return 0
+    try:
+        db = connect(cfp_root)
+        try:
+            row = db.execute('SELECT id FROM builds WHERE build_id = ?', (build_id,)).fetchone()
+            signatures = []
+            for f in sig_files:
+                sig_file_path = os.path.join(dcps_folder, f)
+                sig = read_sig(sig_file_path)
+                if sig is None:
+                    continue
+                pl_id = sig.get('pl_id')
+                signatures.append((row['id'] if row is not None else None, os.path.getmtime(sig_file_path), f,
+                                   sig.get('file'), sig.get('algorithm'), sig.get('build_id'),
+                                   str(pl_id) if pl_id is not None else None, sig.get('sig'), sig.get('hash'),
+                                   sig.get('verify')))
+            with db:
+                db.executemany('INSERT INTO signatures (build, time, sig_file, file_name, algorithm, signer, pl_id, '
+                               'sig, sha256, verify) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', signatures)
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError) as e:
+        print("[sra:WARNING] Failed to record the signatures of build {} in the ledger {}: {}"
+              .format(build_id, get_ledger_file(cfp_root), e))
+        return -1
+    return 0
+
+
+def record_dcp(cfp_root, mod, sra, meta, dcp_file_path, sha256):
+    """Adds a downloaded static DCP to the ledger (the digest is known from the download)."""
+    pl_id = meta.get('pl_id', meta.get('id'))
+    try:
+        db = connect(cfp_root)
+        try:
+            st = os.stat(dcp_file_path)
+            with db:
+                db.execute('INSERT INTO dcps (time, mod, sra, pl_id, cert, sha256, size) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                           (time.time(), mod, sra, str(pl_id) if pl_id is not None else None, meta.get('cert'),
+                            sha256, st.st_size))
+                _store_digest(db, os.path.abspath(dcp_file_path), st, sha256)
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError) as e:
+        print("[cFBuild] WARNING: Failed to record the DCP in the ledger {}: {}".format(get_ledger_file(cfp_root), e))
+        return -1
+    return 0
+
+
+def query_builds(db, role=None, pl_id=None, sha256_prefix=None, limit=20):
+    conditions = []
+    params = []
+    if role is not None:
+        conditions.append('b.role = ?')
+        params.append(role)
+    if pl_id is not None:
+        conditions.append('(b.pl_id = ? OR b.id IN (SELECT build FROM artifacts WHERE pl_id = ?) '
+                          'OR b.id IN (SELECT build FROM signatures WHERE pl_id = ?))')
+        params.extend([pl_id, pl_id, pl_id])
+    if sha256_prefix is not None:
+        # a range instead of LIKE, so that the index is used
+        conditions.append('b.id IN (SELECT build FROM artifacts WHERE sha256 >= ? AND sha256 < ?)')
+        params.extend([sha256_prefix, sha256_prefix + 'g'])
+    sql = 'SELECT b.* FROM builds b'
+    if len(conditions) > 0:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY b.time DESC, b.id DESC LIMIT ?'
+    params.append(limit)
+    return db.execute(sql, params).fetchall()
+
+
+def print_history(cfp_root, role=None, pl_id=None, sha256_prefix=None, limit=20):
+    if not os.path.isfile(get_ledger_file(cfp_root)):
+        print("[sra:INFO] No builds recorded yet (in {}).".format(get_ledger_file(cfp_root)))
+        return 0
+    if sha256_prefix is not None:
+        sha256_prefix = sha256_prefix.lower()
+    try:
+        db = connect(cfp_root)
+    except sqlite3.Error as e:
+        print("[sra:ERROR] Failed to open the ledger {}: {}".format(get_ledger_file(cfp_root), e))
+        return -1
+    try:
+        if pl_id is not None:
+            for d in db.execute('SELECT * FROM dcps WHERE pl_id = ? ORDER BY time', (pl_id,)):
+                print("[sra:INFO] Static DCP {} ({} {}) downloaded at {}, sha256 {}."
+                      .format(d['pl_id'], d['sra'], d['mod'],
+                              time.strftime('%Y-%m-%d %H:%M', time.localtime(d['time'])), d['sha256']))
+        builds = query_builds(db, role, pl_id, sha256_prefix, limit)
+        if len(builds) == 0:
+            print("[sra:INFO] No matching builds in the ledger.")
+            return 0
+        print("[sra:INFO] Builds (newest first):")
+        print("\t{:<20}{:<18}{:<20}{:<12}{:<22}{:>4}{:>8}  {}".format('build', 'time', 'role', 'flow', 'shell/MOD',
+                                                                     'rc', 'min', 'DCP id'))
+        for b in builds:
+            print("\t{:<20}{:<18}{:<20}{:<12}{:<22}{:>4}{:>8.1f}  {}"
+                  .format(b['build_id'], time.strftime('%Y-%m-%d %H:%M', time.localtime(b['time'])), b['role'],
+                          b['flow'], '{}/{}'.format(b['sra'], b['mod']), b['rc'], (b['duration_s'] or 0) / 60.0,
+                          b['pl_id'] or '-'))
+            for a in db.execute('SELECT * FROM artifacts WHERE build = ? ORDER BY file_name', (b['id'],)):
+                if not a['file_name'].endswith(__bitstream_endings__) and \
+                        (sha256_prefix is None or not a['sha256'].startswith(sha256_prefix)):
+                    continue
+                sig_info = 'unsigned'
+                if a['sig'] is not None:
+                    sig_info = 'signed for DCP {} (verify {})'.format(a['pl_id'], a['verify'])
+                print("\t    {:<50} sha256 {}  {}".format(a['file_name'], a['sha256'][:16], sig_info))
+            for g in db.execute('SELECT * FROM signatures WHERE build = ? ORDER BY time', (b['id'],)):
+                print("\t    {:<50} signed {} ({}) for DCP {}, verify {}"
+                      .format(g['sig_file'], time.strftime('%Y-%m-%d %H:%M', time.localtime(g['time'])),
+                              g['algorithm'], g['pl_id'], g['verify'] or '-'))
+    except sqlite3.Error as e:
+        print("[sra:ERROR] Failed to query the ledger {}: {}".format(get_ledger_file(cfp_root), e))
+        return -1
+    finally:
+        db.close()
+    return 0
@@ -0,0 +1,247 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Builds one Role for several Shell/MOD combinations in parallel, using throwaway workspaces.
+#  *
+
+import glob
+import json
+import os
+import re
+import shlex
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cf_exec
+
+__sra_state_folder_name__ = '/.sra/'
+__matrix_folder_name__ = 'matrix'
+__dcps_folder_name__ = '/dcps/'
+__report_file_name__ = 'report.json'
+__build_log_name__ = 'matrix_build.log'
+__cfp_json_name__ = 'cFp.json'
+__cfenv_small_name__ = 'cfenv-small'
+__credentials_file_name__ = 'user.json'
+# files of env/ that resolve the cFp via their own (real) path, hence they must be copied and not linked
+__env_copy_types__ = ('.py', '.sh', '.template')
+__env_skip_files__ = ['this_machine_env.sh', __cfenv_small_name__]
+# generated by the flow (as in sra_watch and sra_queue), hence they are never shared with the cFp
+__skip_dirs__ = ['.git', '.trash', '.Xil', '__pycache__', 'ip', 'build', 'xpr', 'dcps', 'hd_visual']
+__skip_dir_suffixes__ = ('_prj',)
+# only sources are linked, all other files may be (re-)written by the flow and are copied
+__link_types__ = ('.vhd', '.vhdl', '.v', '.sv', '.vh', '.svh', '.c', '.cc', '.cpp', '.h', '.hh', '.hpp', '.tcl',
+                  '.xdc', '.coe', '.mem')
+# variables of the calling environment that would leak the settings of the original cFp into the workspace
+__machine_env_vars__ = ['cFpRootDir', 'cFpIpDir', 'cFpMOD', 'usedRoleDir', 'usedRole2Dir', 'cFpSRAtype', 'cFpXprDir',
+                        'cFpDcpDir', 'roleName1', 'roleName2', 'cFenv_path', 'cFsysPy3_cmd', 'VIRTUAL_ENV']
+__export_regex__ = re.compile(r'^\s*export\s+([A-Za-z_][A-Za-z0-9_]*)=')
+__wns_header_regex__ = re.compile(r'^\s*WNS\(ns\)\s+TNS\(ns\)')
+
+
+def link_tree(src, dst):
+    """Mirrors the directory structure of src in dst, links the source files and copies all others.
+
+    Generated directories are skipped, so build outputs are created as real files in dst, while the sources stay
+    shared (read-only) with the cFp.
+    """
+    src = os.path.abspath(src)
+    for cur_dir, dirs, files in os.walk(src):
+        dirs[:] = [d for d in dirs if d not in __skip_dirs__ and not d.endswith(__skip_dir_suffixes__)]
+        rel_dir = os.path.relpath(cur_dir, src)
+        dst_dir = os.path.normpath(os.path.join(dst, rel_dir))
+        os.makedirs(dst_dir, exist_ok=True)
+        for f in files:
+            dst_file = os.path.join(dst_dir, f)
+            if os.path.lexists(dst_file):
+                continue
+            if f.endswith(__link_types__):
+                os.symlink(os.path.join(cur_dir, f), dst_file)
+            else:
+                shutil.copy2(os.path.join(cur_dir, f), dst_file)
+
+
+def get_matrix_folder(cfp_root):
+    return os.path.abspath(cfp_root + __sra_state_folder_name__ + __matrix_folder_name__)
+
+
+def get_combination_name(sra_type, mod):
+    return '{}_{}'.format(sra_type, mod)
+
+
+def create_workspace(cfp_root, ws_dir, cfp_data, sra_type, mod, role_path):
+    cfp_root = os.path.abspath(cfp_root)
+    if os.path.isdir(ws_dir):
+        shutil.rmtree(ws_dir)
+    os.makedirs(ws_dir)
+    link_tree(cfp_root + '/cFDK', ws_dir + '/cFDK')
+    link_tree(role_path, ws_dir + '/ROLE/' + os.path.relpath(role_path, cfp_root + '/ROLE/'))
+    for addon in cfp_data.get('cFa', []):
+        if os.path.isdir(cfp_root + '/' + addon):
+            link_tree(cfp_root + '/' + addon, ws_dir + '/' + addon)
+    # TOP: the tcl flow and top.vhdl come from the cFDK for the given shell (as done by cFCreate update)
+    for sub_dir in ['hdl', 'xdc']:
+        if os.path.isdir(cfp_root + '/TOP/' + sub_dir):
+            link_tree(cfp_root + '/TOP/' + sub_dir, ws_dir + '/TOP/' + sub_dir)
+    link_tree(cfp_root + '/cFDK/SRA/LIB/TOP/tcl', ws_dir + '/TOP/tcl')
+    top_vhdl = ws_dir + '/TOP/hdl/top.vhdl'
+    if os.path.lexists(top_vhdl):
+        os.remove(top_vhdl)
+    shutil.copy(cfp_root + '/cFDK/SRA/LIB/TOP/{}/top.vhdl'.format(sra_type), top_vhdl)
+    shutil.copy(cfp_root + '/Makefile', ws_dir + '/Makefile')
+    # env: copy the scripts, share the virtualenv
+    os.makedirs(ws_dir + '/env')
+    for f in os.listdir(cfp_root + '/env'):
+        if f in __env_skip_files__ or not f.endswith(__env_copy_types__):
+            continue
+        shutil.copy(cfp_root + '/env/' + f, ws_dir + '/env/' + f)
+    if os.path.isdir(cfp_root + '/env/' + __cfenv_small_name__):
+        os.symlink(cfp_root + '/env/' + __cfenv_small_name__, ws_dir + '/env/' + __cfenv_small_name__)
+    if os.path.isfile(cfp_root + '/' + __credentials_file_name__):
+        os.symlink(cfp_root + '/' + __credentials_file_name__, ws_dir + '/' + __credentials_file_name__)
+    ws_data = dict(cfp_data)
+    ws_data['cFpSRAtype'] = sra_type
+    ws_data['cFpMOD'] = mod
+    with open(ws_dir + '/' + __cfp_json_name__, 'w') as json_file:
+        json.dump(ws_data, json_file, indent=4)
+
+
+def get_clean_env(cfp_data):
+    env = dict(os.environ)
+    leaking_vars = list(__machine_env_vars__)
+    for line in cfp_data.get('additional_lines', []):
+        m = __export_regex__.match(str(line))
+        if m is not None:
+            leaking_vars.append(m.group(1))
+    for k in leaking_vars:
+        env.pop(k, None)
+    return env
+
+
+def parse_timing(ws_dir):
+    # returns (WNS, TNS) of the last written timing summary report, or None
+    reports = []
+    for pattern in ['/dcps/*timing*.rpt', '/xpr/**/*timing_summary*.rpt', '/TOP/tcl/*timing*.rpt']:
+        reports.extend(glob.glob(ws_dir + pattern, recursive=True))
+    for rpt in sorted(reports, key=os.path.getmtime, reverse=True):
+        with open(rpt, 'r', errors='replace') as rpt_file:
+            lines = rpt_file.readlines()
+        for i, line in enumerate(lines):
+            if __wns_header_regex__.match(line) and i + 2 < len(lines):
+                values = lines[i + 2].split()
+                try:
+                    return float(values[0]), float(values[1])
+                except (ValueError, IndexError):
+                    break
+    return None
+
+
+def build_combination(cfp_root, cfp_data, sra_type, mod, role_name, role_path, make_cmd, make_jobs, print_lock,
+                      executor):
+    name = get_combination_name(sra_type, mod)
+    ws_dir = get_matrix_folder(cfp_root) + '/' + name
+    result = {'shell': sra_type, 'mod': mod, 'role': role_name, 'make_target': make_cmd, 'rc': -1,
+              'duration_s': 0.0, 'workspace': ws_dir, 'bitstreams': [], 'wns_ns': None, 'tns_ns': None}
+    if executor.is_cancelled:
+        result['rc'] = cf_exec.__rc_cancelled__
+        return result
+    start = time.time()
+    try:
+        create_workspace(cfp_root, ws_dir, cfp_data, sra_type, mod, role_path)
+    except (IOError, OSError) as e:
+        with print_lock:
+            print("[sra:ERROR] [{}] Failed to create the workspace: {}".format(name, e))
+        return result
+    ws_role_path = os.path.abspath(ws_dir + '/ROLE/' + os.path.relpath(role_path, os.path.abspath(cfp_root + '/ROLE/')))
+    make_args = 'make'
+    if make_jobs > 1:
+        make_args += ' -j{}'.format(make_jobs)
+    if make_cmd == 'pr2_only':
+        role_exports = 'export roleName1=to-be-defined usedRoleDir=to-be-defined roleName2={} usedRole2Dir={}; ' \
+                       '$cFenv_path/bin/python3 ./env/get_latest_dcp.py && '.format(shlex.quote(role_name),
+                                                                                  shlex.quote(ws_role_path))
+    else:
+        role_exports = 'export roleName1={} usedRoleDir={}; '.format(shlex.quote(role_name), shlex.quote(ws_role_path))
+    log_file = ws_dir + '/' + __build_log_name__
+    cmd = 'exec < /dev/null > {} 2>&1; source ./env/setenv.sh && export cFpSraToolsUserFlowActive=true; {}{} {}'\
+        .format(shlex.quote(log_file), role_exports, make_args, shlex.quote(make_cmd))
+    with print_lock:
+        print("[sra:INFO] [{}] Build started (log: {}).".format(name, log_file))
+    step = cf_exec.Step(name, ['/bin/bash', '-c', cmd], cwd=ws_dir, base_env=get_clean_env(cfp_data), quiet=True)
+    rc = executor.run_step(step).rc
+    result['rc'] = rc
+    result['duration_s'] = round(time.time() - start, 1)
+    # gather outputs
+    out_dir = os.path.abspath(cfp_root + __dcps_folder_name__ + __matrix_folder_name__ + '/' + name)
+    os.makedirs(out_dir, exist_ok=True)
+    if os.path.isfile(log_file):
+        shutil.copy(log_file, out_dir)
+    for bit_file in glob.glob(ws_dir + '/dcps/*.bit') + glob.glob(ws_dir + '/dcps/*.bit.sig'):
+        shutil.copy(bit_file, out_dir)
+        if bit_file.endswith('.bit'):
+            result['bitstreams'].append(out_dir + '/' + os.path.basename(bit_file))
+    timing = parse_timing(ws_dir)
+    if timing is not None:
+        result['wns_ns'], result['tns_ns'] = timing
+    with print_lock:
+        print("[sra:INFO] [{}] Build finished with return code {} after {:.0f}s.".format(name, rc,
+                                                                                      result['duration_s']))
+    return result
+
+
+def run_matrix(cfp_root, cfp_data, combinations, role_name, role_path, make_cmd, parallel=1, make_jobs=1,
+               keep_workspaces=False):
+    print_lock = threading.Lock()
+    # a shared executor, so that an interrupt stops the builds of all combinations
+    build_executor = cf_exec.Executor()
+    with ThreadPoolExecutor(max_workers=max(parallel, 1)) as executor:
+        futures = [executor.submit(build_combination, cfp_root, cfp_data, sra_type, mod, role_name, role_path,
+                                   make_cmd, make_jobs, print_lock, build_executor) for sra_type, mod in combinations]
+        try:
+            results = [f.result() for f in futures]
+        except KeyboardInterrupt:
+            with print_lock:
+                print("[sra:WARNING] Interrupted, stopping all builds...")
+            build_executor.cancel()
+            results = [f.result() for f in futures]
+    if not keep_workspaces:
+        for r in results:
+            shutil.rmtree(r['workspace'], ignore_errors=True)
+            r['workspace'] = None
+    report_file = os.path.abspath(cfp_root + __dcps_folder_name__ + __matrix_folder_name__ + '/' +
+                                  __report_file_name__)
+    with open(report_file, 'w') as json_file:
+        json.dump(results, json_file, indent=4)
+    return results, report_file
+
+
+def print_report(results, report_file):
+    print("[sra:INFO] Matrix build report (also written to {}):".format(report_file))
+    print("\t{:<30}{:<10}{:>5}{:>10}{:>10}{:>12}".format('shell', 'MOD', 'rc', 'time[s]', 'WNS[ns]', 'bitstreams'))
+    for r in results:
+        wns = 'n/a'
+        if r['wns_ns'] is not None:
+            wns = '{:.3f}'.format(r['wns_ns'])
+        print("\t{:<30}{:<10}{:>5}{:>10.0f}{:>10}{:>12}".format(r['shell'], r['mod'], r['rc'], r['duration_s'], wns,
+                                                               len(r['bitstreams'])))
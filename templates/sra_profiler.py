@@ -0,0 +1,226 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Samples memory, CPU and I/O of the process tree spawned by a build (via /proc).
+#  *
+
+import os
+import threading
+import time
+
+__proc_dir__ = '/proc'
+__default_interval__ = 2.0
+__csv_header__ = 't_s,phase,procs,rss_kb,cpu_pct,read_bytes,write_bytes'
+# sub-directories of the cFp, used to attribute a process to a build phase (first match wins)
+__phase_dirs__ = [('cFDK/SRA/LIB/SHELL/', 'shell'), ('cFDK/SRA/LIB/MIDLW/', 'middleware'),
+                  ('ROLE/', 'role'), ('TOP/', 'top')]
+__other_phase__ = 'other'
+
+try:
+    __clk_tck__ = os.sysconf('SC_CLK_TCK')
+    __page_kb__ = os.sysconf('SC_PAGE_SIZE') // 1024
+except (ValueError, OSError, AttributeError):
+    __clk_tck__ = 100
+    __page_kb__ = 4
+
+
+def read_proc_stat(pid):
+    # returns (ppid, cpu ticks, rss in kB) or None, if the process is gone
+    try:
+        with open('{}/{}/stat'.format(__proc_dir__, pid), 'r') as stat_file:
+            stat = stat_file.read()
+    except (IOError, OSError):
+        return None
+    # the command name may contain spaces, so split after the closing bracket
+    fields = stat[stat.rfind(')') + 2:].split()
+    return int(fields[1]), int(fields[11]) + int(fields[12]), int(fields[21]) * __page_kb__
+
+
+def read_proc_io(pid):
+    read_bytes = 0
+    write_bytes = 0
+    try:
+        with open('{}/{}/io'.format(__proc_dir__, pid), 'r') as io_file:
+            for line in io_file:
+                if line.startswith('read_bytes:'):
+                    read_bytes = int(line.split()[1])
+                elif line.startswith('write_bytes:'):
+                    write_bytes = int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return read_bytes, write_bytes
+
+
+def get_children(pid):
+    # cheap path: needs CONFIG_PROC_CHILDREN, which is available on all common kernels
+    children = []
+    try:
+        for tid in os.listdir('{}/{}/task'.format(__proc_dir__, pid)):
+            with open('{}/{}/task/{}/children'.format(__proc_dir__, pid, tid), 'r') as children_file:
+                children.extend(int(c) for c in children_file.read().split())
+    except (IOError, OSError):
+        return None
+    return children
+
+
+def get_process_tree(root_pid):
+    if get_children(root_pid) is not None:
+        tree = []
+        todo = [root_pid]
+        while len(todo) > 0:
+            pid = todo.pop()
+            tree.append(pid)
+            children = get_children(pid)
+            if children is not None:  # otherwise, the process is already gone
+                todo.extend(children)
+        return tree
+    # fallback: scan all processes and build the parent map
+    parent_map = {}
+    for entry in os.listdir(__proc_dir__):
+        if not entry.isdigit():
+            continue
+        stat = read_proc_stat(entry)
+        if stat is not None:
+            parent_map.setdefault(stat[0], []).append(int(entry))
+    tree = []
+    todo = [root_pid]
+    while len(todo) > 0:
+        pid = todo.pop()
+        tree.append(pid)
+        todo.extend(parent_map.get(pid, []))
+    return tree
+
+
+class BuildProfiler(object):
+    """Samples the process tree below a given pid in a background thread.
+
+    The samples are aggregated per build phase, which is derived from the working directory of each process.
+    """
+
+    def __init__(self, cfp_root, csv_path, interval=__default_interval__):
+        self.cfp_root = os.path.abspath(cfp_root) + '/'
+        self.csv_path = csv_path
+        self.interval = max(float(interval), 0.1)
+        self.peaks = {}
+        self._root_pid = None
+        self._last_ticks = {}
+        self._last_io = {}
+        self._last_time = None
+        self._start_time = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._csv_file = None
+
+    def get_phase(self, pid):
+        try:
+            cwd = os.readlink('{}/{}/cwd'.format(__proc_dir__, pid)) + '/'
+        except (IOError, OSError):
+            return __other_phase__
+        if not cwd.startswith(self.cfp_root):
+            return __other_phase__
+        rel_cwd = cwd[len(self.cfp_root):]
+        for prefix, phase in __phase_dirs__:
+            if rel_cwd.startswith(prefix):
+                return phase
+        return __other_phase__
+
+    def attach(self, root_pid):
+        self._root_pid = root_pid
+        self._start_time = time.time()
+        self._last_time = self._start_time
+        os.makedirs(os.path.dirname(self.csv_path), exist_ok=True)
+        self._csv_file = open(self.csv_path, 'w')
+        self._csv_file.write(__csv_header__ + '\n')
+        self._thread = threading.Thread(target=self._run, name='sra-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return self.peaks
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._csv_file.close()
+        return self.peaks
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        now = time.time()
+        elapsed = max(now - self._last_time, 1e-3)
+        phases = {}
+        cur_ticks = {}
+        cur_io = {}
+        for pid in get_process_tree(self._root_pid):
+            stat = read_proc_stat(pid)
+            if stat is None:
+                continue
+            _, ticks, rss_kb = stat
+            io = read_proc_io(pid)
+            cur_ticks[pid] = ticks
+            cur_io[pid] = io
+            last_io = self._last_io.get(pid, (0, 0))
+            agg = phases.setdefault(self.get_phase(pid), [0, 0, 0.0, 0, 0])
+            agg[0] += 1
+            agg[1] += rss_kb
+            agg[2] += (ticks - self._last_ticks.get(pid, 0)) * 100.0 / __clk_tck__ / elapsed
+            agg[3] += max(io[0] - last_io[0], 0)
+            agg[4] += max(io[1] - last_io[1], 0)
+        self._last_ticks = cur_ticks
+        self._last_io = cur_io
+        self._last_time = now
+        t_s = now - self._start_time
+        lines = []
+        for phase, agg in phases.items():
+            lines.append('{:.1f},{},{},{},{:.1f},{},{}\n'.format(t_s, phase, agg[0], agg[1], agg[2], agg[3], agg[4]))
+            peak = self.peaks.setdefault(phase, {'first_s': t_s, 'last_s': t_s, 'peak_rss_kb': 0,
+                                                 'peak_cpu_pct': 0.0, 'read_bytes': 0, 'write_bytes': 0})
+            peak['last_s'] = t_s
+            peak['peak_rss_kb'] = max(peak['peak_rss_kb'], agg[1])
+            peak['peak_cpu_pct'] = max(peak['peak_cpu_pct'], agg[2])
+            peak['read_bytes'] += agg[3]
+            peak['write_bytes'] += agg[4]
+        self._csv_file.write(''.join(lines))
+        self._csv_file.flush()
+
+    def get_phase_durations(self):
+        durations = {}
+        for phase, peak in self.peaks.items():
+            durations[phase] = round(peak['last_s'] - peak['first_s'] + self.interval, 1)
+        return durations
+
+    def print_summary(self):
+        print("[sra:INFO] Resource profile written to {}".format(self.csv_path))
+        if len(self.peaks) == 0:
+            print("\tno samples recorded")
+            return
+        print("\t{:<12}{:>10}{:>14}{:>10}{:>12}{:>12}".format('phase', 'time[s]', 'peak RSS[MB]', 'peak CPU%',
+                                                            'read[MB]', 'write[MB]'))
+        durations = self.get_phase_durations()
+        for phase in sorted(self.peaks, key=lambda p: self.peaks[p]['first_s']):
+            peak = self.peaks[phase]
+            print("\t{:<12}{:>10.1f}{:>14.1f}{:>10.1f}{:>12.1f}{:>12.1f}".format(
+                phase, durations[phase], peak['peak_rss_kb'] / 1024.0, peak['peak_cpu_pct'],
+                peak['read_bytes'] / 1048576.0, peak['write_bytes'] / 1048576.0))
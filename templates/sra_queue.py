@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Host-wide build queue of sra: a daemon (listening on a Unix socket) runs the submitted builds of all cFps,
+#  *       independent of the terminal that submitted them. Identical jobs are coalesced, jobs with a higher priority
+#  *       run first, at most one job per cFp and max-jobs jobs in total run at the same time.
+#  *
+#  *     Synopsis:
+#  *       sra_queue.py daemon    (started by submit(), if no daemon is running)
+#  *
+
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+import cf_exec
+
+__queue_dir_env_key__ = 'cFpQueueDir'
+__queue_dir_default__ = '~/.cache/cloudFPGA/sra-queue'
+__max_jobs_env_key__ = 'cFpQueueMaxJobs'
+__max_jobs_default__ = 2
+__socket_name__ = 'queue.sock'
+__lock_name__ = 'daemon.lock'
+__state_name__ = 'jobs.json'
+__logs_folder_name__ = 'logs'
+__daemon_log_name__ = 'daemon.log'
+__daemon_start_timeout_s__ = 10.0
+__attach_poll_interval_s__ = 0.5
+__max_finished_jobs__ = 200
+# sources of the Role and the TOP that go into the fingerprint of a job
+__fingerprint_skip_dirs__ = ['.git', '.Xil', '__pycache__', 'ip', 'build', 'xpr', 'dcps', 'hd_visual']
+__fingerprint_skip_dir_suffixes__ = ('_prj',)
+
+__state_queued__ = 'queued'
+__state_running__ = 'running'
+__state_done__ = 'done'
+__state_failed__ = 'failed'
+__state_cancelled__ = 'cancelled'
+__state_lost__ = 'lost'
+__active_states__ = [__state_queued__, __state_running__]
+
+
+def get_queue_dir():
+    return os.path.abspath(os.path.expanduser(os.environ.get(__queue_dir_env_key__, __queue_dir_default__)))
+
+
+def get_socket_path():
+    return os.path.join(get_queue_dir(), __socket_name__)
+
+
+def get_log_file(job_id):
+    return os.path.join(get_queue_dir(), __logs_folder_name__, job_id + '.log')
+
+
+def get_fingerprint(cfp_root, role_dir, args):
+    """Hash over the cFp, the build arguments and the path, size and mtime of all files of the Role and TOP/."""
+    fp_hash = hashlib.sha256()
+    fp_hash.update(json.dumps([os.path.abspath(cfp_root), args]).encode('utf-8'))
+    for top in [role_dir, os.path.join(cfp_root, 'TOP')]:
+        for root, dirs, files in os.walk(top):
+            dirs[:] = sorted([d for d in dirs if d not in __fingerprint_skip_dirs__ and
+                              not d.endswith(__fingerprint_skip_dir_suffixes__)])
+            for name in sorted(files):
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                fp_hash.update('{} {} {}\n'.format(os.path.join(root, name), st.st_size, st.st_mtime)
+                               .encode('utf-8'))
+    return fp_hash.hexdigest()
+
+
+# --- daemon ---
+
+class Daemon(object):
+
+    def __init__(self, max_jobs):
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self.executors = {}
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.next_id = 1
+        self._load_state()
+
+    def _load_state(self):
+        state_file = os.path.join(get_queue_dir(), __state_name__)
+        if not os.path.isfile(state_file):
+            return
+        try:
+            with open(state_file, 'r') as json_file:
+                state = json.load(json_file)
+        except ValueError:
+            return
+        self.next_id = state.get('next_id', 1)
+        for job in state.get('jobs', []):
+            # the queued jobs survive a restart of the daemon, the running ones were killed with it
+            if job['state'] == __state_running__:
+                job['state'] = __state_lost__
+            self.jobs[job['id']] = job
+
+    def _save_state(self):
+        # must be called with the lock held
+        finished = sorted([j for j in self.jobs.values() if j['state'] not in __active_states__],
+                          key=lambda j: j['submitted'])
+        for job in finished[:-__max_finished_jobs__]:
+            del self.jobs[job['id']]
+        state_file = os.path.join(get_queue_dir(), __state_name__)
+        public_jobs = [{k: v for k, v in j.items() if k != 'env'} if j['state'] not in __active_states__ else j
+                       for j in self.jobs.values()]
+        # (the queued jobs contain the environment of their submitter)
+        with os.fdopen(os.open(state_file + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as json_file:
+            json.dump({'next_id': self.next_id, 'jobs': public_jobs}, json_file)
+        os.replace(state_file + '.tmp', state_file)
+
+    def submit(self, request):
+        with self.lock:
+            for job in self.jobs.values():
+                if job['state'] in __active_states__ and job['fingerprint'] == request['fingerprint']:
+                    # identical inputs, the result of the existing job is the same
+                    job['priority'] = max(job['priority'], request['priority'])
+                    job['submissions'] += 1
+                    self._save_state()
+                    self.changed.notify_all()
+                    return {'id': job['id'], 'coalesced': True}
+            job_id = str(self.next_id)
+            self.next_id += 1
+            self.jobs[job_id] = {'id': job_id, 'cfp_root': request['cfp_root'], 'role': request['role'],
+                                 'flow': request['flow'], 'args': request['args'], 'python': request['python'],
+                                 'sratool': request['sratool'], 'env': request['env'],
+                                 'fingerprint': request['fingerprint'], 'priority': request['priority'],
+                                 'state': __state_queued__, 'submitted': time.time(), 'started': None,
+                                 'ended': None, 'rc': None, 'submissions': 1}
+            self._save_state()
+            self.changed.notify_all()
+            return {'id': job_id, 'coalesced': False}
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['state'] not in __active_states__:
+                return {'error': 'no active job {}'.format(job_id)}
+            if job['state'] == __state_queued__:
+                job['state'] = __state_cancelled__
+                job['ended'] = time.time()
+                self._save_state()
+                self.changed.notify_all()
+                return {'id': job_id}
+            executor = self.executors.get(job_id)
+        if executor is not None:
+            # the job thread sets the final state
+            executor.cancel()
+        return {'id': job_id}
+
+    def list_jobs(self):
+        with self.lock:
+            return {'jobs': [{k: v for k, v in j.items() if k != 'env'} for j in
+                             sorted(self.jobs.values(), key=lambda j: j['submitted'])]}
+
+    def get_job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return {'error': 'no job {}'.format(job_id)}
+            return {'job': {k: v for k, v in job.items() if k != 'env'}}
+
+    def _next_job(self):
+        # must be called with the lock held: the queued job with the highest priority (the oldest one first) whose
+        # cFp has no running job (the builds of a cFp share xpr/ and dcps/)
+        running = [j for j in self.jobs.values() if j['state'] == __state_running__]
+        if len(running) >= self.max_jobs:
+            return None
+        busy_roots = set([j['cfp_root'] for j in running])
+        queued = [j for j in self.jobs.values() if j['state'] == __state_queued__ and j['cfp_root'] not in busy_roots]
+        if len(queued) == 0:
+            return None
+        return sorted(queued, key=lambda j: (-j['priority'], j['submitted']))[0]
+
+    def _run_job(self, job, executor):
+        log_file = get_log_file(job['id'])
+        with open(log_file, 'a') as out:
+            executor.out = out
+            out.write("[sra:INFO] Job {} started at {}: sra {}\n".format(job['id'], time.strftime('%Y-%m-%d %H:%M:%S'),
+                                                                      ' '.join(job['args'])))
+            out.flush()
+            result = executor.run_step(cf_exec.Step('sra build', [job['python'], job['sratool']] + job['args'],
+                                                    cwd=job['cfp_root'], base_env=job['env']))
+            out.write("[sra:INFO] Job {} finished with rc {}.\n".format(job['id'], result.rc))
+        with self.lock:
+            job['rc'] = result.rc
+            job['ended'] = time.time()
+            if result.cancelled:
+                job['state'] = __state_cancelled__
+            elif result.rc == 0:
+                job['state'] = __state_done__
+            else:
+                job['state'] = __state_failed__
+            del self.executors[job['id']]
+            self._save_state()
+            self.changed.notify_all()
+
+    def schedule_forever(self):
+        with self.lock:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    self.changed.wait()
+                    continue
+                job['state'] = __state_running__
+                job['started'] = time.time()
+                executor = cf_exec.Executor()
+                self.executors[job['id']] = executor
+                self._save_state()
+                thread = threading.Thread(target=self._run_job, args=(job, executor))
+                thread.daemon = True
+                thread.start()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    # one JSON request per connection, answered with one JSON line
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+        except ValueError:
+            return
+        daemon = self.server.sra_daemon
+        cmd = request.get('cmd')
+        if cmd == 'submit':
+            response = daemon.submit(request)
+        elif cmd == 'list':
+            response = daemon.list_jobs()
+        elif cmd == 'cancel':
+            response = daemon.cancel(request.get('id'))
+        elif cmd == 'get':
+            response = daemon.get_job(request.get('id'))
+        else:
+            response = {'error': 'unknown command {}'.format(cmd)}
+        self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+
+class QueueServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def run_daemon():
+    queue_dir = get_queue_dir()
+    os.makedirs(os.path.join(queue_dir, __logs_folder_name__), exist_ok=True)
+    lock_file = open(os.path.join(queue_dir, __lock_name__), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        # another daemon is running
+        return 0
+    try:
+        max_jobs = int(os.environ.get(__max_jobs_env_key__, __max_jobs_default__))
+    except ValueError:
+        max_jobs = __max_jobs_default__
+    socket_path = get_socket_path()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    daemon = Daemon(max(max_jobs, 1))
+    server = QueueServer(socket_path, RequestHandler)
+    os.chmod(socket_path, 0o600)
+    server.sra_daemon = daemon
+    scheduler = threading.Thread(target=daemon.schedule_forever)
+    scheduler.daemon = True
+    scheduler.start()
+    print("[sra:INFO] Queue daemon {} started at {} (max. {} jobs).".format(os.getpid(),
+                                                                          time.strftime('%Y-%m-%d %H:%M:%S'),
+                                                                          daemon.max_jobs))
+    sys.stdout.flush()
+    server.serve_forever()
+    return 0
+
+
+# --- client ---
+
+def request(msg):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(get_socket_path())
+        client.sendall((json.dumps(msg) + '\n').encode('utf-8'))
+        with client.makefile('rb') as reader:
+            return json.loads(reader.readline().decode('utf-8'))
+    finally:
+        client.close()
+
+
+def ensure_daemon():
+    try:
+        request({'cmd': 'list'})
+        return True
+    except (OSError, ValueError):
+        pass
+    queue_dir = get_queue_dir()
+    os.makedirs(queue_dir, exist_ok=True)
+    with open(os.devnull, 'r') as devnull, open(os.path.join(queue_dir, __daemon_log_name__), 'a') as log:
+        # detached, so that it survives the terminal (e.g. a closed ssh session)
+        subprocess.Popen([sys.executable, os.path.realpath(__file__), 'daemon'], stdin=devnull, stdout=log,
+                         stderr=subprocess.STDOUT, start_new_session=True, close_fds=True)
+    deadline = time.time() + __daemon_start_timeout_s__
+    while time.time() < deadline:
+        time.sleep(0.2)
+        try:
+            request({'cmd': 'list'})
+            return True
+        except (OSError, ValueError):
+            continue
+    print("[sra:ERROR] The queue daemon did not start, see {}.".format(os.path.join(queue_dir, __daemon_log_name__)))
+    return False
+
+
+def submit(cfp_root, role, role_dir, flow, args, priority, sratool):
+    if not ensure_daemon():
+        return None
+    response = request({'cmd': 'submit', 'cfp_root': os.path.abspath(cfp_root), 'role': role, 'flow': flow,
+                        'args': args, 'priority': priority, 'python': sys.executable, 'sratool': sratool,
+                        'env': dict(os.environ), 'fingerprint': get_fingerprint(cfp_root, role_dir, args)})
+    if response['coalesced']:
+        print("[sra:INFO] An identical build is already queued or running as job {}.".format(response['id']))
+    else:
+        print("[sra:INFO] Submitted the build as job {} (priority {}).".format(response['id'], priority))
+    return response['id']
+
+
+def attach(job_id):
+    """Streams the log of a job until it is finished (Ctrl-C detaches, the job continues); returns its rc."""
+    log_file = get_log_file(job_id)
+    try:
+        response = request({'cmd': 'get', 'id': job_id})
+    except (OSError, ValueError):
+        print("[sra:ERROR] The queue daemon is not running.")
+        return -1
+    if 'error' in response:
+        print("[sra:ERROR] {}.".format(response['error']))
+        return -1
+    print("[sra:INFO] Attached to job {} (press Ctrl-C to detach, the job continues).".format(job_id))
+    position = 0
+    try:
+        while True:
+            data = ''
+            if os.path.isfile(log_file):
+                with open(log_file, 'r', errors='replace') as infile:
+                    infile.seek(position)
+                    data = infile.read()
+                    position = infile.tell()
+                if data != '':
+                    sys.stdout.write(data)
+                    sys.stdout.flush()
+            job = request({'cmd': 'get', 'id': job_id})['job']
+            if job['state'] not in __active_states__ and data == '':
+                break
+            if data == '':
+                time.sleep(__attach_poll_interval_s__)
+    except KeyboardInterrupt:
+        print("\n[sra:INFO] Detached from job {}.".format(job_id))
+        return 0
+    print("[sra:INFO] Job {} is {}.".format(job_id, job['state']))
+    if job['state'] != __state_done__:
+        return -1
+    return 0
+
+
+def print_list():
+    try:
+        jobs = request({'cmd': 'list'})['jobs']
+    except (OSError, ValueError):
+        print("[sra:INFO] The queue daemon is not running.")
+        return 0
+    print("[sra:INFO] Jobs of the build queue ({}):".format(get_socket_path()))
+    if len(jobs) == 0:
+        print("\tnone")
+    for j in jobs:
+        duration = ''
+        if j['started'] is not None:
+            duration = '{:.0f}s'.format((j['ended'] or time.time()) - j['started'])
+        print("\t{:>5}  {:<10}{:>4}  {:<20}{:<12}{:>8}  {}".format(j['id'], j['state'], j['priority'], j['role'],
+                                                                j['flow'], duration, j['cfp_root']))
+    return 0
+
+
+def cancel(job_id):
+    try:
+        response = request({'cmd': 'cancel', 'id': job_id})
+    except (OSError, ValueError):
+        print("[sra:ERROR] The queue daemon is not running.")
+        return -1
+    if 'error' in response:
+        print("[sra:ERROR] {}.".format(response['error']))
+        return -1
+    print("[sra:INFO] Cancelled job {}.".format(job_id))
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] != 'daemon':
+        print('ERROR: Usage is {} daemon. STOP'.format(sys.argv[0]))
+        exit(1)
+    exit(run_daemon())
@@ -0,0 +1,258 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Index of the build artifacts in <cFp-Root>/dcps/ and their retention (keep the last N builds per Role,
+#  *       evict the least recently used builds above a byte budget).
+#  *
+
+import json
+import os
+import re
+import time
+
+import cfp_config
+
+__sra_state_folder_name__ = '/.sra/'
+__index_file_name__ = 'dcps_index.json'
+__dcps_folder_name__ = '/dcps/'
+__retention_key__ = 'retention'
+__keep_last_key__ = 'keep-last'
+__max_gb_key__ = 'max-gb'
+# 0 means unlimited, i.e. nothing is evicted unless a policy is configured
+__retention_defaults__ = {__keep_last_key__: 0, __max_gb_key__: 0}
+__unknown_role__ = 'unknown'
+# never evicted: the static checkpoint of each MOD and its meta
+__protected_regex__ = re.compile(r'^3_top.+_STATIC\.(dcp|json)$')
+__bitfile_ending__ = '.bit'
+__sig_file_ending__ = '.sig'
+
+
+def get_index_file(cfp_root):
+    return os.path.abspath(cfp_root + __sra_state_folder_name__ + __index_file_name__)
+
+
+def get_dcps_folder(cfp_root):
+    return os.path.abspath(cfp_root + __dcps_folder_name__)
+
+
+def get_policy(sra_conf):
+    policy = dict(__retention_defaults__)
+    policy.update(sra_conf.get(__retention_key__, {}))
+    return policy
+
+
+def is_protected(file_name):
+    return __protected_regex__.match(file_name) is not None
+
+
+def index_locked(cfp_root):
+    # serializes the read-modify-write of the index between sra processes (e.g. queued builds and archive restores)
+    index_file = get_index_file(cfp_root)
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    return cfp_config.locked(index_file)
+
+
+def load_index(cfp_root):
+    index_file = get_index_file(cfp_root)
+    if not os.path.isfile(index_file):
+        return {}
+    try:
+        with open(index_file, 'r') as json_file:
+            return json.load(json_file)
+    except ValueError:
+        print("[sra:WARNING] The artifact index {} is corrupted and will be rebuilt.".format(index_file))
+        return {}
+
+
+def write_index(cfp_root, index):
+    index_file = get_index_file(cfp_root)
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    with open(index_file + '.tmp', 'w') as json_file:
+        json.dump(index, json_file, indent=1)
+    os.replace(index_file + '.tmp', index_file)
+
+
+def is_signed(dcps_folder, file_name):
+    if not file_name.endswith(__bitfile_ending__):
+        return None
+    return os.path.isfile(os.path.join(dcps_folder, file_name[:-len(__bitfile_ending__)] + __sig_file_ending__))
+
+
+def get_build_id(build_start):
+    return '{}.{:03d}'.format(time.strftime('%Y%m%d-%H%M%S', time.localtime(build_start)),
+                              int(build_start * 1000) % 1000)
+
+
+def _update_index(cfp_root, role=None, flow=None, build_start=None, build_files=None):
+    # the caller holds the lock of the index
+    dcps_folder = get_dcps_folder(cfp_root)
+    old_index = load_index(cfp_root)
+    index = {}
+    if not os.path.isdir(dcps_folder):
+        write_index(cfp_root, index)
+        return index
+    build_id = None
+    if build_start is not None:
+        build_id = get_build_id(build_start)
+    for file_name in sorted(os.listdir(dcps_folder)):
+        file_path = os.path.join(dcps_folder, file_name)
+        if not os.path.isfile(file_path) or is_protected(file_name):
+            continue
+        st = os.stat(file_path)
+        entry = old_index.get(file_name)
+        # files that were registered unchanged (e.g. restored from the archive) keep their build
+        is_registered = entry is not None and entry['role'] != __unknown_role__ and entry.get('mtime') == st.st_mtime
+        is_new = build_id is not None and st.st_mtime >= build_start and not is_registered
+        if is_new or (build_id is not None and file_name in (build_files or [])):
+            entry = {'role': role, 'flow': flow, 'build': build_id, 'time': build_start, 'last_used': build_start}
+        elif entry is None:
+            entry = {'role': __unknown_role__, 'flow': None, 'build': 'mtime-' + str(int(st.st_mtime)),
+                     'time': st.st_mtime, 'last_used': st.st_mtime}
+        entry['size'] = st.st_size
+        entry['mtime'] = st.st_mtime
+        entry['signed'] = is_signed(dcps_folder, file_name)
+        index[file_name] = entry
+    write_index(cfp_root, index)
+    return index
+
+
+def update_index(cfp_root, role=None, flow=None, build_start=None, build_files=None):
+    """Adds the new files of dcps/ to the index and drops the deleted ones.
+
+    Files written since build_start, and the build_files put into dcps/ for it (e.g. copies that keep their
+    original mtime), belong to the build of role (identified by build_start). Files that were present before sra
+    kept an index are attributed to an unknown build at their mtime.
+    """
+    with index_locked(cfp_root):
+        return _update_index(cfp_root, role, flow, build_start, build_files)
+
+
+def add_build(cfp_root, file_names, role, flow, build_id, build_time):
+    # registers files that were put into dcps/ by sra itself (e.g. restored from the archive) as used now
+    with index_locked(cfp_root):
+        index = _update_index(cfp_root)
+        now = time.time()
+        for file_name in file_names:
+            if file_name not in index:
+                continue
+            index[file_name].update({'role': role, 'flow': flow, 'build': build_id, 'time': build_time,
+                                     'last_used': now})
+        write_index(cfp_root, index)
+
+
+def touch(cfp_root, file_names):
+    # marks artifacts as used (e.g. when they are restored or flashed), for the LRU eviction
+    with index_locked(cfp_root):
+        index = load_index(cfp_root)
+        now = time.time()
+        for file_name in file_names:
+            if file_name in index:
+                index[file_name]['last_used'] = now
+        write_index(cfp_root, index)
+
+
+def get_builds(index):
+    """Groups the index by build: returns a dict build id -> {role, time, last_used, size, signed, files}."""
+    builds = {}
+    for file_name, entry in index.items():
+        build = builds.setdefault(entry['build'], {'role': entry['role'], 'flow': entry['flow'], 'time': entry['time'],
+                                                   'last_used': entry['last_used'], 'size': 0, 'signed': False,
+                                                   'files': []})
+        build['size'] += entry['size']
+        build['last_used'] = max(build['last_used'], entry['last_used'])
+        build['signed'] = build['signed'] or entry['signed'] is True
+        build['files'].append(file_name)
+    return builds
+
+
+def select_evictions(builds, policy, keep=None):
+    """Returns the build ids to evict: all but the last keep-last builds of each Role, and then the least recently
+    used builds (unsigned ones first) until the remaining builds fit into max-gb. The build keep is never evicted.
+    """
+    evict = set()
+    keep_last = int(policy[__keep_last_key__])
+    if keep_last > 0:
+        by_role = {}
+        for build_id, build in builds.items():
+            # the files of unknown builds are only subject to the byte budget
+            if build['role'] != __unknown_role__:
+                by_role.setdefault(build['role'], []).append(build_id)
+        for build_ids in by_role.values():
+            build_ids.sort(key=lambda b: builds[b]['time'], reverse=True)
+            evict.update(build_ids[keep_last:])
+    max_bytes = float(policy[__max_gb_key__]) * 1024 ** 3
+    if max_bytes > 0:
+        remaining = [b for b in builds if b not in evict]
+        total = sum([builds[b]['size'] for b in remaining])
+        candidates = [b for b in remaining if b != keep]
+        for build_id in sorted(candidates, key=lambda b: (builds[b]['signed'], builds[b]['last_used'])):
+            if total <= max_bytes:
+                break
+            evict.add(build_id)
+            total -= builds[build_id]['size']
+    return evict
+
+
+def enforce(cfp_root, sra_conf, role=None, flow=None, build_start=None, build_files=None):
+    """Updates the index with the outputs of the latest build and evicts according to the retention policy."""
+    dcps_folder = get_dcps_folder(cfp_root)
+    with index_locked(cfp_root):
+        index = _update_index(cfp_root, role, flow, build_start, build_files)
+        builds = get_builds(index)
+        keep = None
+        if build_start is not None:
+            keep = get_build_id(build_start)
+        evict = select_evictions(builds, get_policy(sra_conf), keep)
+        if len(evict) == 0:
+            return 0
+        freed = 0
+        for build_id in evict:
+            for file_name in builds[build_id]['files']:
+                try:
+                    os.remove(os.path.join(dcps_folder, file_name))
+                except OSError:
+                    pass
+                del index[file_name]
+            freed += builds[build_id]['size']
+        write_index(cfp_root, index)
+    print("[sra:INFO] Evicted {} old builds ({:.1f} MB) from {} (see 'sra config retention')."
+          .format(len(evict), freed / 1024.0 ** 2, dcps_folder))
+    return len(evict)
+
+
+def print_summary(cfp_root, sra_conf):
+    policy = get_policy(sra_conf)
+    builds = get_builds(update_index(cfp_root))
+    print("[sra:INFO] Retention of {}: keep the last {} builds per role, at most {} GB (0 means unlimited)."
+          .format(get_dcps_folder(cfp_root), policy[__keep_last_key__], policy[__max_gb_key__]))
+    by_role = {}
+    for build in builds.values():
+        summary = by_role.setdefault(build['role'], [0, 0, 0])
+        summary[0] += 1
+        summary[1] += build['size']
+        summary[2] += 1 if build['signed'] else 0
+    if len(by_role) == 0:
+        print("\tno builds")
+    for role, summary in sorted(by_role.items()):
+        print("\t{:<30}{:>5} builds {:>10.1f} MB   {} signed".format(role, summary[0], summary[1] / 1024.0 ** 2,
+                                                                     summary[2]))
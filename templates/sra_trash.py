@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Background clean of a cFp: the build outputs are renamed into <cFp-Root>/.trash/<timestamp>-<suffix>/
+#  *       (atomic, so a following build never sees a half-deleted tree) and deleted by a detached, low-priority
+#  *       reaper.
+#  *
+#  *     Synopsis:
+#  *       sra_trash.py reap <trash-folder>    (started by start_reaper(), not to be called manually)
+#  *
+
+import fcntl
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+__trash_folder_name__ = '.trash'
+__reaper_lock_name__ = '.reaper.lock'
+# the outputs removed by 'make clean' (see the clean target of the Makefile)
+__clean_dirs__ = ['xpr', 'hd_visual', 'dcps']
+__clean_types__ = ['*.log', '*.jou', '*.str', '*.time']
+__reaper_workers__ = 8
+
+
+def get_trash_folder(cfp_root):
+    return os.path.join(os.path.abspath(cfp_root), __trash_folder_name__)
+
+
+def move_to_trash(cfp_root):
+    """Renames the build outputs of cfp_root into a new trash bin and returns the number of moved entries.
+
+    Entries that can not be renamed (e.g. a link to another file system) are left for 'make clean'.
+    """
+    trash_folder = get_trash_folder(cfp_root)
+    os.makedirs(trash_folder, exist_ok=True)
+    # filled under a unique hidden name, which a running reaper ignores (several cleans can run in the same second)
+    bin_folder = tempfile.mkdtemp(prefix='.{}-'.format(time.strftime('%Y%m%d-%H%M%S')), dir=trash_folder)
+    bin_name = os.path.basename(bin_folder)[1:]
+    doomed = [os.path.join(cfp_root, d) for d in __clean_dirs__]
+    for pattern in __clean_types__:
+        doomed.extend(glob.glob(os.path.join(cfp_root, pattern)))
+    moved = 0
+    for path in doomed:
+        if not os.path.lexists(path) or os.path.islink(path):
+            continue
+        try:
+            os.rename(path, os.path.join(bin_folder, os.path.basename(path)))
+            moved += 1
+        except OSError as e:
+            print("[sra:WARNING] Could not move {} to the trash ({}), it will be deleted now.".format(path, e))
+    if moved == 0:
+        os.rmdir(bin_folder)
+    else:
+        os.rename(bin_folder, os.path.join(trash_folder, bin_name))
+    return moved
+
+
+def start_reaper(cfp_root):
+    # detached from the terminal and the sra session, with the lowest CPU and I/O priority
+    args = [sys.executable, os.path.realpath(__file__), 'reap', get_trash_folder(cfp_root)]
+    if shutil.which('ionice') is not None:
+        args = ['ionice', '-c', '3'] + args
+    if shutil.which('nice') is not None:
+        args = ['nice', '-n', '19'] + args
+    with open(os.devnull, 'r+') as devnull:
+        subprocess.Popen(args, stdin=devnull, stdout=devnull, stderr=devnull, start_new_session=True,
+                         close_fds=True)
+
+
+def remove_entry(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def reap(trash_folder):
+    """Deletes all trash bins (in parallel); returns immediately if another reaper is already running."""
+    if not os.path.isdir(trash_folder):
+        return
+    with open(os.path.join(trash_folder, __reaper_lock_name__), 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        # bins that are added while reaping are deleted in the next round (bins that can not be deleted stay)
+        last_bins = None
+        while True:
+            bins = sorted([os.path.join(trash_folder, b) for b in os.listdir(trash_folder)
+                           if not b.startswith('.')])
+            if len(bins) == 0 or bins == last_bins:
+                break
+            last_bins = bins
+            entries = []
+            for b in bins:
+                if os.path.isdir(b) and not os.path.islink(b):
+                    entries.extend([os.path.join(b, e) for e in os.listdir(b)])
+            with ThreadPoolExecutor(max_workers=__reaper_workers__) as executor:
+                list(executor.map(remove_entry, entries))
+            for b in bins:
+                remove_entry(b)
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'reap':
+        print('ERROR: Usage is {} reap <trash-folder>. STOP'.format(sys.argv[0]))
+        exit(1)
+    reap(sys.argv[2])
+    exit(0)
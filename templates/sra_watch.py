@@ -0,0 +1,281 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Watch mode of sra: rebuilds a Role whenever its sources (or the ones of TOP/) change. Changes are
+#  *       detected with inotify (via ctypes) or, if that is not available, by polling.
+#  *
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+import cf_exec
+
+# files that trigger a rebuild (the build outputs in the watched directories must not)
+__source_extensions__ = ('.c', '.cc', '.cpp', '.h', '.hh', '.hpp', '.tcl', '.xdc', '.v', '.sv', '.vhd', '.vhdl',
+                         '.mk')
+__source_names__ = ['Makefile']
+__hls_extensions__ = ('.c', '.cc', '.cpp', '.h', '.hh', '.hpp')
+# (the generated folders of the gitignore template)
+__skip_dirs__ = ['.git', '.Xil', '__pycache__', 'xpr', 'dcps', 'hd_visual', 'ip', 'build']
+__skip_dir_suffixes__ = ('_prj',)
+__poll_interval__ = 1.0
+
+# stages of a rebuild, a higher one includes the lower ones
+__stage_ip__ = 1
+__stage_full__ = 2
+__stage_names__ = {__stage_ip__: 'HLS core build', __stage_full__: 'complete build'}
+
+# inotify (see <sys/inotify.h>)
+__in_modify__ = 0x00000002
+__in_close_write__ = 0x00000008
+__in_moved_from__ = 0x00000040
+__in_moved_to__ = 0x00000080
+__in_create__ = 0x00000100
+__in_delete__ = 0x00000200
+__in_q_overflow__ = 0x00004000
+__in_isdir__ = 0x40000000
+__in_watch_mask__ = __in_modify__ | __in_close_write__ | __in_moved_from__ | __in_moved_to__ | __in_create__ | \
+    __in_delete__
+__in_event_header__ = struct.Struct('iIII')
+
+
+def is_skipped_dir(name):
+    return name in __skip_dirs__ or name.endswith(__skip_dir_suffixes__) or name.startswith('.')
+
+
+def is_source_file(path):
+    name = os.path.basename(path)
+    return not name.startswith('.') and (name in __source_names__ or name.endswith(__source_extensions__))
+
+
+def walk_dirs(top):
+    for root, dirs, _ in os.walk(top):
+        dirs[:] = [d for d in dirs if not is_skipped_dir(d)]
+        yield root
+
+
+class InotifyWatcher(object):
+    """Recursive watch of directories with inotify; raises OSError if inotify is not available."""
+
+    def __init__(self, dirs):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not supported")
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wd_to_dir = {}
+        for top in dirs:
+            self._add_tree(top)
+
+    def _add_tree(self, top):
+        for cur_dir in walk_dirs(top):
+            wd = self._libc.inotify_add_watch(self._fd, cur_dir.encode('utf-8'), __in_watch_mask__)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                self.close()
+                raise OSError(errno, "inotify_add_watch failed for {} (check fs.inotify.max_user_watches)"
+                              .format(cur_dir))
+            self._wd_to_dir[wd] = cur_dir
+
+    def wait(self, timeout):
+        """Returns the changed source files (or None if the kernel dropped events) within timeout seconds."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if len(readable) == 0:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = __in_event_header__.unpack_from(data, offset)
+            offset += __in_event_header__.size
+            name = data[offset:offset + name_len].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += name_len
+            if mask & __in_q_overflow__:
+                return None
+            if wd not in self._wd_to_dir:
+                continue
+            path = os.path.join(self._wd_to_dir[wd], name)
+            if mask & __in_isdir__:
+                if mask & (__in_create__ | __in_moved_to__) and not is_skipped_dir(name) and os.path.isdir(path):
+                    self._add_tree(path)
+                    # files can be created before the watch of the new directory was added
+                    changed.extend([os.path.join(d, f) for d in walk_dirs(path) for f in os.listdir(d)
+                                    if is_source_file(f)])
+                continue
+            if is_source_file(path):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(object):
+
+    def __init__(self, dirs):
+        self._dirs = dirs
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for top in self._dirs:
+            for cur_dir in walk_dirs(top):
+                for name in os.listdir(cur_dir):
+                    path = os.path.join(cur_dir, name)
+                    if not is_source_file(path):
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (st.st_mtime, st.st_size)
+        return snapshot
+
+    def wait(self, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            new_snapshot = self._scan()
+            changed = [p for p in set(new_snapshot) | set(self._snapshot)
+                       if new_snapshot.get(p) != self._snapshot.get(p)]
+            self._snapshot = new_snapshot
+            if len(changed) > 0:
+                return changed
+            if deadline is not None and time.time() >= deadline:
+                return []
+            sleep_time = __poll_interval__
+            if deadline is not None:
+                sleep_time = min(sleep_time, max(deadline - time.time(), 0))
+            time.sleep(sleep_time)
+
+    def close(self):
+        pass
+
+
+def create_watcher(dirs):
+    try:
+        return InotifyWatcher(dirs)
+    except (OSError, AttributeError) as e:
+        print("[sra:INFO] inotify is not available ({}), polling for changes every {}s."
+              .format(e, __poll_interval__))
+        return PollingWatcher(dirs)
+
+
+def get_stage(changed_files, top_dir):
+    """HLS sources of the Role only need new HLS cores, everything else (HDL, constraints, TOP/) a complete build."""
+    if changed_files is None:
+        return __stage_full__
+    for path in changed_files:
+        if path.startswith(top_dir + os.sep) or not path.endswith(__hls_extensions__):
+            return __stage_full__
+    return __stage_ip__
+
+
+class Build(object):
+    """A build running in a background thread (with its own executor, so that it can be cancelled)."""
+
+    def __init__(self, stage, step):
+        self.stage = stage
+        self.result = None
+        self.executor = cf_exec.Executor()
+        self.thread = threading.Thread(target=self._run, args=(step,))
+        self.thread.daemon = True
+        self.start = time.time()
+        self.thread.start()
+
+    def _run(self, step):
+        self.result = self.executor.run_step(step)
+
+    @property
+    def is_done(self):
+        return not self.thread.is_alive()
+
+    def cancel(self):
+        self.executor.cancel()
+        self.thread.join()
+
+
+def watch(cfp_root, role_name, role_dir, flow, make_env, ip_target, debounce):
+    top_dir = os.path.abspath(cfp_root + '/TOP')
+    dirs = [d for d in [os.path.abspath(role_dir), top_dir] if os.path.isdir(d)]
+    watcher = create_watcher(dirs)
+    sra_cmd = [sys.executable, os.path.realpath(os.path.join(os.path.dirname(__file__), 'cf_sratool.py')),
+               'build', flow, '--role={}'.format(role_name)]
+    print("[sra:INFO] Watching {} for changes of role {} ({} flow), press Ctrl-C to stop..."
+          .format(', '.join(dirs), role_name, flow))
+    pending = None
+    last_change = None
+    build = None
+    try:
+        while True:
+            timeout = None
+            if pending is not None:
+                timeout = max(debounce - (time.time() - last_change), 0.05)
+            elif build is not None:
+                timeout = 0.5
+            changed = watcher.wait(timeout)
+            if changed is None or len(changed) > 0:
+                stage = get_stage(changed, top_dir)
+                pending = max(pending or 0, stage)
+                last_change = time.time()
+                if build is not None and not build.is_done:
+                    print("[sra:INFO] New changes, cancelling the running build ({})..."
+                          .format(__stage_names__[build.stage]))
+                    build.cancel()
+                    # the cancelled build must be repeated as well
+                    pending = max(pending, build.stage)
+                    build = None
+                continue
+            if build is not None and build.is_done:
+                rc = build.result.rc
+                status = 'succeeded' if rc == 0 else 'FAILED (rc {})'.format(rc)
+                print("[sra:INFO] {} of role {} {} after {:.0f}s, waiting for changes..."
+                      .format(__stage_names__[build.stage], role_name, status, time.time() - build.start))
+                build = None
+            if pending is not None and time.time() - last_change >= debounce and build is None:
+                print("[sra:INFO] Sources changed, starting the {} of role {}...".format(__stage_names__[pending],
+                                                                                      role_name))
+                if pending == __stage_ip__:
+                    step = cf_exec.Step('make ' + ip_target, ['make', ip_target], cwd=cfp_root, env=make_env)
+                else:
+                    step = cf_exec.Step('sra build', sra_cmd, cwd=cfp_root)
+                build = Build(pending, step)
+                pending = None
+    except KeyboardInterrupt:
+        if build is not None and not build.is_done:
+            print("\n[sra:INFO] Cancelling the running build...")
+            build.cancel()
+    finally:
+        watcher.close()
+    return 0
@@ -0,0 +1,62 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Tests of the in-memory cFp.json model (python -m unittest discover tests).
+#  *
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates'))
+
+import cfp_config  # noqa: E402
+
+
+def get_config(active_role, second_role, pr_roles):
+    roles = [{'name': n, 'path': 'ROLE/' + n} for n in ['r1', 'r2', 'r3']]
+    data = {'cFpMOD': 'FMKU60', 'cFpSRAtype': 'Themisto',
+            'srat-conf': {'roles': roles, 'active_role': active_role,
+                          'admin': {'2nd-role': second_role, 'pr-roles': pr_roles}}}
+    return cfp_config.CfpConfig('cFp.json', data)
+
+
+class DelRolesTest(unittest.TestCase):
+
+    def test_deleted_roles_are_no_longer_referenced(self):
+        config = get_config('r1', 'r2', ['r1', 'r2', 'r3'])
+        self.assertEqual(config.del_roles(['r1', 'r2']), 2)
+        self.assertEqual(config.get_role_names(), ['r3'])
+        self.assertEqual(config.srat_conf['active_role'], 'to-be-defined')
+        self.assertEqual(config.srat_conf['admin'], {'2nd-role': 'to-be-defined', 'pr-roles': ['r3']})
+        self.assertTrue(config.is_dirty)
+
+    def test_other_settings_are_kept(self):
+        config = get_config('r1', 'r2', ['r1', 'r2'])
+        self.assertEqual(config.del_roles(['r3']), 1)
+        self.assertEqual(config.srat_conf['active_role'], 'r1')
+        self.assertEqual(config.srat_conf['admin'], {'2nd-role': 'r2', 'pr-roles': ['r1', 'r2']})
+
+
+if __name__ == '__main__':
+    unittest.main()
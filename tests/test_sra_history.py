@@ -0,0 +1,73 @@
+# /*******************************************************************************
+#  * Copyright 2016 -- 2022 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# *******************************************************************************/
+
+#  *
+#  *                       cloudFPGA
+#  *    =============================================
+#  *     Created: Oct 2026
+#  *     Authors: FAB, WEI, NGL, DID
+#  *
+#  *     Description:
+#  *       Tests of the build-time regression check of sra perf-check (python -m unittest discover tests).
+#  *
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates'))
+
+import sra_history  # noqa: E402
+
+
+def entry(make_target, total, sra='Themisto', rc=0):
+    return {'time': '', 'role': 'r1', 'flow': 'monolithic', 'mod': 'FMKU60', 'sra': sra, 'make_target': make_target,
+            'rc': rc, 'durations': {sra_history.__total_phase_key__: total}}
+
+
+def get_total(results):
+    return [r for r in results if r['phase'] == sra_history.__total_phase_key__][0]
+
+
+class CheckRegressionsTest(unittest.TestCase):
+
+    def test_incremental_builds_are_not_in_the_baseline_of_full_builds(self):
+        history = [entry('monolithic', t) for t in [100, 102, 98, 101]] + \
+                  [entry('monolithic_incr', t) for t in [30, 31, 29, 30]] + [entry('monolithic', 103)]
+        latest, results = sra_history.check_regressions(history, 'r1', 'monolithic', 'FMKU60', 10, 30)
+        self.assertEqual(latest['make_target'], 'monolithic')
+        total = get_total(results)
+        self.assertEqual(total['baseline_builds'], 4)
+        self.assertFalse(total['regression'])
+
+    def test_incremental_build_against_incremental_baseline(self):
+        history = [entry('monolithic_incr', t) for t in [30, 31, 29, 30]] + [entry('monolithic', 100)] + \
+                  [entry('monolithic_incr', 60)]
+        _, results = sra_history.check_regressions(history, 'r1', 'monolithic', 'FMKU60', 10, 30)
+        total = get_total(results)
+        self.assertEqual(total['baseline_builds'], 4)
+        self.assertTrue(total['regression'])
+
+    def test_shell_change(self):
+        history = [entry('monolithic', t) for t in [100, 102, 98, 101]] + [entry('monolithic', 150, sra='Tarsis')]
+        latest, results = sra_history.check_regressions(history, 'r1', 'monolithic', 'FMKU60', 10, 30)
+        self.assertEqual(get_total(results)['baseline_builds'], 0)
+        self.assertEqual(sra_history.get_previous_shell(history, latest), 'Themisto')
+        self.assertIsNone(sra_history.get_previous_shell(history, history[3]))
+
+
+if __name__ == '__main__':
+    unittest.main()